@@ -61,6 +61,7 @@ setup(
         'html5lib',
         'bleach',
         'pygeneric',
+        'numpy',
 
         # Services
         'gunicorn',
@@ -89,8 +90,9 @@ setup(
         # CodingIo question libraries
         'markio',
         'iospec>=0.3.1',
-        'ejudge>=0.5.2',
+        'ejudge==0.5.2',
         'boxed',
+        'psutil',
 
         # Related libraries
         'srvice',
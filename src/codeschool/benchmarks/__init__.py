@@ -0,0 +1,22 @@
+"""
+End-to-end grading benchmarks.
+
+The benchmark seeds coding questions from the markio files in the fixtures
+directory and sends a synthetic corpus of correct, wrong, timing-out and
+non-compiling submissions in each supported language through the full
+grading path::
+
+    Activity.submit -> CodingIoSubmission.autograde_value -> grade_code
+        -> Response.register_submission -> UserScore.update
+
+It reports submissions per second, p50/p95/p99 latency and a per-stage
+breakdown. Results are saved as JSON, so runs can be compared across
+commits::
+
+    $ python manage.py benchgrading --lang python --lang c --size 50
+    $ python manage.py benchgrading --compare benchmark-<commit>-<date>.json
+
+The benchmark writes to the configured database. Use a development database.
+"""
+from .runner import run_benchmark, save_results, load_results, \
+    compare_results, print_results
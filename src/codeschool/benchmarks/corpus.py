@@ -0,0 +1,133 @@
+"""
+Synthetic corpus of submissions.
+
+Each submission belongs to one of the kinds in KINDS. Correct submissions are
+the answer keys of the questions. The remaining kinds are generic programs
+that are wrong for any question.
+
+Every source receives a unique comment, so identical programs do not hit the
+grading cache and all submissions are actually executed.
+"""
+import random
+
+#: Kinds of synthetic submissions.
+KINDS = ['correct', 'wrong', 'timeout', 'error']
+
+#: Comment prefix for each supported language.
+COMMENTS = {
+    'python': '#',
+    'pytuga': '#',
+    'python2': '#',
+    'c': '//',
+    'cpp': '//',
+}
+
+#: Programs for each kind of wrong submission. "error" programs do not
+#: compile (or have syntax errors).
+PROGRAMS = {
+    'wrong': {
+        'python': 'print("wrong answer")\n',
+        'pytuga': 'print("wrong answer")\n',
+        'python2': 'print "wrong answer"\n',
+        'c': '#include <stdio.h>\n\n'
+             'int main() {\n'
+             '    printf("wrong answer\\n");\n'
+             '    return 0;\n'
+             '}\n',
+        'cpp': '#include <iostream>\n\n'
+               'int main() {\n'
+               '    std::cout << "wrong answer" << std::endl;\n'
+               '    return 0;\n'
+               '}\n',
+    },
+    'timeout': {
+        'python': 'while True:\n    pass\n',
+        'pytuga': 'while True:\n    pass\n',
+        'python2': 'while True:\n    pass\n',
+        'c': 'int main() {\n    for (;;);\n    return 0;\n}\n',
+        'cpp': 'int main() {\n    for (;;);\n    return 0;\n}\n',
+    },
+    'error': {
+        'python': 'print("unbalanced"\n',
+        'pytuga': 'print("unbalanced"\n',
+        'python2': 'print "unbalanced\n',
+        'c': 'int main( {\n    return 0\n}\n',
+        'cpp': 'int main( {\n    return 0\n}\n',
+    },
+}
+
+#: Default proportion of each kind of submission in the corpus.
+DEFAULT_MIX = {
+    'correct': 0.6,
+    'wrong': 0.25,
+    'timeout': 0.05,
+    'error': 0.1,
+}
+
+
+def salted(source, lang, salt):
+    """
+    Return a copy of source with a unique comment appended to it.
+    """
+
+    return '%s\n%s benchmark submission %s\n' % (
+        source.rstrip('\n'), COMMENTS[lang], salt)
+
+
+def make_corpus(answer_keys, size, mix=None, seed=0):
+    """
+    Return a list of synthetic submissions.
+
+    Args:
+        answer_keys:
+            A list of (question, lang, source) tuples with the reference
+            programs of each question.
+        size:
+            Number of submissions for each (question, lang) pair.
+        mix:
+            A mapping from kinds to their proportions in the corpus. Defaults
+            to DEFAULT_MIX.
+        seed:
+            Random seed. The same seed always produces the same corpus.
+
+    Each submission is a dictionary with the "question", "lang", "kind" and
+    "source" keys.
+    """
+
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = sorted(mix)
+    weights = [mix[kind] for kind in kinds]
+    corpus = []
+    salt = 0
+
+    for question, lang, reference in answer_keys:
+        for _ in range(size):
+            kind = weighted_choice(rng, kinds, weights)
+            if kind == 'correct':
+                source = reference
+            else:
+                source = PROGRAMS[kind][lang]
+            salt += 1
+            corpus.append({
+                'question': question,
+                'lang': lang,
+                'kind': kind,
+                'source': salted(source, lang, salt),
+            })
+
+    rng.shuffle(corpus)
+    return corpus
+
+
+def weighted_choice(rng, choices, weights):
+    """
+    Choose an element of choices with the given relative weights.
+    """
+
+    value = rng.random() * sum(weights)
+    for choice, weight in zip(choices, weights):
+        value -= weight
+        if value < 0:
+            return choice
+    return choices[-1]
@@ -0,0 +1,94 @@
+"""
+Benchmark for the lookup of duplicate submissions in Activity.submit().
+
+A single response receives many distinct graded submissions. We then measure
+the time spent finding an existing submission (a hit) and checking that a new
+submission has no duplicate (a miss). The indexed lookup used by
+Activity.submit() is compared with the previous implementation, which loaded
+the response_data of all candidates and fetched the match again.
+"""
+import time
+
+from .runner import summary
+from .seed import seed_questions, seed_users
+
+
+def legacy_duplicate(submission_class, response, response_data,
+                     response_hash):
+    """
+    Previous implementation of submission recycling (kept for comparison).
+    """
+
+    recyclable = submission_class.objects.filter(
+        response=response,
+        response_hash=response_hash,
+    ).order_by('created')
+    for pk, value in recyclable.values_list('id', 'response_data'):
+        if value == response_data:
+            return recyclable.get(pk=pk)
+    return None
+
+
+def indexed_duplicate(submission_class, response, response_data,
+                      response_hash):
+    return submission_class.objects.duplicate(response, response_data,
+                                              response_hash)
+
+
+def bench_recycling(submissions=1000, lookups=100, keep=False):
+    """
+    Create a response with the given number of submissions and measure the
+    latency of duplicate lookups.
+
+    Return a dictionary mapping each implementation to a dictionary with the
+    'hit' and 'miss' latency summaries.
+    """
+
+    section, answer_keys = seed_questions(['python'], ['double'])
+    question = answer_keys[0][0]
+    user, = seed_users(1)
+    submission_class = question.submission_class
+    response = question.responses.response_for_user(user)
+
+    try:
+        # Populate response with distinct graded submissions
+        objects = []
+        for idx in range(submissions):
+            data = {'language': 'python',
+                    'source': 'print(%s)\n# %s\n' % (idx, 'x' * 1000)}
+            submission = submission_class(
+                response=response,
+                response_data=data,
+                response_hash=submission_class.response_data_hash(data),
+                status=submission_class.STATUS_DONE,
+            )
+            submission.pre_save_polymorphic()  # bulk_create skips save()
+            objects.append(submission)
+        submission_class.objects.bulk_create(objects)
+
+        step = max(submissions // lookups, 1)
+        hits = [objects[idx].response_data
+                for idx in range(0, submissions, step)][:lookups]
+        misses = [{'language': 'python', 'source': 'print("new %s")' % idx}
+                  for idx in range(lookups)]
+
+        results = {}
+        for name, func in [('legacy', legacy_duplicate),
+                           ('indexed', indexed_duplicate)]:
+            results[name] = {}
+            for kind, data_list in [('hit', hits), ('miss', misses)]:
+                latencies = []
+                for data in data_list:
+                    response_hash = submission_class.response_data_hash(data)
+                    start = time.perf_counter()
+                    found = func(submission_class, response, data,
+                                 response_hash)
+                    latencies.append(time.perf_counter() - start)
+                    if (found is not None) != (kind == 'hit'):
+                        raise RuntimeError('%s lookup failed' % name)
+                results[name][kind] = summary(latencies)
+    finally:
+        if not keep:
+            section.delete()
+
+    return results
@@ -0,0 +1,267 @@
+"""
+Runs the end-to-end grading benchmark and stores its results.
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from annoying.functions import get_config
+
+from codeschool.questions.coding_io.grading.resources import percentile
+
+from .corpus import COMMENTS, make_corpus
+from .seed import seed_questions, seed_users
+from .stages import Stages
+
+#: Languages used by default.
+LANGUAGES = sorted(COMMENTS)
+
+#: Version of the JSON results format.
+RESULTS_VERSION = 1
+
+
+def summary(latencies):
+    """
+    Summarize a list of latencies (in seconds).
+    """
+
+    data = sorted(latencies)
+    return {
+        'n': len(data),
+        'mean': sum(data) / len(data) if data else 0.0,
+        'p50': percentile(data, 50),
+        'p95': percentile(data, 95),
+        'p99': percentile(data, 99),
+        'max': data[-1] if data else 0.0,
+    }
+
+
+def is_expected(kind, submission):
+    """
+    Return True if the submission was graded as expected for its kind.
+    """
+
+    if kind == 'correct':
+        return submission.final_grade == 100
+    return submission.final_grade is not None and submission.final_grade < 100
+
+
+def git_commit():
+    """
+    Return the hash of the current git commit or None if it is not available.
+    """
+
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(__file__),
+            stderr=subprocess.DEVNULL,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def run_benchmark(languages=None, size=20, users=10, mix=None, seed=0,
+                  fixtures=None, keep=False, callback=None):
+    """
+    Seed questions and submit a synthetic corpus of submissions through
+    Activity.submit().
+
+    Args:
+        languages:
+            List of language refs. Defaults to all languages in LANGUAGES.
+        size:
+            Number of submissions for each question and language.
+        users:
+            Number of distinct users that send submissions.
+        mix:
+            Proportion of each kind of submission. See
+            :func:`codeschool.benchmarks.corpus.make_corpus`.
+        seed:
+            Random seed used to generate the corpus.
+        fixtures:
+            Names of the markio fixtures. Defaults to all fixtures.
+        keep:
+            If False (default), the benchmark questions are deleted at the
+            end.
+        callback:
+            A function called as callback(done, total) after each submission.
+
+    Return a dictionary with the results. It can be saved as JSON.
+    """
+
+    from codeschool.core.models import programming_language
+
+    languages = list(languages or LANGUAGES)
+    start = time.perf_counter()
+    section, answer_keys = seed_questions(languages, fixtures)
+    user_list = seed_users(users)
+    corpus = make_corpus(answer_keys, size, mix=mix, seed=seed)
+    seed_time = time.perf_counter() - start
+
+    records = []
+    try:
+        start = time.perf_counter()
+        with Stages() as stages:
+            for idx, item in enumerate(corpus):
+                user = user_list[idx % len(user_list)]
+                language = programming_language(item['lang'])
+                submit_start = time.perf_counter()
+                submission = item['question'].submit(
+                    user, source=item['source'], language=language)
+                latency = time.perf_counter() - submit_start
+                stages.flush()
+                records.append({
+                    'lang': item['lang'],
+                    'kind': item['kind'],
+                    'latency': latency,
+                    'expected': is_expected(item['kind'], submission),
+                })
+                if callback is not None:
+                    callback(idx + 1, len(corpus))
+        elapsed = time.perf_counter() - start
+    finally:
+        if not keep:
+            section.delete()
+
+    return make_results(records, stages.samples, elapsed, seed_time, {
+        'languages': languages,
+        'size': size,
+        'users': users,
+        'mix': mix,
+        'seed': seed,
+        'fixtures': fixtures,
+    })
+
+
+def make_results(records, stage_samples, elapsed, seed_time, params):
+    """
+    Build the results dictionary from the list of per-submission records.
+    """
+
+    latencies = [x['latency'] for x in records]
+    overall = summary(latencies)
+    overall.update(
+        elapsed=elapsed,
+        sps=len(records) / elapsed if elapsed else 0.0,
+        unexpected=sum(1 for x in records if not x['expected']),
+    )
+
+    def group_by(key):
+        groups = {}
+        for record in records:
+            groups.setdefault(record[key], []).append(record['latency'])
+        return {name: summary(values) for name, values in groups.items()}
+
+    total_time = sum(latencies)
+    stages = {}
+    for name, values in stage_samples.items():
+        stages[name] = summary(values)
+        stages[name]['share'] = sum(values) / total_time if total_time else 0.0
+
+    return {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'date': datetime.datetime.now().isoformat(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'params': params,
+        'settings': {
+            'executor': get_config('CODESCHOOL_EXECUTOR', 'ejudge'),
+            'sandbox': get_config('CODESCHOOL_USE_SANDBOX', True),
+            'pool_size': get_config('CODESCHOOL_GRADING_POOL_SIZE', None),
+            'grading_cache_size':
+                get_config('CODESCHOOL_GRADING_CACHE_SIZE', 10000),
+        },
+        'seed_time': seed_time,
+        'overall': overall,
+        'by_language': group_by('lang'),
+        'by_kind': group_by('kind'),
+        'stages': stages,
+    }
+
+
+def save_results(results, path=None):
+    """
+    Save results as JSON and return the path of the resulting file.
+
+    The default file name contains the commit hash and the date of the run.
+    """
+
+    if path is None:
+        commit = (results.get('commit') or 'unknown')[:8]
+        date = results['date'][:19].replace(':', '-')
+        path = 'benchmark-%s-%s.json' % (commit, date)
+    with open(path, 'w') as F:
+        json.dump(results, F, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(path):
+    """
+    Load results saved by :func:`save_results`.
+    """
+
+    with open(path) as F:
+        return json.load(F)
+
+
+def compare_results(old, new):
+    """
+    Compare two results dictionaries.
+
+    Return a list of (metric, old value, new value, relative change) tuples.
+    """
+
+    metrics = [('sps', 'overall', 'sps')]
+    metrics.extend(('latency %s' % q, 'overall', q)
+                   for q in ['p50', 'p95', 'p99'])
+    for name in sorted(set(old['stages']) & set(new['stages'])):
+        metrics.append(('%s mean' % name, name, 'mean'))
+
+    rows = []
+    for label, group, key in metrics:
+        if group == 'overall':
+            old_value, new_value = old['overall'][key], new['overall'][key]
+        else:
+            old_value = old['stages'][group][key]
+            new_value = new['stages'][group][key]
+        change = (new_value - old_value) / old_value if old_value else None
+        rows.append((label, old_value, new_value, change))
+    return rows
+
+
+def print_results(results, file=None):
+    """
+    Print a human-readable report of the results.
+    """
+
+    file = file or sys.stdout
+    overall = results['overall']
+    print('Commit: %s' % results.get('commit'), file=file)
+    print('Submissions: %(n)s in %(elapsed).2fs (%(sps).2f/s)' % overall,
+          file=file)
+    if overall['unexpected']:
+        print('Unexpected grades: %s' % overall['unexpected'], file=file)
+
+    def print_row(name, stats):
+        print('  %-20s n: %5d  p50: %8.2f  p95: %8.2f  p99: %8.2f' % (
+            name, stats['n'], stats['p50'] * 1000, stats['p95'] * 1000,
+            stats['p99'] * 1000), file=file)
+
+    print('Latency (ms):', file=file)
+    print_row('all', overall)
+    for group in ['by_language', 'by_kind']:
+        for name, stats in sorted(results[group].items()):
+            print_row(name, stats)
+
+    print('Stages (ms per submission):', file=file)
+    for name, stats in results['stages'].items():
+        print('  %-20s mean: %8.2f  p95: %8.2f  share: %5.1f%%' % (
+            name, stats['mean'] * 1000, stats['p95'] * 1000,
+            stats['share'] * 100), file=file)
@@ -0,0 +1,115 @@
+"""
+Benchmark for the propagation of scores up the page tree.
+
+Every graded submission increments the UserScore of its activity and of all
+ancestor pages. We create a chain of nested pages and a few users and send
+many score updates to the deepest page. The path-based propagation used by
+UserScore.update() is compared with the previous implementation, which
+walked the tree with get_parent(), get_or_create() and save() at each level.
+"""
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from codeschool import models
+from .runner import summary
+from .seed import seed_users
+
+
+def legacy_update(user, page, points=0, stars=0):
+    """
+    Previous implementation of UserScore.update(..., diff=True) (kept for
+    comparison).
+    """
+
+    from codeschool.lms.gamification.models import UserScore
+
+    score, _ = UserScore.objects.get_or_create(user=user, page=page)
+    while score is not None:
+        score.points += points
+        score.stars += stars
+        score.save(update_fields=['points', 'stars'])
+        parent_page = score.page.get_parent()
+        if parent_page is None:
+            score = None
+        else:
+            score = UserScore.objects.get_or_create(user=user,
+                                                    page=parent_page)[0]
+
+
+def path_update(user, page, points=0, stars=0):
+    from codeschool.lms.gamification.models import UserScore
+
+    UserScore.update(user, page, diff=True, points=points, stars=stars)
+
+
+def seed_chain(depth, parent=None):
+    """
+    Create a chain of nested pages with the given depth.
+
+    Return a tuple (top, leaf) with the first and the last pages.
+    """
+
+    parent = parent or models.Page.objects.get(depth=1)
+    top = page = parent.add_child(instance=models.Page(
+        title='Score benchmark',
+        slug='score-benchmark-%d' % int(time.time() * 1000),
+    ))
+    for idx in range(depth - 1):
+        page = page.add_child(instance=models.Page(
+            title='Level %s' % (idx + 2),
+            slug='level-%s' % (idx + 2),
+        ))
+    return top, page
+
+
+def bench_scores(updates=1000, depth=5, users=10, keep=False):
+    """
+    Send the given number of score updates to a page nested depth levels
+    below the root, distributed among the given number of users.
+
+    Return a dictionary mapping each implementation to a dictionary with the
+    number of updates per second, the latency summary and the number of
+    queries per update.
+    """
+
+    from codeschool.lms.gamification.models import UserScore
+
+    top, leaf = seed_chain(depth)
+    user_list = seed_users(users)
+    try:
+        results = {}
+        for name, func in [('legacy', legacy_update), ('path', path_update)]:
+            UserScore.objects.filter(user__in=user_list).delete()
+
+            # Warm up: create all UserScore rows.
+            for user in user_list:
+                func(user, leaf, points=1)
+
+            latencies = []
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for idx in range(updates):
+                    tic = time.perf_counter()
+                    func(user_list[idx % users], leaf, points=1, stars=0)
+                    latencies.append(time.perf_counter() - tic)
+                elapsed = time.perf_counter() - start
+
+            points = UserScore.objects\
+                .filter(user__in=user_list, page=top)\
+                .aggregate(total=models.Sum('points'))['total']
+            if points != updates + users:
+                raise RuntimeError('%s propagation lost updates' % name)
+
+            results[name] = {
+                'updates_per_second': updates / elapsed,
+                'queries_per_update': len(queries) / updates,
+                'latency': summary(latencies),
+            }
+    finally:
+        UserScore.objects.filter(user__in=user_list).delete()
+        if not keep:
+            top.delete()
+
+    return results
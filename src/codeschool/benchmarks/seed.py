@@ -0,0 +1,94 @@
+"""
+Seed the database with the questions and users used by the benchmarks.
+
+Questions are loaded from the markio files in the fixtures directory. All
+objects are created under a new ActivitySection, which can be deleted after
+the benchmark runs.
+"""
+import os
+import time
+
+import markio
+
+from codeschool import models
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture_names():
+    """
+    Return the names of all available markio fixtures.
+    """
+
+    return sorted(name[:-3] for name in os.listdir(FIXTURES_DIR)
+                  if name.endswith('.md'))
+
+
+def fixture_source(name):
+    """
+    Return the markio source of the given fixture.
+    """
+
+    with open(os.path.join(FIXTURES_DIR, name + '.md')) as F:
+        return F.read()
+
+
+def seed_questions(languages, fixtures=None, parent=None):
+    """
+    Create a CodingIoQuestion for each markio fixture with answer keys in the
+    given languages.
+
+    Return a tuple (section, answer_keys), where section is the
+    ActivitySection that holds the questions and answer_keys is a list of
+    (question, lang, source) tuples.
+    """
+
+    from codeschool.core.models import programming_language
+    from codeschool.lms.activities.models import ActivitySection
+    from codeschool.questions.coding_io.models import AnswerKey, \
+        CodingIoQuestion
+
+    section = ActivitySection.create_subpage(
+        parent,
+        title='Grading benchmark',
+        short_description='Questions created by the grading benchmark.',
+        slug='grading-benchmark-%d' % int(time.time() * 1000),
+    )
+
+    answer_keys = []
+    for name in fixtures or fixture_names():
+        data = markio.parse(fixture_source(name))
+        question = CodingIoQuestion(
+            title=data.title,
+            short_description=data.short_description or data.title,
+            author_name=data.author or '',
+            timeout=data.timeout or 1.0,
+            iospec_source=data.tests,
+        )
+        section.add_child(instance=question)
+
+        for lang, source in data.answer_key.items():
+            if lang not in languages:
+                continue
+            answer_key = AnswerKey(question=question,
+                                   language=programming_language(lang),
+                                   source=source)
+            answer_key.update()
+            answer_keys.append((question, lang, source))
+
+    return section, answer_keys
+
+
+def seed_users(size):
+    """
+    Return a list with the given number of benchmark users. Users are reused
+    between runs.
+    """
+
+    users = []
+    for idx in range(size):
+        user, _ = models.User.objects.get_or_create(
+            username='benchmark-user-%s' % idx,
+        )
+        users.append(user)
+    return users
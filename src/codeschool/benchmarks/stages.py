@@ -0,0 +1,95 @@
+"""
+Per-stage timing of the grading pipeline.
+
+The Stages context manager temporarily wraps the functions of the hot path
+with timers::
+
+    Activity.submit
+      -> CodingIoSubmission.autograde_value
+           -> grade_code
+      -> Response.register_submission
+           -> UserScore.update
+
+Times are inclusive: the time spent in grade_code is also counted in
+autograde_value.
+"""
+import functools
+import time
+
+#: Instrumented stages: (name, module path, attribute path).
+STAGES = [
+    ('autograde_value',
+     'codeschool.questions.coding_io.models.submission',
+     'CodingIoSubmission.autograde_value'),
+    ('grade_code',
+     'codeschool.questions.coding_io.models.submission',
+     'grade_code'),
+    ('register_submission',
+     'codeschool.lms.activities.models.response',
+     'Response.register_submission'),
+    ('user_score',
+     'codeschool.lms.gamification.models.score',
+     'UserScore.update'),
+]
+
+
+class Stages:
+    """
+    Context manager that records the time spent in each stage of the grading
+    pipeline.
+
+    Times are accumulated for the current submission and moved to the
+    ``samples`` dictionary (a mapping from stage names to lists of times)
+    when :meth:`flush` is called.
+    """
+
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self.samples = {name: [] for name, _, _ in stages}
+        self.current = {}
+        self._patched = []
+
+    def __enter__(self):
+        import importlib
+
+        for name, module_path, attr_path in self.stages:
+            owner = importlib.import_module(module_path)
+            *parents, attr = attr_path.split('.')
+            for parent in parents:
+                owner = getattr(owner, parent)
+            original = owner.__dict__[attr]
+            setattr(owner, attr, self._wrap(name, original))
+            self._patched.append((owner, attr, original))
+        return self
+
+    def __exit__(self, *args):
+        for owner, attr, original in reversed(self._patched):
+            setattr(owner, attr, original)
+        self._patched = []
+
+    def _wrap(self, name, original):
+        wrapper_type = None
+        if isinstance(original, (classmethod, staticmethod)):
+            wrapper_type = type(original)
+            original = original.__func__
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.current[name] = self.current.get(name, 0.0) + elapsed
+
+        return timed if wrapper_type is None else wrapper_type(timed)
+
+    def flush(self):
+        """
+        Register the times of the current submission and reset the counters.
+        Stages that were not executed count as zero.
+        """
+
+        for name in self.samples:
+            self.samples[name].append(self.current.get(name, 0.0))
+        self.current = {}
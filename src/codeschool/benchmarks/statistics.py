@@ -0,0 +1,85 @@
+"""
+Benchmark for codeschool.core.statistics.Statistics.
+
+A synthetic set of grades (Decimal values, as returned by values_list() on a
+DecimalField) is summarized by the NumPy-backed Statistics class and by the
+previous pure Python implementation. No database access is necessary.
+"""
+import decimal
+import random
+import time
+
+from codeschool.core.statistics import Statistics
+
+
+class LegacyStatistics:
+    """
+    Previous implementation of Statistics (kept for comparison).
+    """
+
+    def __init__(self, name, data, default=0):
+        self.name = name
+        self.data = list(data)
+        self.default = default
+
+    def max(self):
+        return max(self.data, default=self.default)
+
+    def min(self):
+        return min(self.data, default=self.default)
+
+    def mean(self):
+        return sum(self.data, 0) / len(self.data)
+
+    def median(self):
+        sorted_data = sorted(self.data)
+        N = len(sorted_data)
+        if N % 2:
+            return sorted_data[N // 2]
+        return (sorted_data[N // 2] + sorted_data[N // 2 - 1]) / 2
+
+
+def make_grades(size, seed=0):
+    """
+    Return a list of random grades between 0 and 100 with 3 decimal places.
+    """
+
+    rng = random.Random(seed)
+    return [decimal.Decimal(rng.randint(0, 100000)) / 1000
+            for _ in range(size)]
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_statistics(size=1000000, seed=0):
+    """
+    Compute the usual statistics over size grades with both implementations.
+
+    Return a dictionary mapping each implementation to a dictionary with the
+    time (in seconds) spent in each step.
+    """
+
+    grades = make_grades(size, seed)
+    results = {}
+    for name, cls in [('legacy', LegacyStatistics), ('numpy', Statistics)]:
+        timings = results[name] = {}
+        stats = None
+
+        def load():
+            nonlocal stats
+            stats = cls('final_grade', grades)
+
+        timings['load'] = timed(load)
+        for method in ['max', 'min', 'mean', 'median']:
+            timings[method] = timed(getattr(stats, method))
+        if cls is Statistics:
+            timings['percentiles'] = \
+                timed(lambda: stats.percentile([5, 25, 50, 75, 95]))
+            timings['histogram'] = timed(lambda: stats.histogram(20))
+            timings['std'] = timed(stats.std)
+        timings['total'] = sum(timings.values())
+    return results
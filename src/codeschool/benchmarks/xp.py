@@ -0,0 +1,148 @@
+"""
+Benchmark for the global XP leaderboard.
+
+Many users receive experience points (one GivenXp entry each) and the
+leaderboard is read after every few updates. The shared leaderboard used by
+GivenXp.leaderboard(), which applies the recorded changes to a cached
+snapshot, is compared with the previous implementation, which summed every
+GivenXp row on each call. Totals of single users are compared in the same
+way.
+"""
+import random
+import time
+from collections import Counter
+
+from codeschool import models
+from .runner import summary
+
+USERNAME_PREFIX = 'benchmark-xp-'
+
+
+def legacy_leaderboard():
+    """
+    Previous implementation of GivenXp.leaderboard() (kept for comparison).
+    """
+
+    from codeschool.lms.gamification.models import GivenXp
+
+    counter = Counter()
+    for user, points in GivenXp.objects.values_list('user', 'points'):
+        counter[user] += points
+    return counter
+
+
+def legacy_total_score(user):
+    """
+    Previous implementation of GivenXp.total_score() (kept for comparison).
+    """
+
+    from codeschool.lms.gamification.models import GivenXp
+
+    points = GivenXp.objects.filter(user=user).values_list('points', flat=True)
+    return sum(points)
+
+
+def shared_leaderboard():
+    from codeschool.lms.gamification.models import GivenXp
+
+    return GivenXp.leaderboard()
+
+
+def shared_total_score(user):
+    from codeschool.lms.gamification.models import GivenXp
+
+    return GivenXp.total_score(user)
+
+
+def seed_xp(users, seed=0):
+    """
+    Create the given number of users with a GivenXp entry and the
+    corresponding XpTotal row each.
+
+    Return the list of users.
+    """
+
+    from codeschool.lms.gamification.models import GivenXp, XpTotal
+
+    rng = random.Random(seed)
+    models.User.objects.bulk_create(
+        [models.User(username='%s%s' % (USERNAME_PREFIX, idx))
+         for idx in range(users)],
+        batch_size=1000,
+    )
+    user_list = list(models.User.objects
+                     .filter(username__startswith=USERNAME_PREFIX)
+                     .order_by('id'))
+    points = [rng.randint(0, 1000) for _ in user_list]
+    GivenXp.objects.bulk_create(
+        [GivenXp(user=user, points=value, token='benchmark.xp')
+         for user, value in zip(user_list, points)],
+        batch_size=1000,
+    )
+    XpTotal.objects.bulk_create(
+        [XpTotal(user=user, points=value)
+         for user, value in zip(user_list, points)],
+        batch_size=1000,
+    )
+    return user_list
+
+
+def bench_xp(users=100000, rounds=50, updates=10, seed=0, keep=False):
+    """
+    Run the given number of rounds of XP updates followed by a leaderboard
+    read and a total_score() lookup.
+
+    Return a dictionary mapping each implementation to the latency
+    summaries of 'leaderboard' and 'total_score' calls. The 'update' key
+    holds the latency of GivenXp.objects.update() calls.
+    """
+
+    from codeschool.lms.gamification.models import GivenXp
+
+    rng = random.Random(seed)
+    user_list = seed_xp(users, seed)
+    GivenXp.reset_leaderboard()
+    GivenXp.leaderboard(force_refresh=True)
+
+    implementations = [('legacy', legacy_leaderboard, legacy_total_score),
+                       ('shared', shared_leaderboard, shared_total_score)]
+    results = {name: {'leaderboard': [], 'total_score': []}
+               for name, _, _ in implementations}
+    results['update'] = []
+    try:
+        for _ in range(rounds):
+            for _ in range(updates):
+                user = rng.choice(user_list)
+                start = time.perf_counter()
+                GivenXp.objects.update(user, rng.randint(0, 1000),
+                                       'benchmark.xp')
+                results['update'].append(time.perf_counter() - start)
+
+            user = rng.choice(user_list)
+            boards = []
+            for name, leaderboard, total_score in implementations:
+                start = time.perf_counter()
+                boards.append(leaderboard())
+                results[name]['leaderboard'].append(
+                    time.perf_counter() - start)
+
+                start = time.perf_counter()
+                total_score(user)
+                results[name]['total_score'].append(
+                    time.perf_counter() - start)
+
+            legacy, shared = boards
+            if any(legacy[user.id] != shared[user.id] for user in user_list):
+                raise RuntimeError('leaderboards differ')
+    finally:
+        if not keep:
+            models.User.objects\
+                .filter(username__startswith=USERNAME_PREFIX)\
+                .delete()
+            GivenXp.leaderboard(force_refresh=True)
+
+    for name, _, _ in implementations:
+        for kind, latencies in results[name].items():
+            results[name][kind] = summary(latencies)
+    results['update'] = summary(results['update'])
+    return results
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from codeschool.benchmarks.statistics import bench_statistics
+
+
+class Command(BaseCommand):
+    help = 'compares the Statistics class with its previous pure Python ' \
+           'implementation on a large set of grades.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', '-n', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, size=1000000, seed=0, **options):
+        results = bench_statistics(size, seed)
+
+        print('Statistics over %s grades (ms):' % size)
+        steps = list(results['numpy'])
+        for step in steps:
+            row = ['%-12s' % step]
+            for name in ['legacy', 'numpy']:
+                value = results[name].get(step)
+                row.append('%10s' % ('-' if value is None else
+                                     '%.1f' % (value * 1000)))
+            print('  ' + ' '.join(row))
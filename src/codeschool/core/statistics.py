@@ -1,83 +1,215 @@
 from collections import Sequence
 
+import numpy as np
 from lazyutils import lazy
 
 
+#: Marks arguments that were not given by the caller.
+NOT_GIVEN = object()
+
+
+def as_array(data):
+    """
+    Convert data to a contiguous array of floats.
+
+    Data can be an array or any iterable of numbers (e.g., the result of
+    queryset.values_list(attr, flat=True)). None values are ignored.
+    """
+
+    if isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data, dtype=float)
+        return data[~np.isnan(data)]
+    return np.fromiter((x for x in data if x is not None), dtype=float)
+
+
 class Statistics(Sequence):
     """
     An object that computes a series of statistical data over some data set.
+
+    Values are stored in a NumPy array of floats. Methods that summarize the
+    data set return the default value if it is empty.
     """
 
     def __init__(self, name, data, default=0):
         self.name = name
-        self.data = list(data)
+        self.data = as_array(data)
         self.default = default
 
+    @classmethod
+    def from_queryset(cls, queryset, attr, **kwargs):
+        """
+        Create a Statistics object from the values of the given attribute in
+        a queryset.
+        """
+
+        values = queryset.values_list(attr, flat=True)
+        return cls(attr, values, **kwargs)
+
+    @classmethod
+    def grouped(cls, name, rows, **kwargs):
+        """
+        Split a sequence of (key, value) pairs by key.
+
+        Return a dictionary mapping each key to a Statistics object with its
+        values. Rows can come straight from a values_list() call, e.g.::
+
+            rows = submissions.values_list('response__activity_page_id',
+                                           'final_grade')
+            by_activity = Statistics.grouped('final_grade', rows)
+
+        Rows are grouped in a single sort of the array of keys.
+        """
+
+        rows = [(key, value) for key, value in rows if value is not None]
+        if not rows:
+            return {}
+        keys, values = zip(*rows)
+        unique, inverse = np.unique(np.asarray(keys), return_inverse=True)
+        order = np.argsort(inverse, kind='mergesort')
+        values = np.asarray(values, dtype=float)[order]
+        bounds = np.cumsum(np.bincount(inverse))[:-1]
+        return {key.item(): cls(name, chunk, **kwargs)
+                for key, chunk in zip(unique, np.split(values, bounds))}
+
     @lazy
     def _sorted(self):
         """
         Cache sorted values with no given key function.
         """
 
-        return sorted(self.data)
+        return np.sort(self.data)
 
     def __len__(self):
         return len(self.data)
 
     def __iter__(self):
-        return iter(self.data)
+        return iter(self.data.tolist())
 
     def __getitem__(self, idx):
         return self.data[idx]
 
-    def max(self, key=lambda x: x, default=None):
+    def _default(self, default):
+        return self.default if default is NOT_GIVEN else default
+
+    def max(self, key=None, default=NOT_GIVEN):
         """
         Return the greatest value in data.
+
+        If a key function is given, return the value with the greatest key.
         """
 
-        default = 0 if default is None else self.default
-        return max(self.data, key=key, default=default)
+        if not len(self.data):
+            return self._default(default)
+        if key is not None:
+            return max(self, key=key)
+        return float(self.data.max())
 
-    def min(self, key=lambda x: x, default=None):
+    def min(self, key=None, default=NOT_GIVEN):
         """
         Return the smallest value in data.
+
+        If a key function is given, return the value with the smallest key.
         """
 
-        default = 0 if default is None else self.default
-        return min(self.data, key=key, default=default)
+        if not len(self.data):
+            return self._default(default)
+        if key is not None:
+            return min(self, key=key)
+        return float(self.data.min())
 
-    def sum(self, default=None):
+    def sum(self, default=NOT_GIVEN):
         """
         Return the sum of all data values.
         """
 
-        default = 0 if default is None else self.default
-        return sum(self.data, default)
+        if not len(self.data):
+            return self._default(default)
+        return float(self.data.sum())
 
-    def mean(self, default=None):
+    def mean(self, default=NOT_GIVEN):
         """
         Return the mean value from data
         """
 
-        return self.sum(default) / len(self.data)
+        if not len(self.data):
+            return self._default(default)
+        return float(self.data.mean())
+
+    def std(self, default=NOT_GIVEN, ddof=0):
+        """
+        Return the standard deviation of data.
+
+        Use ddof=1 for the sample standard deviation.
+        """
+
+        if len(self.data) <= ddof:
+            return self._default(default)
+        return float(self.data.std(ddof=ddof))
+
+    def sorted(self, key=None):
+        """
+        Return an array with all data values sorted.
+
+        If a key function is given, return a list sorted by the given key.
+        """
+
+        if key is not None:
+            return sorted(self, key=key)
+        return self._sorted
+
+    def median(self, key=None, default=NOT_GIVEN):
+        """
+        Median of the data set.
+
+        If a key function is given, values are sorted by key and the median
+        is the middle value (or the mean of the two middle values).
+        """
+
+        if key is None or not len(self.data):
+            return self.percentile(50, default)
+        data = self.sorted(key)
+        size = len(data)
+        if size % 2:
+            return data[size // 2]
+        return (data[size // 2] + data[size // 2 - 1]) / 2
+
+    def percentile(self, q, default=NOT_GIVEN):
+        """
+        Return the q-th percentile of data (q is between 0 and 100).
+
+        If q is a sequence, return a list with the corresponding percentiles.
+        Values are linearly interpolated between data points.
+        """
+
+        if not len(self.data):
+            if np.ndim(q):
+                return [self._default(default)] * len(q)
+            return self._default(default)
+        result = np.percentile(self._sorted, q)
+        return result.tolist() if np.ndim(result) else float(result)
 
-    def sorted(self, key=lambda x: x):
+    def histogram(self, bins=10, range=None):
         """
-        Return a list with all data values sorted by the given key function.
+        Return a tuple (counts, edges) with the number of values in each bin
+        and the bin edges, as in numpy.histogram().
         """
 
-        return self._sorted if key is None else sorted(self.data, key=key)
+        counts, edges = np.histogram(self.data, bins=bins, range=range)
+        return counts.tolist(), edges.tolist()
 
-    def median(self, key=lambda x: x):
+    def summary(self, percentiles=(25, 50, 75)):
         """
-        Median of the data set using key function to sort values
+        Return a dictionary with the main statistics of the data set.
         """
 
-        sorted_data = self.sorted(key)
-        N = len(sorted_data)
-        if N % 2:
-            return sorted_data[N // 2]
-        elif N == 0:
-            raise ValueError('empty data set has no median')
-        else:
-            return (sorted_data[N // 2] + sorted_data[N // 2 - 1]) / 2
\ No newline at end of file
+        data = {
+            'name': self.name,
+            'count': len(self),
+            'mean': self.mean(),
+            'std': self.std(),
+            'min': self.min(),
+            'max': self.max(),
+        }
+        for q, value in zip(percentiles, self.percentile(list(percentiles))):
+            data['p%s' % q] = value
+        return data
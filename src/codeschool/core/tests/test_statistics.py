@@ -0,0 +1,38 @@
+from codeschool.core.tests import *
+from codeschool.core.statistics import Statistics
+
+
+def test_statistics_summary():
+    stats = Statistics('grade', [1, None, 2, 3, 4])
+    assert len(stats) == 4
+    assert stats.mean() == 2.5
+    assert stats.median() == 2.5
+    assert stats.percentile([0, 100]) == [1.0, 4.0]
+    assert stats.histogram(3) == ([1, 1, 2], [1.0, 2.0, 3.0, 4.0])
+    assert stats.summary()['p75'] == 3.25
+
+
+def test_statistics_empty_data_set_uses_default():
+    stats = Statistics('grade', [], default=0)
+    assert stats.mean() == 0
+    assert stats.median() == 0
+    assert stats.max(default=None) is None
+    assert stats.max() == 0
+    assert stats.std() == 0
+
+
+def test_statistics_key_functions():
+    stats = Statistics('grade', [3, -5, 1, 4])
+    assert stats.max(key=abs) == -5
+    assert stats.min(key=abs) == 1
+    assert stats.sorted(key=abs) == [1, 3, 4, -5]
+    assert stats.median(key=abs) == 3.5
+    assert stats.median() == 2.0
+
+
+def test_statistics_grouped():
+    rows = [(2, 1), (1, 5), (2, 3), (1, None), (3, 7)]
+    groups = Statistics.grouped('grade', rows)
+    assert sorted(groups) == [1, 2, 3]
+    assert list(groups[2]) == [1.0, 3.0]
+    assert groups[1].mean() == 5.0
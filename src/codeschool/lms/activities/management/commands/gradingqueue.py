@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from codeschool.lms.activities import workers as grading_workers
+
+
+class Command(BaseCommand):
+    help = 'starts a pool of worker processes that consume the grading queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', '-w', type=int, default=None)
+        parser.add_argument('--poll-interval', type=float, default=None)
+        parser.add_argument('--max-jobs', type=int, default=None)
+        parser.add_argument('--burst', '-b', action='store_true')
+        parser.add_argument('--depth', action='store_true')
+
+    def handle(self, *args, workers=None, poll_interval=None, max_jobs=None,
+               burst=False, depth=False, **options):
+        if depth:
+            print('Grading queue depth: %s' % grading_workers.queue_depth())
+            return
+
+        grading_workers.run_workers(
+            workers=workers,
+            poll_interval=poll_interval,
+            max_jobs=max_jobs,
+            burst=burst,
+        )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from codeschool import models
+from codeschool.lms.activities.models import Response, ResponseFingerprint
+from codeschool.lms.activities.similarity import DEFAULT_THRESHOLD
+
+
+class Command(BaseCommand):
+    help = 'reports clusters of near-duplicate responses of an activity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('activity', type=int)
+        parser.add_argument('--threshold', '-t', type=float,
+                            default=DEFAULT_THRESHOLD)
+        parser.add_argument('--rebuild', action='store_true')
+
+    def handle(self, *args, activity=None, threshold=DEFAULT_THRESHOLD,
+               rebuild=False, **options):
+        try:
+            page = models.Page.objects.get(pk=activity).specific
+        except models.Page.DoesNotExist:
+            raise CommandError('activity #%s does not exist' % activity)
+        if not hasattr(page, 'group_similar_responses'):
+            raise CommandError('page #%s is not an activity' % activity)
+
+        if rebuild:
+            count = ResponseFingerprint.objects.rebuild(page)
+            print('Indexed %s responses.' % count)
+
+        groups = page.group_similar_responses(threshold)
+        if not groups:
+            print('No responses with similarity >= %.2f.' % threshold)
+            return
+
+        ids = {pk for cluster, _ in groups for pk in cluster}
+        users = dict(Response.objects
+                     .filter(id__in=ids)
+                     .values_list('id', 'user__username'))
+        for idx, (cluster, pairs) in enumerate(groups, 1):
+            names = sorted(users.get(pk, '#%s' % pk) for pk in cluster)
+            print('Cluster %s (%s responses): %s'
+                  % (idx, len(cluster), ', '.join(names)))
+            ranked = sorted(pairs.items(), key=lambda x: x[1], reverse=True)
+            for (response_a, response_b), value in ranked:
+                print('    %.2f  %s / %s' % (value, users.get(response_a),
+                                             users.get(response_b)))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from codeschool import models
+from codeschool.lms.activities.models import ActivityGradeStatistics
+
+
+class Command(BaseCommand):
+    help = 'rebuilds the grade statistics of all activities from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('activity', type=int, nargs='?')
+
+    def handle(self, *args, activity=None, **options):
+        page = None
+        if activity is not None:
+            try:
+                page = models.Page.objects.get(pk=activity).specific
+            except models.Page.DoesNotExist:
+                raise CommandError('activity #%s does not exist' % activity)
+
+        count = ActivityGradeStatistics.objects.rebuild(page)
+        print('Rebuilt statistics for %s activities.' % count)
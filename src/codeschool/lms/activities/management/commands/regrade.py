@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from codeschool import models
+from codeschool.lms.activities.regrade import REGRADE_METHODS
+
+
+class Command(BaseCommand):
+    help = 'regrades all submissions of an activity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('activity', type=int)
+        parser.add_argument('--method', '-m', default='update',
+                            choices=REGRADE_METHODS)
+        parser.add_argument('--workers', '-w', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--fail-fast', action='store_true')
+        parser.add_argument('--restart', action='store_true')
+
+    def handle(self, *args, activity=None, method='update', workers=None,
+               chunk_size=None, fail_fast=False, restart=False, **options):
+        try:
+            page = models.Page.objects.get(pk=activity).specific
+        except models.Page.DoesNotExist:
+            raise CommandError('activity #%s does not exist' % activity)
+        if not hasattr(page, 'regrade_all'):
+            raise CommandError('page #%s is not an activity' % activity)
+
+        def report(run):
+            print('Regraded %s submissions (%s changed, %s errors): '
+                  '%.1f submissions/s' % (run.graded, run.changed, run.errors,
+                                          run.throughput))
+
+        run = page.regrade_all(
+            method=method,
+            workers=workers,
+            chunk_size=chunk_size,
+            fail_fast=fail_fast,
+            resume=not restart,
+            callback=report,
+        )
+        print('Finished in %.1fs.' % run.elapsed)
+        report(run)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailcore', '0028_merge'),
+        ('activities', '0011_gradingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegradeRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', model_utils.fields.StatusField(choices=[('running', 'running'), ('done', 'done')], default='running', max_length=100, no_check_for_status=True, verbose_name='status')),
+                ('status_changed', model_utils.fields.MonitorField(default=django.utils.timezone.now, monitor='status', verbose_name='status changed')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('method', models.CharField(choices=[('update', 'update'), ('best', 'best'), ('worst', 'worst'), ('best-feedback', 'best (update feedback)'), ('worst-feedback', 'worst (update feedback)')], default='update', max_length=20)),
+                ('fail_fast', models.BooleanField(default=False)),
+                ('last_id', models.PositiveIntegerField(default=0, help_text='Checkpoint: id of the last processed submission.')),
+                ('graded', models.PositiveIntegerField(default=0)),
+                ('changed', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('elapsed', models.FloatField(default=0.0, help_text='Total time spent grading, in seconds.')),
+                ('activity_page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regrade_runs', to='wagtailcore.Page')),
+            ],
+            options={
+                'verbose_name': 'regrade run',
+                'verbose_name_plural': 'regrade runs',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0012_regraderun'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='submission',
+            index_together=set([('response', 'response_hash')]),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_summary_status(apps, schema_editor):
+    Submission = apps.get_model('activities', 'Submission')
+    Submission.objects.update(summary_status=models.F('status'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0013_submission_response_hash_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='summary_label',
+            field=models.CharField(blank=True, help_text='Short description of the response shown in submission listings.', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='summary_status',
+            field=models.CharField(blank=True, help_text='Short status of the feedback (e.g., "wrong-answer") shown in submission listings.', max_length=32),
+        ),
+        migrations.RunPython(fill_summary_status, migrations.RunPython.noop),
+    ]
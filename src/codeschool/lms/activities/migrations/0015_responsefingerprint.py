@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailcore', '0028_merge'),
+        ('activities', '0014_submission_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(blank=True, max_length=50)),
+                ('grade', models.DecimalField(decimal_places=3, default=0, max_digits=6)),
+                ('signature', jsonfield.fields.JSONField()),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('activity_page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wagtailcore.Page')),
+                ('response', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint', to='activities.Response')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='activities.Submission')),
+            ],
+            options={
+                'verbose_name': 'response fingerprint',
+                'verbose_name_plural': 'response fingerprints',
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 500
+
+
+def fill_response_key_hash(apps, schema_editor):
+    from codeschool.lms.activities.models.submission import md5hash
+
+    Submission = apps.get_model('activities', 'Submission')
+    submissions = Submission.objects\
+        .order_by('id')\
+        .values_list('id', 'response_data')
+
+    last_id = 0
+    while True:
+        batch = list(submissions.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        with transaction.atomic():
+            for pk, response_data in batch:
+                if not response_data:
+                    continue
+                key = json.dumps(response_data, sort_keys=True)
+                Submission.objects.filter(id=pk)\
+                    .update(response_key_hash=md5hash(key))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0015_responsefingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='response_key_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Hash of the normalized response data. Submissions that differ only by trivial transformations have the same key.', max_length=32),
+        ),
+        migrations.RunPython(fill_response_key_hash, migrations.RunPython.noop),
+    ]
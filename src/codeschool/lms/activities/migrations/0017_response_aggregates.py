@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def fill_aggregates(apps, schema_editor):
+    Response = apps.get_model('activities', 'Response')
+    Submission = apps.get_model('activities', 'Submission')
+
+    def rank(row):
+        _, _, _, given_grade, final_grade, score, stars = row
+        return (given_grade or 0, score, stars, final_grade or 0)
+
+    # Walk over responses in batches of increasing ids. Submissions of each
+    # batch are fetched in a single query, in creation order.
+    last_id = 0
+    while True:
+        ids = list(Response.objects
+                   .filter(id__gt=last_id)
+                   .order_by('id')
+                   .values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        rows = Submission.objects\
+            .filter(response_id__in=ids, status='done')\
+            .order_by('response_id', 'created', 'id')\
+            .values_list('response_id', 'id', 'created', 'given_grade',
+                         'final_grade', 'score', 'stars')
+        aggregates = {}
+        for row in rows:
+            response_id, pk, created, _, grade, _, _ = row
+            grade = grade or 0
+            data = aggregates.get(response_id)
+            if data is None:
+                aggregates[response_id] = data = {
+                    'best_submission_id': pk,
+                    'submission_count': 0,
+                    'grade_sum': 0,
+                    'best_grade': grade,
+                    'worst_grade': grade,
+                    'first_grade': grade,
+                    'first_submission_time': created,
+                    '_best_rank': rank(row),
+                }
+            data['submission_count'] += 1
+            data['grade_sum'] += grade
+            data['best_grade'] = max(data['best_grade'], grade)
+            data['worst_grade'] = min(data['worst_grade'], grade)
+            data['last_grade'] = grade
+            data['last_submission_time'] = created
+            if rank(row) > data['_best_rank']:
+                data['_best_rank'] = rank(row)
+                data['best_submission_id'] = pk
+
+        with transaction.atomic():
+            for response_id, data in aggregates.items():
+                del data['_best_rank']
+                Response.objects.filter(id=response_id).update(**data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0016_submission_response_key_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='best_submission',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='activities.Submission'),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='submission_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of graded submissions.'),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='grade_sum',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='best_grade',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='worst_grade',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='first_grade',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='last_grade',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='first_submission_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='response',
+            name='last_submission_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
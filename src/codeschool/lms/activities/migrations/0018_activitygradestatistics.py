@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+HISTOGRAM_BUCKETS = 10
+
+
+def fill_statistics(apps, schema_editor):
+    Response = apps.get_model('activities', 'Response')
+    ActivityGradeStatistics = \
+        apps.get_model('activities', 'ActivityGradeStatistics')
+
+    # Walk over graded responses in batches of increasing ids and accumulate
+    # the statistics of each activity in memory.
+    statistics = {}
+    last_id = 0
+    while True:
+        rows = list(Response.objects
+                    .filter(id__gt=last_id, submission_count__gt=0)
+                    .order_by('id')
+                    .values_list('id', 'activity_page_id', 'best_grade')
+                    [:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        for _, activity_id, grade in rows:
+            grade = grade or 0
+            data = statistics.get(activity_id)
+            if data is None:
+                statistics[activity_id] = data = {
+                    'activity_page_id': activity_id,
+                    'count': 0,
+                    'grade_sum': 0,
+                    'grade_sum_squares': 0.0,
+                    'min_grade': grade,
+                    'max_grade': grade,
+                }
+                for idx in range(HISTOGRAM_BUCKETS):
+                    data['bucket_%s' % idx] = 0
+            data['count'] += 1
+            data['grade_sum'] += grade
+            data['grade_sum_squares'] += float(grade) ** 2
+            data['min_grade'] = min(data['min_grade'], grade)
+            data['max_grade'] = max(data['max_grade'], grade)
+            idx = int(grade * HISTOGRAM_BUCKETS / 100)
+            idx = min(max(idx, 0), HISTOGRAM_BUCKETS - 1)
+            data['bucket_%s' % idx] += 1
+
+    ActivityGradeStatistics.objects.bulk_create(
+        [ActivityGradeStatistics(**data) for data in statistics.values()],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailcore', '0028_merge'),
+        ('activities', '0017_response_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityGradeStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('grade_sum', models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ('grade_sum_squares', models.FloatField(default=0.0)),
+                ('min_grade', models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True)),
+                ('max_grade', models.DecimalField(blank=True, decimal_places=3, max_digits=6, null=True)),
+                ('stale', models.BooleanField(default=False, help_text='True if min_grade and max_grade must be recomputed.')),
+                ('bucket_0', models.PositiveIntegerField(default=0)),
+                ('bucket_1', models.PositiveIntegerField(default=0)),
+                ('bucket_2', models.PositiveIntegerField(default=0)),
+                ('bucket_3', models.PositiveIntegerField(default=0)),
+                ('bucket_4', models.PositiveIntegerField(default=0)),
+                ('bucket_5', models.PositiveIntegerField(default=0)),
+                ('bucket_6', models.PositiveIntegerField(default=0)),
+                ('bucket_7', models.PositiveIntegerField(default=0)),
+                ('bucket_8', models.PositiveIntegerField(default=0)),
+                ('bucket_9', models.PositiveIntegerField(default=0)),
+                ('activity_page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='grade_statistics', to='wagtailcore.Page')),
+            ],
+            options={
+                'verbose_name': 'activity grade statistics',
+                'verbose_name_plural': 'activity grade statistics',
+            },
+        ),
+        migrations.RunPython(fill_statistics, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,10 @@ from .activity import Activity
 from .activity_list import ActivityList, ActivitySection
 from .response import Response
 from .submission import Submission
+from .grading_job import GradingJob
+from .regrade_run import RegradeRun
+from .fingerprint import ResponseFingerprint
+from .grade_statistics import ActivityGradeStatistics
 
 
 def register_submission_class(activity_class):
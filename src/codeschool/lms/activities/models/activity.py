@@ -1,5 +1,4 @@
 import decimal
-import json
 
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import ugettext_lazy as _
@@ -124,7 +123,7 @@ class Activity(AbsoluteUrlMixin, HasScorePage, metaclass=ActivityMeta):
     #     return get_response(user=user, context=context, activity=self)
 
     def submit(self, user, response_data=None, autograde=False,
-               recycle=False, submission_kwargs=None):
+               recycle=False, submission_kwargs=None, defer=False):
         """
         Create a new Submission object for the given question and saves it on
         the database.
@@ -147,6 +146,10 @@ class Activity(AbsoluteUrlMixin, HasScorePage, metaclass=ActivityMeta):
             submission_kwargs:
                 A dictionary with extra kwargs to be passed to the class'
                 submission_class constructor.
+            defer:
+                If true, grading is delegated to the grading queue. The
+                resulting submission is left in the pending state and
+                receives a ``.grading_job`` attribute with the queue ticket.
         """
 
         # Fetch submission class
@@ -173,15 +176,9 @@ class Activity(AbsoluteUrlMixin, HasScorePage, metaclass=ActivityMeta):
         submission = None
         recycled = False
         if recycle:
-            recyclable = submission_class.objects.filter(
-                response=response,
-                response_hash=response_hash,
-            ).order_by('created')
-            for pk, value in recyclable.values_list('id', 'response_data'):
-                if value == response_data:
-                    submission = recyclable.get(pk=pk)
-                    recycled = True
-                    break
+            submission = submission_class.objects.duplicate(
+                response, response_data, response_hash)
+            recycled = submission is not None
 
         # Proceed if no submission was created
         if submission is None:
@@ -194,10 +191,31 @@ class Activity(AbsoluteUrlMixin, HasScorePage, metaclass=ActivityMeta):
             )
 
         # Finalize submission item
-        submission.autograde()
+        submission.grading_job = submission.autograde(defer=defer)
         submission.recycled = recycled
         return submission
 
+    def regrade_all(self, method='update', workers=None, **kwargs):
+        """
+        Regrade all submissions to the activity in a pool of worker processes.
+
+        Args:
+            method:
+                Regrade method: 'update', 'best', 'worst', 'best-feedback' or
+                'worst-feedback'. See :meth:`Submission.regrade`.
+            workers:
+                Number of worker processes.
+
+        Additional keyword arguments (chunk_size, fail_fast, resume and
+        callback) are passed to
+        :func:`codeschool.lms.activities.regrade.regrade_activity`.
+
+        Return a :class:`RegradeRun` object with the results.
+        """
+
+        from ..regrade import regrade_activity
+        return regrade_activity(self, method, workers=workers, **kwargs)
+
     # def process_response_item(self, response, recycled=False):
     #     """
     #     Process this response item generated by other activities using a context
@@ -364,64 +382,108 @@ class Activity(AbsoluteUrlMixin, HasScorePage, metaclass=ActivityMeta):
     #
     # Plagiarism detection
     #
-    def best_responses(self, context):
+    def best_responses(self):
         """
-        Return a dictionary mapping users to their best responses.
+        Return a dictionary mapping users to their best submissions.
+
+        Users and submissions are fetched in a single query from the
+        best_submission pointer maintained by each response.
         """
 
-        mapping = {}
-        responses = self.responses.filter(context=context)
-        for response in responses:
-            mapping[response.user] = response.best_submission()
-        return mapping
+        responses = self.responses\
+            .filter(best_submission__isnull=False)\
+            .select_related('user', 'best_submission')
+        return {response.user: response.best_submission
+                for response in responses}
 
-    def find_identical_responses(self, context, key=None, cmp=None, thresh=1):
+    def find_similar_responses(self, threshold=None):
         """
-        Finds all responses with identical response_data in the set of best
-        responses.
+        Finds all pairs of near-duplicate responses.
+
+        The best submission of each response is indexed by its MinHash
+        signature as submissions are graded and candidate pairs are found by
+        locality-sensitive hashing, without comparing every pair of
+        responses. See :mod:`codeschool.lms.activities.similarity`.
 
         Args:
-            key:
-                The result of key(response_data) is used for normalizing the
-                different responses in the response set.
-            cmp:
-                A comparison function that take the outputs of key(x) for a
-                pair of responses and return True if the two arguments are to
-                be considered equal.
-            thresh:
-                Minimum threshold for the result of cmp(x, y) to be considered
-                plagiarism.
-        """
-
-        key = key or (lambda x: x)
-        responses = self.best_responses(context).values()
-        response_data = [(x, key(x.response_data))
-                         for x in responses if x is not None]
-
-        # We iterate this list in O^2 complexity by comparing every pair of
-        # responses and checking if cmp(data1, data2) returns a value greater
-        # than or equal thresh.
-        bad_pairs = {}
-        cmp = cmp or (lambda x, y: x == y)
-        for i, (resp_a, key_a) in enumerate(response_data):
-            for j in range(i + 1, len(response_data)):
-                resp_b, key_b = response_data[j]
-                value = cmp(key_a, key_b)
-                if value >= thresh:
-                    bad_pairs[resp_a, resp_b] = value
-        return bad_pairs
-
-    def group_identical_responses(self, context, key=None, keep_single=True):
-        key = key or (lambda x: json.dumps(x))
-        bad_values = {}
-        for response in self.best_responses(context).values():
-            if response is None:
-                continue
-            key_data = key(response.response_data)
-            response_list = bad_values.setdefault(key_data, [])
-            response_list.append(response)
-
-        return bad_values
+            threshold:
+                Minimum estimated similarity (between 0 and 1) of a pair of
+                responses to be considered plagiarism.
+
+        Return a dictionary mapping pairs of response ids to their estimated
+        similarity.
+        """
+
+        from .fingerprint import ResponseFingerprint
+        from ..similarity import DEFAULT_THRESHOLD
+
+        if threshold is None:
+            threshold = DEFAULT_THRESHOLD
+        fingerprints = ResponseFingerprint.objects.for_activity(self)
+        pairs = {}
+        for index in fingerprints.lsh_indexes().values():
+            pairs.update(index.similar_pairs(threshold))
+        return pairs
+
+    def group_similar_responses(self, threshold=None):
+        """
+        Group near-duplicate responses into clusters.
+
+        Return a list of (response ids, pairs) tuples, largest clusters
+        first, in which pairs maps the similar pairs of responses in the
+        cluster to their estimated similarity.
+        """
+
+        from ..similarity import clusters
+
+        pairs = self.find_similar_responses(threshold)
+        result = [(cluster, {}) for cluster in clusters(pairs)]
+        position = {key: idx
+                    for idx, item in enumerate(result)
+                    for key in item[0]}
+        for pair, value in pairs.items():
+            result[position[pair[0]]][1][pair] = value
+        return result
+
+    def group_identical_responses(self, min_size=2):
+        """
+        Group the responses whose submissions have the same normalized
+        response key (see :meth:`Submission.response_key`).
+
+        Grouping is done by the database in a single aggregate query over the
+        indexed response_key_hash column. All graded submissions are
+        considered.
+
+        Args:
+            min_size:
+                Minimum number of users in a group.
+
+        Return a list of dictionaries with the "key" of each group, the
+        number of "submissions" and the list of ids of the "users" that
+        submitted it, sorted by decreasing number of users.
+        """
+
+        from .submission import Submission
+
+        rows = Submission.objects\
+            .filter(response__activity_page_id=self.id,
+                    status=Submission.STATUS_DONE)\
+            .exclude(response_key_hash='')\
+            .values_list('response_key_hash', 'response__user_id')\
+            .annotate(count=models.Count('id'))\
+            .order_by()
+
+        groups = {}
+        for key, user_id, count in rows:
+            group = groups.setdefault(
+                key, {'key': key, 'submissions': 0, 'users': []})
+            group['submissions'] += count
+            group['users'].append(user_id)
+
+        result = [group for group in groups.values()
+                  if len(group['users']) >= min_size]
+        result.sort(key=lambda x: len(x['users']), reverse=True)
+        return result
 
     #
     # Statistics
@@ -453,50 +515,58 @@ class Activity(AbsoluteUrlMixin, HasScorePage, metaclass=ActivityMeta):
 
         return queryset
 
-    def _stats(self, attr, context, by_item=False):
-        if by_item:
-            items = self.response_items(context, self.STATUS_DONE)
-            values_list = items.values_list(attr, flat=True)
-            return Statistics(attr, values_list)
-        else:
-            if context == 'any':
-                items = self.responses.all()
-            else:
-                context = context or self.context
-                items = self.responses.all().filter(context=context)
-            return Statistics(attr, items.values_list(attr, flat=True))
-
-    def best_final_grade(self, context=None):
+    def grade_statistics(self):
+        """
+        Return the ActivityGradeStatistics object with the aggregate
+        statistics for the grades of all responses to this activity.
+        """
+
+        from .grade_statistics import ActivityGradeStatistics
+        return ActivityGradeStatistics.objects.for_activity(self)
+
+    def _item_stats(self, attr):
+        from codeschool.core.statistics import Statistics
+        from .submission import Submission
+
+        submissions = Submission.objects\
+            .filter(response__activity_page_id=self.id,
+                    status=Submission.STATUS_DONE)\
+            .non_polymorphic()
+        return Statistics.from_queryset(submissions, attr)
+
+    def best_final_grade(self):
         """
         Return the best final grade given for this activity.
         """
 
-        return self._stats('final_grade', context).max()
+        return self.grade_statistics().max_grade or 0
 
-    def best_given_grade(self, context=None):
+    def best_given_grade(self):
         """
         Return the best grade given for this activity before applying any
         penalties and bonuses.
         """
 
-        return self._stats('given_grade', context).min()
+        return self._item_stats('given_grade').max()
 
-    def mean_final_grade(self, context=None, by_item=False):
+    def mean_final_grade(self, by_item=False):
         """
         Return the average value for the final grade for this activity.
 
-        If by_item is True, compute the average over all response items instead
-        of using the responses for each student.
+        If by_item is True, compute the average over all submissions instead
+        of using the best grade of each student.
         """
 
-        return self._stats('final_grade', context, by_item).mean()
+        if by_item:
+            return self._item_stats('final_grade').mean()
+        return self.grade_statistics().mean or 0
 
-    def mean_given_grade(self, by_item=False):
+    def mean_given_grade(self):
         """
         Return the average value for the given grade for this activity.
         """
 
-        return self._stats('given_grade', context, by_item).mean()
+        return self._item_stats('given_grade').mean()
 
     # Permissions
     def can_edit(self, user):
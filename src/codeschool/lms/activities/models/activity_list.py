@@ -1,7 +1,9 @@
 import model_reference
+from django.shortcuts import render
 from django.utils.translation import ugettext_lazy as _
 
 from codeschool import models, panels
+from codeschool.lms.gamification.models import leaderboard_context
 
 from .activity import Activity
 
@@ -119,7 +121,9 @@ class ActivityList(models.ShortDescriptionPageMixin, models.Page):
     subpage_types = ['ActivitySection']
 
 
-class ActivitySection(models.ShortDescriptionPageMixin, models.Page):
+class ActivitySection(models.RoutablePageMixin,
+                      models.ShortDescriptionPageMixin,
+                      models.Page):
     """
     List of activities.
     """
@@ -256,6 +260,12 @@ class ActivitySection(models.ShortDescriptionPageMixin, models.Page):
             object_list=[obj.specific for obj in self.get_children()]
         )
 
+    @models.route(r'^leaderboard/$')
+    def route_leaderboard(self, request, *args, **kwargs):
+        context = self.get_context(request, *args, **kwargs)
+        context.update(leaderboard_context(self, request.user))
+        return render(request, 'lms/activities/leaderboard.jinja2', context)
+
     # Wagtail Admin
     parent_types = [ActivityList]
     subpage_types = Activity.CONCRETE_ACTIVITY_TYPES
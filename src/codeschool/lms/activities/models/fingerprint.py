@@ -0,0 +1,143 @@
+from django.utils.translation import ugettext_lazy as _
+
+from codeschool import models
+
+from .. import similarity
+
+
+class ResponseFingerprintQuerySet(models.QuerySet):
+    def for_activity(self, activity):
+        """
+        Filter fingerprints for the given activity.
+        """
+
+        return self.filter(activity_page_id=activity.id)
+
+    def lsh_indexes(self):
+        """
+        Return a dictionary mapping each language to a
+        :class:`codeschool.lms.activities.similarity.LSHIndex` with the
+        signatures in the queryset, keyed by response id.
+
+        Responses written in different languages are never compared.
+        """
+
+        indexes = {}
+        data = self.order_by('id')\
+            .values_list('response_id', 'language', 'signature')
+        for response_id, language, sig in data:
+            if language not in indexes:
+                indexes[language] = similarity.LSHIndex()
+            indexes[language].add(response_id, sig)
+        return indexes
+
+
+class _ResponseFingerprintManager(models.Manager):
+    def register(self, submission):
+        """
+        Update the fingerprint of the submission's response if the submission
+        is at least as good as the one currently indexed.
+
+        Return the fingerprint or None if the submission cannot be indexed.
+        """
+
+        source = submission.similarity_source()
+        if source is None:
+            return None
+        language, text = source
+        grade = submission.given_grade or 0
+
+        fingerprint = self.filter(response_id=submission.response_id).first()
+        if fingerprint is not None and \
+                fingerprint.submission_id != submission.id and \
+                fingerprint.grade > grade:
+            return fingerprint
+
+        sig = similarity.signature(text, language)
+        if sig is None:
+            return fingerprint
+        if fingerprint is None:
+            fingerprint = self.model(
+                response_id=submission.response_id,
+                activity_page_id=submission.response.activity_page_id,
+            )
+        fingerprint.submission_id = submission.id
+        fingerprint.language = language or ''
+        fingerprint.grade = grade
+        fingerprint.signature = sig
+        fingerprint.save()
+        return fingerprint
+
+    def rebuild(self, activity):
+        """
+        Recompute the fingerprints of all responses of the given activity
+        from their best submissions.
+
+        Return the number of indexed responses.
+        """
+
+        from .submission import Submission
+
+        self.filter(activity_page_id=activity.id).delete()
+        submissions = Submission.objects\
+            .filter(response__activity_page_id=activity.id,
+                    status=Submission.STATUS_DONE)\
+            .order_by('response_id', '-given_grade', '-created')
+        last_response = None
+        count = 0
+        for submission in submissions.iterator():
+            if submission.response_id == last_response:
+                continue
+            last_response = submission.response_id
+            if self.register(submission) is not None:
+                count += 1
+        return count
+
+
+ResponseFingerprintManager = \
+    _ResponseFingerprintManager.from_queryset(ResponseFingerprintQuerySet)
+
+
+class ResponseFingerprint(models.Model):
+    """
+    MinHash signature of the best submission of a response.
+
+    Fingerprints are updated as submissions are graded and are used to find
+    near-duplicate responses in an activity without comparing every pair of
+    submissions. See :mod:`codeschool.lms.activities.similarity`.
+    """
+
+    class Meta:
+        verbose_name = _('response fingerprint')
+        verbose_name_plural = _('response fingerprints')
+
+    response = models.OneToOneField(
+        'Response',
+        related_name='fingerprint',
+        on_delete=models.CASCADE,
+    )
+    activity_page = models.ForeignKey(
+        models.Page,
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    submission = models.ForeignKey(
+        'Submission',
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    language = models.CharField(
+        max_length=50,
+        blank=True,
+    )
+    grade = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        default=0,
+    )
+    signature = models.JSONField()
+    modified = models.DateTimeField(auto_now=True)
+    objects = ResponseFingerprintManager()
+
+    def __str__(self):
+        return '<ResponseFingerprint: response #%s>' % self.response_id
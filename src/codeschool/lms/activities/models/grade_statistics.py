@@ -0,0 +1,250 @@
+from decimal import Decimal
+
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils.translation import ugettext_lazy as _
+
+from codeschool import models
+
+#: Number of buckets in the grade histogram. Buckets have the same width and
+#: the last one also includes the maximum grade.
+HISTOGRAM_BUCKETS = 10
+
+#: Maximum grade in an activity.
+MAX_GRADE = Decimal(100)
+
+
+def grade_bucket(grade):
+    """
+    Return the histogram bucket of the given grade.
+    """
+
+    idx = int(grade * HISTOGRAM_BUCKETS / MAX_GRADE)
+    return min(max(idx, 0), HISTOGRAM_BUCKETS - 1)
+
+
+def bucket_field(idx):
+    return 'bucket_%s' % idx
+
+
+class _ActivityGradeStatisticsManager(models.Manager):
+    def register_grade(self, activity_id, old, new):
+        """
+        Update the statistics of an activity after the grade of one of its
+        responses changes from old to new.
+
+        The old grade is None for responses that were not graded before. The
+        update is a single UPDATE query with no reads.
+        """
+
+        if old == new:
+            return
+
+        new_value = models.Value(new, output_field=models.DecimalField(
+            max_digits=6, decimal_places=3))
+        kwargs = {
+            'grade_sum': models.F('grade_sum') + (new - (old or 0)),
+            'grade_sum_squares': (models.F('grade_sum_squares') +
+                                  float(new) ** 2 - float(old or 0) ** 2),
+            'min_grade': Least(Coalesce('min_grade', new_value), new_value),
+            'max_grade': Greatest(Coalesce('max_grade', new_value), new_value),
+        }
+        new_bucket = bucket_field(grade_bucket(new))
+        kwargs[new_bucket] = models.F(new_bucket) + 1
+
+        if old is None:
+            kwargs['count'] = models.F('count') + 1
+        else:
+            old_bucket = bucket_field(grade_bucket(old))
+            if old_bucket != new_bucket:
+                kwargs[old_bucket] = models.F(old_bucket) - 1
+
+            # The old grade may have been the minimum (or maximum) grade.
+            # Since we do not know the next value, the row is marked as stale
+            # and min/max are recomputed in the next read.
+            extreme = 'min_grade' if new > old else 'max_grade'
+            kwargs['stale'] = models.Case(
+                models.When(**{extreme: old, 'then': models.Value(True)}),
+                default=models.F('stale'),
+                output_field=models.BooleanField(),
+            )
+
+        queryset = self.filter(activity_page_id=activity_id)
+        if not queryset.update(**kwargs):
+            self.get_or_create(activity_page_id=activity_id)
+            queryset.update(**kwargs)
+
+    def for_activity(self, activity):
+        """
+        Return the statistics object for the given activity.
+
+        Stale min/max values are recomputed and an empty object is returned
+        for activities that were never graded.
+        """
+
+        try:
+            stats = self.get(activity_page_id=activity.id)
+        except self.model.DoesNotExist:
+            return self.model(activity_page_id=activity.id)
+        if stats.stale:
+            stats.refresh_extremes()
+        return stats
+
+    def rebuild(self, activity=None):
+        """
+        Recompute the statistics of all activities (or of the given activity)
+        from the grades of their responses.
+
+        All activities are aggregated by a single GROUP BY query and the
+        results are saved with a single bulk insert.
+        """
+
+        from .response import Response
+
+        responses = Response.objects.filter(submission_count__gt=0)
+        current = self.all()
+        if activity is not None:
+            responses = responses.filter(activity_page_id=activity.id)
+            current = current.filter(activity_page_id=activity.id)
+
+        grade = models.F('best_grade')
+        aggregates = {
+            'count': models.Count('id'),
+            'grade_sum': models.Sum(grade),
+            'grade_sum_squares': models.Sum(
+                grade * grade, output_field=models.FloatField()),
+            'min_grade': models.Min(grade),
+            'max_grade': models.Max(grade),
+        }
+        for idx in range(HISTOGRAM_BUCKETS):
+            lookup = {'best_grade__gte': idx * MAX_GRADE / HISTOGRAM_BUCKETS,
+                      'then': models.Value(1)}
+            if idx < HISTOGRAM_BUCKETS - 1:
+                lookup['best_grade__lt'] = \
+                    (idx + 1) * MAX_GRADE / HISTOGRAM_BUCKETS
+            aggregates[bucket_field(idx)] = models.Sum(models.Case(
+                models.When(**lookup),
+                default=models.Value(0),
+                output_field=models.IntegerField(),
+            ))
+
+        rows = responses\
+            .order_by()\
+            .values('activity_page_id')\
+            .annotate(**aggregates)
+        objects = [self.model(**row) for row in rows]
+        current.delete()
+        self.bulk_create(objects)
+        return len(objects)
+
+
+ActivityGradeStatisticsManager = _ActivityGradeStatisticsManager
+
+
+class ActivityGradeStatistics(models.Model):
+    """
+    Aggregate statistics of the grades of all responses to an activity.
+
+    The grade of a response is the best final grade among its submissions.
+    Aggregates are updated in constant time by Response.register_submission()
+    and can be rebuilt from scratch with the "rebuildstatistics" management
+    command.
+    """
+
+    class Meta:
+        verbose_name = _('activity grade statistics')
+        verbose_name_plural = _('activity grade statistics')
+
+    activity_page = models.OneToOneField(
+        models.Page,
+        related_name='grade_statistics',
+        on_delete=models.CASCADE,
+    )
+    count = models.PositiveIntegerField(default=0)
+    grade_sum = models.DecimalField(
+        max_digits=16,
+        decimal_places=3,
+        default=0,
+    )
+    grade_sum_squares = models.FloatField(default=0.0)
+    min_grade = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        blank=True,
+        null=True,
+    )
+    max_grade = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        blank=True,
+        null=True,
+    )
+    stale = models.BooleanField(
+        default=False,
+        help_text=_('True if min_grade and max_grade must be recomputed.'),
+    )
+    bucket_0 = models.PositiveIntegerField(default=0)
+    bucket_1 = models.PositiveIntegerField(default=0)
+    bucket_2 = models.PositiveIntegerField(default=0)
+    bucket_3 = models.PositiveIntegerField(default=0)
+    bucket_4 = models.PositiveIntegerField(default=0)
+    bucket_5 = models.PositiveIntegerField(default=0)
+    bucket_6 = models.PositiveIntegerField(default=0)
+    bucket_7 = models.PositiveIntegerField(default=0)
+    bucket_8 = models.PositiveIntegerField(default=0)
+    bucket_9 = models.PositiveIntegerField(default=0)
+    objects = ActivityGradeStatisticsManager()
+
+    def __str__(self):
+        return '<ActivityGradeStatistics: page #%s (%s grades)>' % (
+            self.activity_page_id, self.count)
+
+    @property
+    def mean(self):
+        """
+        Mean grade or None if no response was graded.
+        """
+
+        if not self.count:
+            return None
+        return float(self.grade_sum) / self.count
+
+    @property
+    def std(self):
+        """
+        Standard deviation of the grades or None if no response was graded.
+        """
+
+        if not self.count:
+            return None
+        mean = self.mean
+        variance = self.grade_sum_squares / self.count - mean * mean
+        return max(variance, 0.0) ** 0.5
+
+    @property
+    def histogram(self):
+        """
+        A list of (start, end, count) tuples for each histogram bucket.
+        """
+
+        width = MAX_GRADE / HISTOGRAM_BUCKETS
+        return [(idx * width, (idx + 1) * width,
+                 getattr(self, bucket_field(idx)))
+                for idx in range(HISTOGRAM_BUCKETS)]
+
+    def refresh_extremes(self, commit=True):
+        """
+        Recompute min_grade and max_grade from the grades of the responses.
+        """
+
+        from .response import Response
+
+        data = Response.objects\
+            .filter(activity_page_id=self.activity_page_id,
+                    submission_count__gt=0)\
+            .aggregate(min_grade=models.Min('best_grade'),
+                       max_grade=models.Max('best_grade'))
+        self.min_grade = data['min_grade']
+        self.max_grade = data['max_grade']
+        self.stale = False
+        if commit:
+            self.save(update_fields=['min_grade', 'max_grade', 'stale'])
@@ -0,0 +1,187 @@
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from codeschool import models
+
+logger = logging.getLogger('codeschool.lms.activities')
+
+
+class GradingJobQuerySet(models.QuerySet):
+    def pending(self):
+        """
+        Filter only jobs that are waiting for a worker.
+        """
+
+        return self.filter(status=GradingJob.STATUS_PENDING)
+
+    def running(self):
+        """
+        Filter only jobs that were claimed by a worker and did not finish yet.
+        """
+
+        return self.filter(status=GradingJob.STATUS_RUNNING)
+
+    def depth(self):
+        """
+        Return the number of jobs waiting in the queue.
+        """
+
+        return self.pending().count()
+
+
+class _GradingJobManager(models.Manager):
+    def enqueue(self, submission):
+        """
+        Push a new grading job for the given submission and return it.
+
+        The returned job works as a ticket: its primary key can be passed to
+        the client, which may poll for the job status later.
+        """
+
+        if submission.pk is None:
+            raise ValueError('submission must be saved before being enqueued')
+        return self.create(submission_id=submission.pk)
+
+    def from_ticket(self, ticket, user, activity):
+        """
+        Return the job for the given ticket if it belongs to a response of the
+        given user to the given activity.
+
+        Return None for unknown tickets, including tickets of jobs that were
+        already removed and tickets that belong to other users.
+        """
+
+        try:
+            return self.get(
+                pk=int(ticket),
+                submission__response__user=user,
+                submission__response__activity_page=activity,
+            )
+        except (TypeError, ValueError, self.model.DoesNotExist):
+            return None
+
+    def claim(self, worker='', batch=10):
+        """
+        Atomically claim the oldest pending job for the given worker.
+
+        Return None if the queue is empty.
+
+        The claim is a conditional UPDATE over the job status, hence it is safe
+        to call this method concurrently from several worker processes: only
+        one of them will succeed in moving a job from the pending state.
+        """
+
+        pending = self.get_queryset().pending().order_by('created', 'id')
+        for pk in pending.values_list('id', flat=True)[:batch]:
+            claimed = self.filter(pk=pk, status=GradingJob.STATUS_PENDING)\
+                .update(status=GradingJob.STATUS_RUNNING,
+                        status_changed=timezone.now(),
+                        worker=worker)
+            if claimed:
+                return self.get(pk=pk)
+        return None
+
+    def requeue_stale(self, timeout):
+        """
+        Move jobs that are running for more than timeout seconds back to the
+        pending state.
+
+        This recovers jobs from workers that died while grading.
+        """
+
+        limit = timezone.now() - timedelta(seconds=timeout)
+        return self.get_queryset()\
+            .running()\
+            .filter(status_changed__lt=limit)\
+            .update(status=GradingJob.STATUS_PENDING, worker='')
+
+
+GradingJobManager = _GradingJobManager.from_queryset(GradingJobQuerySet)
+
+
+class GradingJob(models.StatusModel, models.TimeStampedModel):
+    """
+    A request for grading a submission outside the HTTP request/response
+    cycle.
+
+    Jobs are stored in the database and are consumed by a pool of worker
+    processes started with the "gradingqueue" management command.
+    """
+
+    class Meta:
+        verbose_name = _('grading job')
+        verbose_name_plural = _('grading jobs')
+        index_together = [('status', 'created')]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS = models.Choices(
+        (STATUS_PENDING, _('pending')),
+        (STATUS_RUNNING, _('running')),
+        (STATUS_DONE, _('done')),
+        (STATUS_FAILED, _('failed')),
+    )
+
+    submission = models.ForeignKey(
+        'Submission',
+        related_name='grading_jobs',
+        on_delete=models.CASCADE,
+    )
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+    )
+    error = models.TextField(
+        blank=True,
+    )
+    objects = GradingJobManager()
+
+    # Status properties
+    is_pending = property(lambda x: x.status == x.STATUS_PENDING)
+    is_running = property(lambda x: x.status == x.STATUS_RUNNING)
+    is_finished = property(lambda x: x.status in (x.STATUS_DONE,
+                                                  x.STATUS_FAILED))
+
+    #: The ticket is simply the job's primary key
+    ticket = property(lambda x: x.pk)
+
+    def __str__(self):
+        return '<GradingJob #%s: %s>' % (self.pk, self.status)
+
+    def get_submission(self):
+        """
+        Return the submission instance with its specific polymorphic type.
+        """
+
+        from .submission import Submission
+        return Submission.objects.get(pk=self.submission_id)
+
+    def run(self):
+        """
+        Grade the submission associated with the job.
+
+        Return the graded submission.
+        """
+
+        submission = self.get_submission()
+        try:
+            submission.autograde(defer=False)
+        except submission.InvalidSubmissionError:
+            # Invalid submissions are graded (with zero) and the error is
+            # already registered in the submission's feedback_data.
+            self.status = self.STATUS_DONE
+        except Exception as ex:
+            logger.exception('error grading submission #%s' % submission.pk)
+            self.status = self.STATUS_FAILED
+            self.error = '%s: %s' % (type(ex).__name__, ex)
+        else:
+            self.status = self.STATUS_DONE
+        self.save(update_fields=['status', 'status_changed', 'error',
+                                 'modified'])
+        return submission
@@ -1,3 +1,5 @@
+from django.utils.translation import ugettext_lazy as _
+
 from codeschool import models
 
 
@@ -18,6 +20,15 @@ class ResponseDataMixin(models.Model):
         max_length=32,
         blank=True,
     )
+    response_key_hash = models.CharField(
+        max_length=32,
+        blank=True,
+        db_index=True,
+        help_text=_(
+            'Hash of the normalized response data. Submissions that differ '
+            'only by trivial transformations have the same key.'
+        ),
+    )
 
 
 class FeedbackDataMixin(models.Model):
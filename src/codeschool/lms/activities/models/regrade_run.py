@@ -0,0 +1,137 @@
+from django.utils.translation import ugettext_lazy as _
+
+from codeschool import models
+
+
+class RegradeRunQuerySet(models.QuerySet):
+    def running(self):
+        """
+        Filter runs that did not finish (either still running or
+        interrupted).
+        """
+
+        return self.filter(status=RegradeRun.STATUS_RUNNING)
+
+    def for_activity(self, activity):
+        """
+        Filter runs for the given activity.
+        """
+
+        return self.filter(activity_page_id=activity.id)
+
+
+class _RegradeRunManager(models.Manager):
+    def start(self, activity, method='update', fail_fast=False, resume=True):
+        """
+        Return a run for the given activity and regrade method.
+
+        If resume is True, it returns the last interrupted run with the same
+        parameters, if it exists. Otherwise, it creates a new run.
+        """
+
+        if resume:
+            interrupted = self.get_queryset()\
+                .for_activity(activity)\
+                .running()\
+                .filter(method=method, fail_fast=fail_fast)\
+                .order_by('-created')\
+                .first()
+            if interrupted is not None:
+                return interrupted
+        return self.create(activity_page_id=activity.id, method=method,
+                           fail_fast=fail_fast)
+
+
+RegradeRunManager = _RegradeRunManager.from_queryset(RegradeRunQuerySet)
+
+
+class RegradeRun(models.StatusModel, models.TimeStampedModel):
+    """
+    Keeps track of the progress of regrading all submissions of an activity.
+
+    Submissions are processed in increasing order of primary key and the
+    checkpoint stores the last processed id. An interrupted run can thus be
+    resumed from where it stopped.
+    """
+
+    class Meta:
+        verbose_name = _('regrade run')
+        verbose_name_plural = _('regrade runs')
+
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+
+    STATUS = models.Choices(
+        (STATUS_RUNNING, _('running')),
+        (STATUS_DONE, _('done')),
+    )
+
+    METHOD_CHOICES = [
+        ('update', _('update')),
+        ('best', _('best')),
+        ('worst', _('worst')),
+        ('best-feedback', _('best (update feedback)')),
+        ('worst-feedback', _('worst (update feedback)')),
+    ]
+
+    activity_page = models.ForeignKey(
+        models.Page,
+        related_name='regrade_runs',
+        on_delete=models.CASCADE,
+    )
+    method = models.CharField(
+        max_length=20,
+        choices=METHOD_CHOICES,
+        default='update',
+    )
+    fail_fast = models.BooleanField(default=False)
+    last_id = models.PositiveIntegerField(
+        default=0,
+        help_text=_('Checkpoint: id of the last processed submission.'),
+    )
+    graded = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    elapsed = models.FloatField(
+        default=0.0,
+        help_text=_('Total time spent grading, in seconds.'),
+    )
+    objects = RegradeRunManager()
+
+    is_running = property(lambda x: x.status == x.STATUS_RUNNING)
+
+    def __str__(self):
+        return '<RegradeRun #%s: %s (%s graded)>' % (
+            self.pk, self.status, self.graded)
+
+    @property
+    def throughput(self):
+        """
+        Number of submissions graded per second.
+        """
+
+        if not self.elapsed:
+            return 0.0
+        return self.graded / self.elapsed
+
+    def checkpoint(self, last_id, stats, elapsed):
+        """
+        Register the results of a batch of regraded submissions with ids up to
+        last_id.
+        """
+
+        self.last_id = last_id
+        self.graded += stats.get('graded', 0)
+        self.changed += stats.get('changed', 0)
+        self.errors += stats.get('errors', 0)
+        self.elapsed += elapsed
+        self.save(update_fields=['last_id', 'graded', 'changed', 'errors',
+                                 'elapsed', 'modified'])
+
+    def finish(self):
+        """
+        Mark run as done.
+        """
+
+        self.status = self.STATUS_DONE
+        self.save(update_fields=['status', 'status_changed', 'modified'])
@@ -1,3 +1,4 @@
+from annoying.functions import get_config
 from django.utils.translation import ugettext_lazy as _
 
 from codeschool import models
@@ -94,6 +95,57 @@ class Response(models.CopyMixin,
     stars = models.FloatField(default=0.0)
     is_finished = models.BooleanField(default=bool)
     is_correct = models.BooleanField(default=bool)
+
+    # Running aggregates over the graded submissions. They are updated by
+    # register_submission() and can be recomputed by update_aggregates().
+    best_submission = models.ForeignKey(
+        'Submission',
+        related_name='+',
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    submission_count = models.PositiveIntegerField(
+        default=0,
+        help_text=_('Number of graded submissions.'),
+    )
+    grade_sum = models.DecimalField(
+        max_digits=12,
+        decimal_places=3,
+        default=0,
+    )
+    best_grade = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        blank=True,
+        null=True,
+    )
+    worst_grade = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        blank=True,
+        null=True,
+    )
+    first_grade = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        blank=True,
+        null=True,
+    )
+    last_grade = models.DecimalField(
+        max_digits=6,
+        decimal_places=3,
+        blank=True,
+        null=True,
+    )
+    first_submission_time = models.DateTimeField(
+        blank=True,
+        null=True,
+    )
+    last_submission_time = models.DateTimeField(
+        blank=True,
+        null=True,
+    )
     objects = ResponseManager()
 
     #: The number of submissions in the current session.
@@ -149,13 +201,48 @@ class Response(models.CopyMixin,
                 return self.pk == other.pk
         return NotImplemented
 
-    def register_submission(self, submission):
+    #: Fields updated by register_submission() and update_aggregates().
+    AGGREGATE_FIELDS = [
+        'best_submission', 'submission_count', 'grade_sum', 'best_grade',
+        'worst_grade', 'first_grade', 'last_grade', 'first_submission_time',
+        'last_submission_time',
+    ]
+
+    @property
+    def average_grade(self):
+        """
+        Average final grade of all graded submissions.
+        """
+
+        if not self.submission_count:
+            return None
+        return self.grade_sum / self.submission_count
+
+    def register_submission(self, submission, regrade=False):
         """
         This method is called when a submission is graded.
+
+        If regrade is True, the submission was already registered and its
+        grade changed. Aggregates and scores are recomputed from all graded
+        submissions, since the new grade may be lower than the old one.
         """
 
         assert submission.response_id == self.id
+        if regrade:
+            self.update_aggregates()
+            self.update_score()
+        else:
+            old_grade = self.best_grade
+            self._increment_aggregates(submission)
+            self._register_grade(old_grade)
+            self._register_score(submission)
 
+        # Keep the near-duplicate detection index up to date
+        if get_config('CODESCHOOL_SIMILARITY_INDEX', True):
+            from .fingerprint import ResponseFingerprint
+            ResponseFingerprint.objects.register(submission)
+
+    def _register_score(self, submission):
         # Register points and stars associated with submission.
         score_kwargs = {}
         final_points = submission.final_points()
@@ -167,14 +254,155 @@ class Response(models.CopyMixin,
             score_kwargs['stars'] = final_stars - self.stars
             self.stars = final_stars
 
-        # If some score has changed, we save the update fields and update the
-        # corresponding UserScore object
+        # If some score has changed, we save it and update the corresponding
+        # UserScore object
+        if score_kwargs:
+            self.save(update_fields=list(score_kwargs))
+            from codeschool.lms.gamification.models import UserScore
+            score_kwargs['diff'] = True
+            UserScore.update(self.user, self.activity_page, **score_kwargs)
+
+    def _increment_aggregates(self, submission):
+        # Aggregates are updated by the database in a single UPDATE, so
+        # submissions of the same response graded concurrently are all
+        # counted. The in-memory values are reloaded afterwards.
+        grade = submission.final_grade or 0
+        created = submission.created
+        queryset = Response.objects.non_polymorphic().filter(pk=self.pk)
+
+        def replace(field, condition, value):
+            output_field = self._meta.get_field(field)
+            return models.Case(
+                models.When(condition, then=models.Value(value)),
+                default=models.F(field),
+                output_field=output_field,
+            )
+
+        is_first = models.Q(first_submission_time__isnull=True) | \
+            models.Q(first_submission_time__gt=created)
+        is_last = models.Q(last_submission_time__isnull=True) | \
+            models.Q(last_submission_time__lte=created)
+        queryset.update(
+            submission_count=models.F('submission_count') + 1,
+            grade_sum=models.F('grade_sum') + grade,
+            best_grade=replace('best_grade',
+                               models.Q(best_grade__isnull=True) |
+                               models.Q(best_grade__lt=grade), grade),
+            worst_grade=replace('worst_grade',
+                                models.Q(worst_grade__isnull=True) |
+                                models.Q(worst_grade__gt=grade), grade),
+            first_grade=replace('first_grade', is_first, grade),
+            last_grade=replace('last_grade', is_last, grade),
+            first_submission_time=replace('first_submission_time', is_first,
+                                          created),
+            last_submission_time=replace('last_submission_time', is_last,
+                                         created),
+        )
+
+        # Ties are resolved in favor of the current best submission, which is
+        # the oldest one in the usual case of submissions graded in order. The
+        # best submission is only replaced if it did not change since it was
+        # compared with the new one.
+        while True:
+            best = self.best_submission
+            if best is not None and \
+                    submission_rank(submission) <= submission_rank(best):
+                break
+            if queryset.filter(best_submission=best)\
+                    .update(best_submission=submission):
+                break
+            self.refresh_from_db(fields=['best_submission'])
+        self.refresh_from_db(fields=self.AGGREGATE_FIELDS)
+
+    def _aggregate_submission(self, submission):
+        grade = submission.final_grade or 0
+        created = submission.created
+
+        self.submission_count += 1
+        self.grade_sum += grade
+        if self.best_grade is None or grade > self.best_grade:
+            self.best_grade = grade
+        if self.worst_grade is None or grade < self.worst_grade:
+            self.worst_grade = grade
+        if self.first_submission_time is None or \
+                created < self.first_submission_time:
+            self.first_submission_time = created
+            self.first_grade = grade
+        if self.last_submission_time is None or \
+                created >= self.last_submission_time:
+            self.last_submission_time = created
+            self.last_grade = grade
+
+        # Ties are resolved in favor of the current best submission, which is
+        # the oldest one in the usual case of submissions graded in order.
+        best = self.best_submission
+        if best is None or submission_rank(submission) > submission_rank(best):
+            self.best_submission = submission
+
+    def update_aggregates(self, commit=True):
+        """
+        Recompute the running aggregates from all graded submissions.
+
+        This is necessary after the grades of existing submissions change
+        (e.g., after regrading).
+        """
+
+        submissions = self.submissions\
+            .filter(status=self.STATUS_DONE)\
+            .non_polymorphic()\
+            .order_by('created', 'id')\
+            .only('id', 'response', 'created', 'given_grade', 'final_grade',
+                  'score', 'stars')
+
+        old_grade = self.best_grade
+        self.best_submission = None
+        self.submission_count = 0
+        self.grade_sum = 0
+        self.best_grade = self.worst_grade = None
+        self.first_grade = self.last_grade = None
+        self.first_submission_time = self.last_submission_time = None
+        for submission in submissions:
+            self._aggregate_submission(submission)
+        if commit:
+            self.save(update_fields=self.AGGREGATE_FIELDS)
+            self._register_grade(old_grade)
+
+    def update_score(self):
+        """
+        Recompute points and stars from the best graded submissions.
+
+        Unlike register_submission(), which only awards new points and
+        stars, this also takes them back when grades decrease (e.g., after
+        regrading).
+        """
+
+        data = self.submissions\
+            .filter(status=self.STATUS_DONE)\
+            .non_polymorphic()\
+            .aggregate(points=models.Max('points'), stars=models.Max('stars'))
+        score_kwargs = {}
+        points = data['points'] or 0
+        stars = data['stars'] or 0.0
+        if points != self.points:
+            score_kwargs['points'] = points - self.points
+            self.points = points
+        if stars != self.stars:
+            score_kwargs['stars'] = stars - self.stars
+            self.stars = stars
+
         if score_kwargs:
+            self.save(update_fields=list(score_kwargs))
             from codeschool.lms.gamification.models import UserScore
-            self.save(update_fields=score_kwargs.keys())
             score_kwargs['diff'] = True
             UserScore.update(self.user, self.activity_page, **score_kwargs)
 
+    def _register_grade(self, old_grade):
+        # Keep the per-activity grade statistics up to date
+        if self.best_grade != old_grade and self.best_grade is not None:
+            from .grade_statistics import ActivityGradeStatistics
+            ActivityGradeStatistics.objects.register_grade(
+                self.activity_page_id, old_grade, self.best_grade)
+
     def regrade(self, method=None, force_update=False):
         """
         Return the final grade for the user using the given method.
@@ -183,6 +411,8 @@ class Response(models.CopyMixin,
         activity.
         """
 
+        from codeschool.lms.graders.models import GradingMethod
+
         activity = self.activity
 
         # Choose grading method
@@ -191,11 +421,22 @@ class Response(models.CopyMixin,
         elif method is None:
             grading_method = activity.grading_method
         else:
-            grading_method = GradingMethod.from_name(activity.owner, method)
+            grading_method = GradingMethod.from_name(method, activity.owner)
 
         # Grade response. We save the result to the final_grade attribute if
         # no explicit grading method is given.
-        grade = grading_method.grade(self)
+        grade = grading_method.grade_response(self)
         if method is None and (force_update or self.final_grade is None):
             self.final_grade = grade
         return grade
+
+
+def submission_rank(submission):
+    """
+    Key used to choose the best submission of a response: submissions are
+    ranked lexicographically by given_grade, score, stars and final_grade, as
+    in :meth:`SubmissionQuerySet.best`.
+    """
+
+    return (submission.given_grade or 0, submission.score, submission.stars,
+            submission.final_grade or 0)
@@ -1,3 +1,4 @@
+import copy
 import decimal
 import hashlib
 import json
@@ -11,7 +12,9 @@ from markdown import markdown
 
 from codeschool import models
 
+from ..regrade import same_feedback
 from ..signals import submission_graded_signal
+from .grading_job import GradingJob
 from .response import Response
 from .mixins import ResponseDataMixin, FeedbackDataMixin
 
@@ -37,22 +40,50 @@ class SubmissionQuerySet(models.PolymorphicQuerySet):
         Submissions are ranked lexicographically: first we consider the
         given_grade, than score, stars, final_grade, and lastly, creation time
         (earlier submissions are ranked better).
+
+        The best submission of each response is also stored in the
+        Response.best_submission field.
         """
 
-        qs = self.filter(status=Submission.STATUS_DONE)
-        if qs.empty():
-            return None
+        ordering = ['-' + attr for attr in attrs] + ['created', 'id']
+        return self.filter(status=Submission.STATUS_DONE)\
+            .order_by(*ordering)\
+            .first()
+
+    def duplicate(self, response, response_data, response_hash=None):
+        """
+        Return the oldest submission of the given response with the same
+        response_data or None if no such submission exists.
+
+        Submissions are searched by their (response, response_hash) index and
+        usually only the first match is fetched. The response_data of the
+        remaining candidates is compared only in case of hash collisions.
+        """
 
-        # Filter by regular attributes: higher values are better
-        for attr in attrs:
-            qs = qs.order_by('-' + attr)
-            best_value = getattr(qs.first(), attr)
-            qs = qs.filter(**{attr: best_value})
-            if qs.count() == 1:
-                return qs.first()
+        if response_hash is None:
+            response_hash = self.model.response_data_hash(response_data)
+        candidates = self\
+            .filter(response=response, response_hash=response_hash)\
+            .order_by('created', 'id')
+
+        first = candidates.first()
+        if first is None or first.response_data == response_data:
+            return first
+        for submission in candidates[1:].iterator():
+            if submission.response_data == response_data:
+                return submission
+        return None
+
+    def listing(self):
+        """
+        Defer loading the response_data and feedback_data columns.
+
+        Listings should display only the status, grades, timestamps and the
+        summary_* fields. The deferred data is loaded on demand when the
+        submission is opened.
+        """
 
-        # Filter by creation date
-        return qs.order_by('created').first()
+        return self.defer('response_data', 'feedback_data')
 
 
 class _SubmissionManager(models.PolymorphicManager):
@@ -97,6 +128,7 @@ class Submission(ResponseDataMixin,
     class Meta:
         verbose_name = _('submission')
         verbose_name_plural = _('submissions')
+        index_together = [('response', 'response_hash')]
 
     # Feedback messages
     MESSAGE_OK = _(
@@ -165,6 +197,21 @@ class Submission(ResponseDataMixin,
     points = models.IntegerField(default=0)
     score = models.IntegerField(default=0)
     stars = models.FloatField(default=0)
+    summary_status = models.CharField(
+        max_length=32,
+        blank=True,
+        help_text=_(
+            'Short status of the feedback (e.g., "wrong-answer") shown in '
+            'submission listings.'
+        ),
+    )
+    summary_label = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text=_(
+            'Short description of the response shown in submission listings.'
+        ),
+    )
     objects = SubmissionManager()
 
     # Status properties
@@ -254,7 +301,7 @@ class Submission(ResponseDataMixin,
         # Now that we have initialized the submission, we fill the data
         # passed in the response_data and feedback_data dictionaries.
         self.response_data = dict(self.response_data or {}, **response_data)
-        self.feedback_data = dict(self.response_data or {}, **feedback_data)
+        self.feedback_data = dict(self.feedback_data or {}, **feedback_data)
 
     def __str__(self):
         if self.given_grade is None:
@@ -287,10 +334,49 @@ class Submission(ResponseDataMixin,
 
     def save(self, *args, **kwargs):
         if not self.response_hash:
-            self.response_hash = self.response_hash_from_data(
-                self.response_hash)
+            self.response_hash = self.response_data_hash(self.response_data)
+        if not self.response_key_hash and self.response_data:
+            self.response_key_hash = md5hash(self.response_key())
         super().save(*args, **kwargs)
 
+    def response_key(self):
+        """
+        Normalize the response_data to a string.
+
+        Submissions that should be considered identical must have the same
+        key. The default implementation uses the JSON form of the data.
+        Subclasses can normalize trivial transformations such as changes in
+        whitespace.
+        """
+
+        return json.dumps(self.response_data, sort_keys=True,
+                          default=json_default)
+
+    def update_summary(self):
+        """
+        Update the summary_status and summary_label fields from the response
+        and feedback data.
+
+        Summary fields are stored in separate columns so submission listings
+        do not have to load the response and feedback data. Subclasses should
+        override this method to describe their feedback.
+        """
+
+        self.summary_status = self.status
+
+    def similarity_source(self):
+        """
+        Return a tuple (language, text) with the text compared when looking
+        for near-duplicate responses or None if the submission should not be
+        compared with others.
+
+        The language is used to tokenize the text (see
+        :mod:`codeschool.lms.activities.similarity`). The default
+        implementation returns None.
+        """
+
+        return None
+
     def final_points(self):
         """
         Return the amount of points awarded to the submission after
@@ -344,7 +430,8 @@ class Submission(ResponseDataMixin,
             return None
         return self.feedback_data
 
-    def autograde(self, commit=True, force=False, silent=False):
+    def autograde(self, commit=True, force=False, silent=False, defer=False,
+                  regrade=False, **kwargs):
         """
         Performs automatic grading.
 
@@ -365,16 +452,35 @@ class Submission(ResponseDataMixin,
             silent:
                 Prevents the submission_graded_signal from triggering in the
                 end of a successful grading.
+            defer:
+                If true, do not grade inline. The submission is saved in the
+                STATUS_PENDING state and a job is pushed to the grading queue.
+                Return the corresponding :class:`GradingJob` instance, which
+                can be used as a ticket to poll the grading status.
+            regrade:
+                If true, the submission was already registered in its
+                response, whose aggregates and scores are recomputed instead
+                of counting the submission again. If commit is false, this is
+                left to the caller (see :meth:`regrade`).
+
+        Additional keyword arguments are passed to autograde_value() (e.g.,
+        fail_fast=False forces coding questions to run all testcases).
         """
 
+        if defer and (self.status == self.STATUS_PENDING or force):
+            self.status = self.STATUS_PENDING
+            self.save()
+            return GradingJob.objects.enqueue(self)
+
         if self.status == self.STATUS_PENDING or force:
             # Evaluate grade using the autograde_value() method of subclass.
             try:
-                value = self.autograde_value()
+                value = self.autograde_value(**kwargs)
             except self.InvalidSubmissionError as ex:
                 self.status = self.STATUS_INVALID
                 self.feedback_data = ex
                 self.given_grade = self.final_grade = decimal.Decimal(0)
+                self.update_summary()
                 if commit:
                     self.save()
                 raise
@@ -392,19 +498,25 @@ class Submission(ResponseDataMixin,
                 if self.final_grade is None:
                     self.final_grade = self.given_grade
                 self.status = self.STATUS_DONE
+                self.stars = self.given_stars()
+                self.points = self.given_points()
+            self.update_summary()
 
             # Commit results
             if commit and self.pk:
                 self.save(update_fields=['status', 'feedback_data',
-                                         'given_grade', 'final_grade'])
+                                         'given_grade', 'final_grade',
+                                         'points', 'stars',
+                                         'summary_status', 'summary_label'])
             elif commit:
                 self.save()
 
             # If STATUS_DONE, we submit the submission_graded signal.
             if self.status == self.STATUS_DONE:
-                self.stars = self.given_stars()
-                self.points = self.given_points()
-                self.response.register_submission(self)
+                if not regrade:
+                    self.response.register_submission(self)
+                elif commit:
+                    self.response.register_submission(self, regrade=True)
                 if not silent:
                     submission_graded_signal.send(
                         Submission,
@@ -441,9 +553,11 @@ class Submission(ResponseDataMixin,
 
         raise NotImplementedError('TODO')
 
-    def autograde_value(self):
+    def autograde_value(self, **kwargs):
         """
         This method should be implemented in subclasses.
+
+        It receives any additional keyword arguments passed to autograde().
         """
 
         raise ImproperlyConfigured(
@@ -454,7 +568,7 @@ class Submission(ResponseDataMixin,
             'and saved into the database.' % type(self).__name__
         )
 
-    def regrade(self, method, commit=True):
+    def regrade(self, method, commit=True, **kwargs):
         """
         Recompute the grade for the given submission.
 
@@ -475,23 +589,40 @@ class Submission(ResponseDataMixin,
                 Like 'worst', but updates feedback_data even if the grades
                 change.
 
+        Additional keyword arguments are passed to autograde(). The response
+        is only updated when a new grade is kept and saved. If commit is
+        False, the caller must save the submission and call
+        ``response.register_submission(submission, regrade=True)``.
+
         Return a boolean telling if the regrading was necessary.
         """
         if self.status != self.STATUS_DONE:
-            return self.autograde()
+            return self.autograde(**kwargs)
 
         # We keep a copy of the state, if necessary. We only have to take some
         # action if the state changes.
         def rollback():
             self.__dict__.clear()
             self.__dict__.update(state)
+            self.feedback_data = old_feedback
+
+        def save_grade():
+            if commit:
+                self.save()
+                self.response.register_submission(self, regrade=True)
 
         state = self.__dict__.copy()
-        self.autograde(force=True, commit=False)
+        old_feedback = copy.deepcopy(self.feedback_data)
+        self.autograde(force=True, commit=False, regrade=True, **kwargs)
 
-        # Each method deals with the new state in a different manner
+        # Each method deals with the new state in a different manner. Only
+        # the grades and the feedback are compared: feedback_data also holds
+        # volatile data, such as run times, which changes at each grading.
         if method == 'update':
-            if state != self.__dict__:
+            if self.given_grade != state.get('given_grade'):
+                save_grade()
+                return False
+            elif not same_feedback(self.feedback_data, old_feedback):
                 if commit:
                     self.save()
                 return False
@@ -500,28 +631,26 @@ class Submission(ResponseDataMixin,
             if self.given_grade <= state.get('given_grade', 0):
                 new_feedback_data = self.feedback_data
                 rollback()
-                if new_feedback_data != self.feedback_data:
+                if not same_feedback(new_feedback_data, self.feedback_data):
                     self.feedback_data = new_feedback_data
                     if commit:
                         self.save()
                     return True
                 return False
-            elif commit:
-                self.save()
+            save_grade()
             return True
 
         elif method in ('worst', 'worst-feedback'):
             if self.given_grade >= state.get('given_grade', 0):
                 new_feedback_data = self.feedback_data
                 rollback()
-                if new_feedback_data != self.feedback_data:
+                if not same_feedback(new_feedback_data, self.feedback_data):
                     self.feedback_data = new_feedback_data
                     if commit:
                         self.save()
                     return True
                 return False
-            elif commit:
-                self.save()
+            save_grade()
             return True
         else:
             rollback()
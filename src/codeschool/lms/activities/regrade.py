@@ -0,0 +1,247 @@
+"""
+Bulk regrading of all submissions of an activity.
+
+Submissions are streamed from the database in chunks of primary keys and each
+chunk is graded by a process in a multiprocessing pool. Workers write their
+results back with a single UPDATE per chunk. Progress is stored in a
+RegradeRun object, so an interrupted run can be resumed.
+
+Usually this is started by :meth:`Activity.regrade_all` or by the "regrade"
+management command::
+
+    $ python manage.py regrade <activity-id> --method best --workers 4
+"""
+import copy
+import decimal
+import logging
+import multiprocessing
+import signal
+import time
+
+from annoying.functions import get_config
+from django import db
+from django.db import transaction
+
+from codeschool import models
+
+logger = logging.getLogger('codeschool.lms.activities')
+
+#: Valid regrade methods. See :meth:`Submission.regrade` for a description.
+REGRADE_METHODS = ['update', 'best', 'worst', 'best-feedback',
+                   'worst-feedback']
+
+#: Fields written back after regrading a submission.
+REGRADE_FIELDS = ['given_grade', 'final_grade', 'feedback_data', 'points',
+                  'stars', 'summary_status', 'summary_label']
+
+#: Feedback keys that change at each grading (e.g., measured run times) and
+#: do not mean that the feedback changed.
+VOLATILE_FEEDBACK_KEYS = ['usage']
+
+
+def same_feedback(data1, data2):
+    """
+    Return True if both feedback_data dictionaries are equal, ignoring
+    volatile keys.
+    """
+
+    def strip(data):
+        data = dict(data or {})
+        for key in VOLATILE_FEEDBACK_KEYS:
+            data.pop(key, None)
+        return data
+
+    return strip(data1) == strip(data2)
+
+
+def regrade_policy(method, old_grade, new_grade):
+    """
+    Decide which results of a regrade should be kept.
+
+    Return a tuple of booleans (update_grade, update_feedback).
+    """
+
+    if method not in REGRADE_METHODS:
+        raise ValueError('invalid method: %s' % method)
+
+    old_grade = old_grade or 0
+    if method == 'update':
+        return True, True
+    elif method.startswith('best'):
+        update_grade = new_grade > old_grade
+    else:
+        update_grade = new_grade < old_grade
+    return update_grade, update_grade or method.endswith('-feedback')
+
+
+def regrade_submission(submission, method='update', fail_fast=False):
+    """
+    Regrade a single submission in memory, applying the given regrade
+    method.
+
+    Submissions that were not graded yet are simply autograded and saved.
+    Return True if a graded submission changed and must be saved.
+    """
+
+    if submission.status != submission.STATUS_DONE:
+        submission.autograde(fail_fast=fail_fast)
+        return False
+
+    old_grade = submission.given_grade
+    old_feedback = copy.deepcopy(submission.feedback_data)
+    new_grade = decimal.Decimal(submission.autograde_value(fail_fast=fail_fast))
+    update_grade, update_feedback = \
+        regrade_policy(method, old_grade, new_grade)
+
+    if not update_feedback:
+        submission.feedback_data = old_feedback
+    submission.update_summary()
+    changed = False
+    if update_grade and new_grade != old_grade:
+        submission.given_grade = new_grade
+        if not submission.manual_override:
+            submission.final_grade = new_grade
+        changed = True
+
+    # Points and stars are always recomputed: update_score() aggregates them
+    # from the saved rows.
+    points, stars = submission.given_points(), submission.given_stars()
+    if (points, stars) != (submission.points, submission.stars):
+        submission.points, submission.stars = points, stars
+        changed = True
+    return changed or \
+        not same_feedback(submission.feedback_data, old_feedback)
+
+
+def regrade_chunk(ids, method='update', fail_fast=False):
+    """
+    Regrade all submissions with the given ids and save the results.
+
+    Return a dictionary with the number of graded submissions, the number of
+    changed submissions and the number of errors.
+    """
+
+    from .models import Submission
+
+    stats = {'graded': 0, 'changed': 0, 'errors': 0}
+    changed = []
+
+    for submission in Submission.objects.filter(id__in=ids).order_by('id'):
+        try:
+            if regrade_submission(submission, method, fail_fast):
+                changed.append(submission)
+            stats['graded'] += 1
+        except submission.InvalidSubmissionError:
+            stats['errors'] += 1
+        except Exception:
+            logger.exception('error regrading submission #%s' % submission.pk)
+            stats['errors'] += 1
+
+    with transaction.atomic():
+        models.bulk_update(Submission, changed, REGRADE_FIELDS)
+
+        # Grade aggregates and scores of the responses must reflect the new
+        # grades, which may be either higher or lower than the old ones.
+        responses = {submission.response_id: submission.response
+                     for submission in changed}
+        for response in responses.values():
+            response.update_aggregates()
+            response.update_score()
+
+    stats['changed'] = len(changed)
+    return stats
+
+
+def _regrade_chunk(args):
+    return regrade_chunk(*args)
+
+
+def _init_worker():
+    # Let the parent process handle keyboard interrupts
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def regrade_activity(activity, method='update', workers=None, chunk_size=None,
+                     fail_fast=False, resume=True, callback=None):
+    """
+    Regrade all submissions of the given activity.
+
+    Args:
+        activity:
+            The activity object.
+        method:
+            One of 'update', 'best', 'worst', 'best-feedback' or
+            'worst-feedback'. See :meth:`Submission.regrade`.
+        workers:
+            Number of worker processes. If workers is 1, grading happens in
+            the current process. Defaults to CODESCHOOL_GRADING_WORKERS or the
+            number of CPUs.
+        chunk_size:
+            Number of submissions graded by a worker in a single task.
+            Defaults to CODESCHOOL_REGRADE_CHUNK_SIZE.
+        fail_fast:
+            If False (the default), coding questions run all testcases.
+        resume:
+            If True, continue from the checkpoint of the last interrupted run
+            with the same method.
+        callback:
+            A function called with the RegradeRun object after each
+            checkpoint. It can be used to report progress.
+
+    Return the RegradeRun object.
+    """
+
+    from .models import RegradeRun, Submission
+    from .workers import default_workers
+
+    regrade_policy(method, 0, 0)  # validate method
+    workers = workers or default_workers()
+    chunk_size = chunk_size or get_config('CODESCHOOL_REGRADE_CHUNK_SIZE', 100)
+    run = RegradeRun.objects.start(activity, method, fail_fast=fail_fast,
+                                   resume=resume)
+    submissions = Submission.objects\
+        .filter(response__activity_page_id=activity.id,
+                status__in=[Submission.STATUS_DONE, Submission.STATUS_PENDING])\
+        .order_by('id')
+    logger.info('regrading activity #%s (method: %s, checkpoint: %s)' %
+                (activity.id, method, run.last_id))
+
+    pool = None
+    if workers > 1:
+        # Forked processes must not share the parent's database connections.
+        db.connections.close_all()
+        pool = multiprocessing.Pool(workers, initializer=_init_worker)
+
+    try:
+        while True:
+            ids = list(submissions
+                       .filter(id__gt=run.last_id)
+                       .values_list('id', flat=True)[:chunk_size * workers])
+            if not ids:
+                break
+
+            start = time.time()
+            tasks = [(ids[i:i + chunk_size], method, fail_fast)
+                     for i in range(0, len(ids), chunk_size)]
+            if pool is None:
+                results = [_regrade_chunk(task) for task in tasks]
+            else:
+                results = pool.map(_regrade_chunk, tasks)
+
+            stats = {}
+            for result in results:
+                for key, value in result.items():
+                    stats[key] = stats.get(key, 0) + value
+            run.checkpoint(ids[-1], stats, time.time() - start)
+            logger.info('regraded %s submissions (%.1f/s)' %
+                        (run.graded, run.throughput))
+            if callback is not None:
+                callback(run)
+
+        run.finish()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    return run
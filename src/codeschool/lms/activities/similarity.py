@@ -0,0 +1,276 @@
+"""
+Near-duplicate detection for submissions.
+
+Each submission is converted to a stream of normalized tokens: identifiers,
+literals and comments are erased, so renaming variables or editing comments
+does not change the result. The token stream is split into overlapping
+shingles and summarized by a MinHash signature, whose entries agree for two
+documents with a probability equal to the Jaccard similarity of their sets
+of shingles.
+
+Signatures are bucketed with locality-sensitive hashing (LSH): the signature
+is split in bands and documents that share any band fall in the same bucket.
+Only documents in the same bucket are compared, hence candidate pairs are
+found in roughly linear time.
+"""
+import random
+import zlib
+from collections import defaultdict
+
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Comment, Name, Number, String, Text
+from pygments.util import ClassNotFound
+
+#: Number of tokens in each shingle.
+SHINGLE_SIZE = 4
+
+#: Number of hash functions in a MinHash signature.
+NUM_PERMUTATIONS = 64
+
+#: Number of LSH bands. Each band has NUM_PERMUTATIONS / NUM_BANDS rows. With
+#: 16 bands of 4 rows, pairs with similarity 0.5 become candidates with
+#: a probability of 65% and pairs with similarity 0.8 with 99.9%.
+NUM_BANDS = 16
+
+#: Default minimum similarity of a suspicious pair of responses.
+DEFAULT_THRESHOLD = 0.8
+
+#: Pygments lexers used for languages that do not share their names.
+LEXER_ALIASES = {
+    'pytuga': 'python',
+}
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+_lexers = {}
+
+
+def get_lexer(language):
+    """
+    Return the Pygments lexer for the given language ref or None if the
+    language is not supported.
+    """
+
+    try:
+        return _lexers[language]
+    except KeyError:
+        pass
+    try:
+        lexer = get_lexer_by_name(LEXER_ALIASES.get(language, language))
+    except ClassNotFound:
+        lexer = None
+    _lexers[language] = lexer
+    return lexer
+
+
+def tokenize(source, language=None):
+    """
+    Return a list of normalized tokens for the given source code.
+
+    Identifiers become "N", numbers become "0" and strings become "S".
+    Builtin names, keywords, operators and punctuation are kept. Comments and
+    whitespace are ignored. Unsupported languages are split on whitespace.
+    """
+
+    lexer = get_lexer(language) if language else None
+    if lexer is None:
+        return source.split()
+
+    tokens = []
+    for tt, value in lexer.get_tokens(source):
+        if tt in Comment or tt in Text or not value.strip():
+            continue
+        elif tt in Name.Builtin:
+            token = value
+        elif tt in Name:
+            token = 'N'
+        elif tt in String:
+            token = 'S'
+        elif tt in Number:
+            token = '0'
+        else:
+            token = value.strip()
+
+        # Strings are split in several tokens (delimiters, escapes, etc)
+        if token == 'S' and tokens and tokens[-1] == 'S':
+            continue
+        tokens.append(token)
+    return tokens
+
+
+def shingles(tokens, size=SHINGLE_SIZE):
+    """
+    Return the set of hashes of all sequences of size consecutive tokens.
+
+    Token lists shorter than size produce a single shingle.
+    """
+
+    if not tokens:
+        return set()
+    size = min(size, len(tokens))
+    return {zlib.crc32(' '.join(tokens[i:i + size]).encode('utf8'))
+            for i in range(len(tokens) - size + 1)}
+
+
+def minhash(hashes):
+    """
+    Return the MinHash signature (a list of NUM_PERMUTATIONS integers) for the
+    given set of shingle hashes or None if the set is empty.
+    """
+
+    if not hashes:
+        return None
+    hashes = list(hashes)
+    return [min((a * x + b) % _PRIME for x in hashes)
+            for a, b in _PERMUTATIONS]
+
+
+def signature(source, language=None):
+    """
+    Return the MinHash signature of the given source code.
+    """
+
+    return minhash(shingles(tokenize(source, language)))
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimate the Jaccard similarity of two documents from their signatures.
+    """
+
+    equal = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+    return equal / len(sig_a)
+
+
+def band_keys(sig, bands=NUM_BANDS):
+    """
+    Return the list of LSH bucket keys for the given signature.
+    """
+
+    rows = len(sig) // bands
+    return [(band, tuple(sig[band * rows:(band + 1) * rows]))
+            for band in range(bands)]
+
+
+class LSHIndex:
+    """
+    An index of MinHash signatures that finds similar pairs without comparing
+    all pairs of documents.
+
+    Documents are identified by arbitrary hashable keys and can be added or
+    removed at any time.
+    """
+
+    def __init__(self, bands=NUM_BANDS):
+        self.bands = bands
+        self.signatures = {}
+        self.buckets = defaultdict(set)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, key):
+        return key in self.signatures
+
+    def add(self, key, sig):
+        """
+        Insert or replace the signature of the given key.
+        """
+
+        self.remove(key)
+        self.signatures[key] = sig
+        for bucket in band_keys(sig, self.bands):
+            self.buckets[bucket].add(key)
+
+    def remove(self, key):
+        """
+        Remove the given key from the index, if it is present.
+        """
+
+        sig = self.signatures.pop(key, None)
+        if sig is None:
+            return
+        for bucket in band_keys(sig, self.bands):
+            keys = self.buckets[bucket]
+            keys.discard(key)
+            if not keys:
+                del self.buckets[bucket]
+
+    def candidates(self, key):
+        """
+        Return the set of keys that share at least one bucket with key.
+        """
+
+        result = set()
+        for bucket in band_keys(self.signatures[key], self.bands):
+            result.update(self.buckets.get(bucket, ()))
+        result.discard(key)
+        return result
+
+    def query(self, key, threshold=DEFAULT_THRESHOLD):
+        """
+        Return a dictionary mapping the keys similar to the given key to their
+        estimated similarity.
+        """
+
+        sig = self.signatures[key]
+        result = {}
+        for other in self.candidates(key):
+            value = similarity(sig, self.signatures[other])
+            if value >= threshold:
+                result[other] = value
+        return result
+
+    def similar_pairs(self, threshold=DEFAULT_THRESHOLD):
+        """
+        Return a dictionary mapping pairs of keys to their estimated
+        similarity for all pairs with similarity above the threshold.
+
+        Keys in each pair are in the order in which they were inserted.
+        """
+
+        order = {key: idx for idx, key in enumerate(self.signatures)}
+        pairs = {}
+        seen = set()
+        for keys in self.buckets.values():
+            if len(keys) < 2:
+                continue
+            keys = sorted(keys, key=order.__getitem__)
+            for i, key_a in enumerate(keys):
+                sig_a = self.signatures[key_a]
+                for key_b in keys[i + 1:]:
+                    if (key_a, key_b) in seen:
+                        continue
+                    seen.add((key_a, key_b))
+                    value = similarity(sig_a, self.signatures[key_b])
+                    if value >= threshold:
+                        pairs[key_a, key_b] = value
+        return pairs
+
+
+def clusters(pairs):
+    """
+    Group the keys of the given similar pairs into connected components.
+
+    Return a list of sets, largest first.
+    """
+
+    parent = {}
+
+    def find(key):
+        root = key
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[key] != root:
+            parent[key], key = root, parent[key]
+        return root
+
+    for key_a, key_b in pairs:
+        parent[find(key_a)] = find(key_b)
+
+    groups = defaultdict(set)
+    for key in parent:
+        groups[find(key)].add(key)
+    return sorted(groups.values(), key=len, reverse=True)
@@ -15,3 +15,24 @@ def activity_section(base_page_location_kwargs):
 def activity_section_db(activity_section):
     activity_section.save()
     return activity_section
+
+
+@pytest.fixture
+def user_db(db):
+    from codeschool.models import User
+    return User.objects.create(username=fake.user_name())
+
+
+@pytest.fixture
+def response_db(user_db):
+    from codeschool.models import Page
+    from codeschool.lms.activities.models import Response
+    return Response.objects.create(user=user_db,
+                                   activity_page=Page.objects.get(depth=1))
+
+
+@pytest.fixture
+def submission_db(response_db):
+    from codeschool.lms.activities.models import Submission
+    return Submission.objects.create(response=response_db,
+                                     response_data={'answer': 42})
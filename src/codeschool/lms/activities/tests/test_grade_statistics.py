@@ -0,0 +1,23 @@
+from decimal import Decimal
+
+from . import *
+from codeschool.lms.activities.models import ActivityGradeStatistics
+from codeschool.lms.activities.models.grade_statistics import grade_bucket
+
+
+def test_grade_bucket():
+    assert grade_bucket(Decimal(0)) == 0
+    assert grade_bucket(Decimal('9.999')) == 0
+    assert grade_bucket(Decimal(10)) == 1
+    assert grade_bucket(Decimal(100)) == 9
+
+
+def test_statistics_from_aggregates():
+    stats = ActivityGradeStatistics(count=4, grade_sum=Decimal(200),
+                                    grade_sum_squares=12500.0,
+                                    bucket_5=2, bucket_9=1)
+    assert stats.mean == 50
+    assert stats.std == 25
+    assert [count for _, _, count in stats.histogram] == \
+        [0, 0, 0, 0, 0, 2, 0, 0, 0, 1]
+    assert ActivityGradeStatistics().mean is None
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import *
+from codeschool.lms.activities import workers
+from codeschool.lms.activities.models import GradingJob, Submission
+from codeschool.lms.activities.models.grading_job import GradingJobQuerySet
+
+
+def new_submission(response):
+    return Submission.objects.create(response=response,
+                                     response_data={'answer': fake.word()})
+
+
+@pytest.mark.django_db
+def test_enqueue_requires_saved_submission():
+    with pytest.raises(ValueError):
+        GradingJob.objects.enqueue(Submission())
+
+
+@pytest.mark.django_db
+def test_enqueue_and_claim_in_order(response_db):
+    first = GradingJob.objects.enqueue(new_submission(response_db))
+    second = GradingJob.objects.enqueue(new_submission(response_db))
+    assert first.is_pending and GradingJob.objects.depth() == 2
+
+    job = GradingJob.objects.claim(worker='w1')
+    assert job.pk == first.pk
+    assert job.is_running and job.worker == 'w1'
+    assert GradingJob.objects.claim(worker='w2').pk == second.pk
+    assert GradingJob.objects.claim(worker='w3') is None
+    assert GradingJob.objects.depth() == 0
+
+
+@pytest.mark.django_db
+def test_claim_skips_jobs_taken_by_other_workers(response_db, monkeypatch):
+    first = GradingJob.objects.enqueue(new_submission(response_db))
+    second = GradingJob.objects.enqueue(new_submission(response_db))
+
+    # Another worker claims the first job after we read the pending ids.
+    ids = [first.pk, second.pk]
+    monkeypatch.setattr(GradingJobQuerySet, 'values_list',
+                        lambda self, *args, **kwargs: ids)
+    GradingJob.objects.filter(pk=first.pk)\
+        .update(status=GradingJob.STATUS_RUNNING, worker='other')
+
+    assert GradingJob.objects.claim(worker='w1').pk == second.pk
+    assert GradingJob.objects.get(pk=first.pk).worker == 'other'
+
+
+@pytest.mark.django_db
+def test_from_ticket_ignores_unknown_tickets(response_db):
+    from codeschool.models import User
+
+    job = GradingJob.objects.enqueue(new_submission(response_db))
+    user = response_db.user
+    activity = response_db.activity_page_id
+    other = User.objects.create(username=fake.user_name())
+    assert GradingJob.objects.from_ticket(job.ticket, user, activity) == job
+    assert GradingJob.objects.from_ticket(str(job.ticket), user,
+                                          activity) == job
+    assert GradingJob.objects.from_ticket(job.ticket, other, activity) is None
+    assert GradingJob.objects.from_ticket(job.ticket + 1, user,
+                                          activity) is None
+    assert GradingJob.objects.from_ticket('foo', user, activity) is None
+    assert GradingJob.objects.from_ticket(None, user, activity) is None
+
+
+@pytest.mark.django_db
+def test_requeue_stale_jobs(response_db):
+    stale = GradingJob.objects.enqueue(new_submission(response_db))
+    fresh = GradingJob.objects.enqueue(new_submission(response_db))
+    GradingJob.objects.claim(worker='dead')
+    GradingJob.objects.claim(worker='alive')
+    GradingJob.objects.filter(pk=stale.pk)\
+        .update(status_changed=timezone.now() - timedelta(seconds=600))
+
+    assert GradingJob.objects.requeue_stale(300) == 1
+    stale.refresh_from_db()
+    fresh.refresh_from_db()
+    assert stale.is_pending and stale.worker == ''
+    assert fresh.is_running
+    assert GradingJob.objects.claim(worker='w1').pk == stale.pk
+
+
+@pytest.mark.django_db
+def test_failed_jobs_record_the_error(submission_db, monkeypatch):
+    def autograde(self, **kwargs):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(Submission, 'autograde', autograde)
+    GradingJob.objects.enqueue(submission_db)
+    job = workers.run_job('w1')
+    job.refresh_from_db()
+    assert job.status == GradingJob.STATUS_FAILED
+    assert job.error == 'RuntimeError: boom'
+
+
+@pytest.mark.django_db
+def test_burst_worker_drains_queue(response_db, monkeypatch):
+    graded = []
+    monkeypatch.setattr(Submission, 'autograde',
+                        lambda self, **kwargs: graded.append(self.pk))
+    for _ in range(3):
+        GradingJob.objects.enqueue(new_submission(response_db))
+
+    assert workers.worker_loop(burst=True) == 3
+    assert len(graded) == 3
+    assert set(GradingJob.objects.values_list('status', flat=True)) == \
+        {GradingJob.STATUS_DONE}
@@ -0,0 +1,150 @@
+from decimal import Decimal
+
+from . import *
+from codeschool.lms.activities.regrade import regrade_policy, same_feedback, \
+    regrade_activity
+
+
+def test_regrade_policy_update():
+    assert regrade_policy('update', 100, 50) == (True, True)
+
+
+def test_regrade_policy_best():
+    assert regrade_policy('best', 50, 100) == (True, True)
+    assert regrade_policy('best', 100, 50) == (False, False)
+    assert regrade_policy('best-feedback', 100, 50) == (False, True)
+
+
+def test_regrade_policy_worst():
+    assert regrade_policy('worst', 100, 50) == (True, True)
+    assert regrade_policy('worst', 50, 100) == (False, False)
+    assert regrade_policy('worst-feedback', 50, 100) == (False, True)
+
+
+def test_regrade_policy_invalid_method():
+    with pytest.raises(ValueError):
+        regrade_policy('bad-method', 0, 100)
+
+
+def test_same_feedback_ignores_usage():
+    assert same_feedback({'status': 'ok', 'usage': {'wall': 1}},
+                         {'status': 'ok', 'usage': {'wall': 2}})
+    assert not same_feedback({'status': 'ok'}, {'status': 'wrong-answer'})
+
+
+@pytest.fixture
+def graded_submission_db(submission_db, monkeypatch):
+    from codeschool.lms.activities.models import Submission
+
+    # The submission is graded with 100 and regraded with 50
+    grades = [100]
+    monkeypatch.setattr(Submission, 'points_total', 10)
+    monkeypatch.setattr(Submission, 'stars_total', Decimal(1))
+    monkeypatch.setattr(Submission, 'autograde_value',
+                        lambda self, **kw: grades[0])
+    submission_db.autograde()
+    grades[0] = 50
+    return submission_db
+
+
+@pytest.mark.django_db
+def test_regrade_activity_lowers_grades_and_scores(graded_submission_db):
+    from codeschool.lms.activities.models import Submission
+
+    saved = Submission.objects.get(pk=graded_submission_db.pk)
+    assert (saved.points, saved.stars) == (10, 1.0)
+    response = graded_submission_db.response
+    assert (response.points, response.best_grade) == (10, 100)
+
+    run = regrade_activity(response.activity_page, method='worst',
+                           workers=1, resume=False)
+    assert (run.graded, run.changed) == (1, 1)
+
+    graded_submission_db.refresh_from_db()
+    response.refresh_from_db()
+    assert graded_submission_db.final_grade == 50
+    assert graded_submission_db.points == 5
+    assert (response.points, response.stars) == (5, 0.5)
+    assert response.best_grade == 50
+    assert response.submission_count == 1
+
+
+@pytest.mark.django_db
+def test_regrade_activity_keeps_best_grades(graded_submission_db):
+    response = graded_submission_db.response
+    run = regrade_activity(response.activity_page, method='best', workers=1,
+                           resume=False)
+    assert (run.graded, run.changed) == (1, 0)
+
+    response.refresh_from_db()
+    assert (response.points, response.best_grade) == (10, 100)
+
+
+@pytest.mark.django_db
+def test_submission_regrade_does_not_count_submission_again(
+        graded_submission_db):
+    response = graded_submission_db.response
+    graded_submission_db.regrade('worst')
+
+    response.refresh_from_db()
+    assert response.submission_count == 1
+    assert response.grade_sum == 100
+    assert response.points == 5
+
+
+@pytest.mark.django_db
+def test_submission_regrade_rollback_keeps_response(graded_submission_db):
+    response = graded_submission_db.response
+    assert not graded_submission_db.regrade('best')
+
+    response.refresh_from_db()
+    assert (response.points, response.stars) == (10, 1.0)
+    assert (response.submission_count, response.best_grade) == (1, 100)
+
+
+@pytest.mark.django_db
+def test_register_submission_counts_concurrent_submissions(
+        graded_submission_db):
+    from codeschool.lms.activities.models import Response, Submission
+
+    def submission(grade):
+        return Submission.objects.create(
+            response=response, response_data={'answer': grade},
+            status=Submission.STATUS_DONE, given_grade=grade,
+            final_grade=grade)
+
+    response = graded_submission_db.response
+    stale = Response.objects.get(pk=response.pk)
+    response.register_submission(submission(30))
+    stale.register_submission(submission(20))
+
+    for obj in [response, stale]:
+        obj.refresh_from_db()
+        assert obj.submission_count == 3
+        assert obj.grade_sum == 150
+        assert (obj.best_grade, obj.worst_grade) == (100, 20)
+        assert obj.best_submission_id == graded_submission_db.id
+        assert obj.last_grade == 20
+
+
+@pytest.mark.django_db
+def test_submission_regrade_ignores_volatile_feedback(graded_submission_db,
+                                                      monkeypatch):
+    from codeschool.lms.activities.models import Submission
+
+    def autograde_value(self, **kwargs):
+        self.feedback_data = {'status': 'ok', 'usage': {'wall': self.runs}}
+        self.runs += 1
+        return 100
+
+    monkeypatch.setattr(Submission, 'autograde_value', autograde_value)
+    submission = graded_submission_db
+    submission.runs = 0
+    submission.feedback_data = {'status': 'ok', 'usage': {'wall': -1}}
+    assert submission.regrade('update')
+
+    submission.refresh_from_db()
+    assert (submission.given_grade, submission.points) == (100, 10)
+    response = submission.response
+    response.refresh_from_db()
+    assert (response.submission_count, response.points) == (1, 10)
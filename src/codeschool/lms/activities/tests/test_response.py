@@ -0,0 +1,33 @@
+import datetime
+import decimal
+
+from . import *
+from codeschool.lms.activities.models import Response, Submission
+from codeschool.lms.graders.models import GradingMethod
+
+
+def submission(grade, minute):
+    grade = decimal.Decimal(grade)
+    created = datetime.datetime(2016, 1, 1, 12, minute)
+    return Submission(given_grade=grade, final_grade=grade, created=created)
+
+
+def test_response_running_aggregates():
+    response = Response()
+    submissions = [submission(50, 1), submission(100, 2), submission(100, 3),
+                   submission(20, 4)]
+    for item in submissions:
+        response._aggregate_submission(item)
+
+    assert response.submission_count == 4
+    assert response.best_submission is submissions[1]
+    assert response.average_grade == decimal.Decimal('67.5')
+
+    def grade(name):
+        return GradingMethod(name=name).grade_response(response)
+
+    assert grade('best') == 100
+    assert grade('worst') == 20
+    assert grade('first') == 50
+    assert grade('last') == 20
+    assert GradingMethod(name='best').grade_response(Response()) == 0
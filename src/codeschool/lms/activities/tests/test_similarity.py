@@ -0,0 +1,53 @@
+from . import *
+from codeschool.lms.activities import similarity
+
+SOURCE = '''
+x = int(input())
+y = int(input())
+if x > y:
+    print("first", x - y)
+else:
+    print("second", y - x)
+'''
+
+RENAMED = '''
+# compare numbers
+first = int(input())
+second = int(input())
+if first > second:
+    print('primeiro', first - second)
+else:
+    print('segundo', second - first)
+'''
+
+OTHER = '''
+n = int(input())
+total = 0
+for i in range(n):
+    total += i * i
+print(total)
+'''
+
+
+def test_tokenize_erases_names_and_comments():
+    assert similarity.tokenize(SOURCE, 'python') == \
+        similarity.tokenize(RENAMED, 'pytuga')
+    assert similarity.tokenize('foo  bar', 'unknown-language') == \
+        ['foo', 'bar']
+
+
+def test_lsh_index_finds_renamed_responses():
+    index = similarity.LSHIndex()
+    for key, source in enumerate([SOURCE, RENAMED, OTHER]):
+        index.add(key, similarity.signature(source, 'python'))
+    assert index.similar_pairs() == {(0, 1): 1.0}
+    assert index.query(2, threshold=0.5) == {}
+
+    index.remove(1)
+    assert index.similar_pairs() == {}
+    assert 1 not in index and len(index) == 2
+
+
+def test_clusters():
+    pairs = {(1, 2): 0.9, (2, 3): 0.8, (4, 5): 1.0}
+    assert similarity.clusters(pairs) == [{1, 2, 3}, {4, 5}]
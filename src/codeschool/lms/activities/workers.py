@@ -0,0 +1,147 @@
+"""
+Pool of worker processes that consume the grading queue.
+
+Workers poll the database for pending GradingJob objects and run the grading
+code outside the HTTP workers. Since the queue is stored in the database, no
+external service (message broker, cache server, etc) is necessary.
+
+The pool is usually started with the "gradingqueue" management command::
+
+    $ python manage.py gradingqueue --workers 4
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from annoying.functions import get_config
+from django import db
+
+logger = logging.getLogger('codeschool.lms.activities')
+
+
+def default_workers():
+    """
+    Default number of worker processes.
+
+    Can be configured with the CODESCHOOL_GRADING_WORKERS setting.
+    """
+
+    return get_config('CODESCHOOL_GRADING_WORKERS', None) or \
+        multiprocessing.cpu_count()
+
+
+def queue_depth():
+    """
+    Return the number of submissions waiting in the grading queue.
+    """
+
+    from .models import GradingJob
+    return GradingJob.objects.depth()
+
+
+def run_job(worker=''):
+    """
+    Claim and run a single job from the grading queue.
+
+    Return the executed job or None if the queue is empty.
+    """
+
+    from .models import GradingJob
+
+    job = GradingJob.objects.claim(worker=worker)
+    if job is not None:
+        job.run()
+    return job
+
+
+def worker_loop(poll_interval=None, burst=False, max_jobs=None):
+    """
+    Main loop executed by each worker process.
+
+    Args:
+        poll_interval:
+            Number of seconds the worker sleeps when the queue is empty.
+        burst:
+            If True, the worker exits as soon as the queue is empty.
+        max_jobs:
+            If given, the worker exits after executing this number of jobs.
+            This is useful to recycle processes that leak memory.
+    """
+
+    if poll_interval is None:
+        poll_interval = get_config('CODESCHOOL_GRADING_POLL_INTERVAL', 0.5)
+    worker = '%s:%s' % (os.uname()[1], os.getpid())
+    num_jobs = 0
+
+    while max_jobs is None or num_jobs < max_jobs:
+        job = run_job(worker)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+        else:
+            num_jobs += 1
+
+    return num_jobs
+
+
+def _worker_main(poll_interval, burst, max_jobs):
+    # Let the parent process handle keyboard interrupts
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_loop(poll_interval, burst, max_jobs)
+
+
+def run_workers(workers=None, poll_interval=None, burst=False, max_jobs=None,
+                stale_timeout=None, report_interval=60):
+    """
+    Start a pool of worker processes consuming the grading queue and wait
+    until all of them finish.
+
+    Workers that exit (e.g., by reaching max_jobs) are restarted unless burst
+    is True. The queue depth is logged at every report_interval seconds.
+    Jobs that stay in the running state for more than stale_timeout seconds
+    (configured by CODESCHOOL_GRADING_STALE_TIMEOUT) are moved back to the
+    queue.
+    """
+
+    from .models import GradingJob
+
+    workers = workers or default_workers()
+    if stale_timeout is None:
+        stale_timeout = get_config('CODESCHOOL_GRADING_STALE_TIMEOUT', 300)
+    args = (poll_interval, burst, max_jobs)
+
+    # Forked processes must not share the parent's database connections.
+    db.connections.close_all()
+
+    def start():
+        process = multiprocessing.Process(target=_worker_main, args=args)
+        process.start()
+        return process
+
+    pool = [start() for _ in range(workers)]
+    logger.info('started %s grading workers' % workers)
+    last_report = 0
+
+    try:
+        while pool:
+            for idx, process in enumerate(pool):
+                process.join(timeout=0.1)
+                if not process.is_alive():
+                    pool[idx] = None if burst else start()
+            pool = [x for x in pool if x is not None]
+
+            if time.time() - last_report > report_interval:
+                GradingJob.objects.requeue_stale(stale_timeout)
+                logger.info('grading queue depth: %s' % queue_depth())
+                db.connections.close_all()
+                last_report = time.time()
+            time.sleep(0.5)
+
+    except KeyboardInterrupt:
+        for process in pool:
+            process.terminate()
+        for process in pool:
+            process.join()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from codeschool.benchmarks.scores import bench_scores
+
+
+class Command(BaseCommand):
+    help = 'measures the propagation of scores of graded submissions up the ' \
+           'page tree.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--updates', '-n', type=int, default=1000)
+        parser.add_argument('--depth', '-d', type=int, default=5)
+        parser.add_argument('--users', '-u', type=int, default=10)
+        parser.add_argument('--keep', action='store_true')
+
+    def handle(self, *args, updates=1000, depth=5, users=10, keep=False,
+               **options):
+        results = bench_scores(updates, depth, users, keep=keep)
+
+        print('Score propagation from a page %s levels deep:' % depth)
+        for name in ['legacy', 'path']:
+            data = results[name]
+            latency = data['latency']
+            print('  %-8s %8.1f updates/s  %5.1f queries/update  '
+                  'p50: %6.2f ms  p95: %6.2f ms' % (
+                      name, data['updates_per_second'],
+                      data['queries_per_update'], latency['p50'] * 1000,
+                      latency['p95'] * 1000))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from codeschool.benchmarks.xp import bench_xp
+from codeschool.lms.gamification.models.score import xp_cache
+
+
+class Command(BaseCommand):
+    help = 'measures the global XP leaderboard with many users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', '-u', type=int, default=100000)
+        parser.add_argument('--rounds', '-r', type=int, default=50)
+        parser.add_argument('--updates', '-n', type=int, default=10)
+        parser.add_argument('--keep', action='store_true')
+
+    def handle(self, *args, users=100000, rounds=50, updates=10, keep=False,
+               **options):
+        if xp_cache() is None:
+            print('warning: CODESCHOOL_XP_CACHE is not a shared cache and the '
+                  'leaderboard is read from the database.')
+        results = bench_xp(users, rounds, updates, keep=keep)
+
+        print('XP leaderboard with %s users, %s updates per read (ms):' %
+              (users, updates))
+        for name in ['legacy', 'shared']:
+            for kind in ['leaderboard', 'total_score']:
+                stats = results[name][kind]
+                print('  %-8s %-12s mean: %8.2f  p50: %8.2f  p95: %8.2f' % (
+                    name, kind, stats['mean'] * 1000, stats['p50'] * 1000,
+                    stats['p95'] * 1000))
+        stats = results['update']
+        print('  update                mean: %8.2f  p50: %8.2f  p95: %8.2f' %
+              (stats['mean'] * 1000, stats['p50'] * 1000, stats['p95'] * 1000))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from codeschool import models
+from codeschool.lms.gamification.models import TotalScore
+
+
+class Command(BaseCommand):
+    help = 'recomputes the total points and stars of all pages in the site ' \
+           '(or under the given page).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('page', type=int, nargs='?')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, page=None, dry_run=False, **options):
+        root = None
+        if page is not None:
+            try:
+                root = models.Page.objects.get(pk=page)
+            except models.Page.DoesNotExist:
+                raise CommandError('page #%s does not exist' % page)
+
+        totals = TotalScore.recompute_totals(root, commit=not dry_run)
+        print('Recomputed totals for %s pages.' % len(totals))
+        if root is not None:
+            total = totals[root.id]
+            print('Page #%s: %s points, %s stars.' % (
+                root.id, total.get('points', 0), total.get('stars', 0)))
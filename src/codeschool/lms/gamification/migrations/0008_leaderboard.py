@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wagtailcore', '0028_merge'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gamification', '0007_auto_20160816_1439'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('version', models.PositiveIntegerField(default=0, help_text='Incremented on each change to the leaderboard.')),
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard', to='wagtailcore.Page')),
+            ],
+            options={
+                'verbose_name': 'leaderboard',
+                'verbose_name_plural': 'leaderboards',
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField(default=0)),
+                ('stars', models.DecimalField(decimal_places=1, default=0.0, max_digits=5)),
+                ('rank', models.PositiveIntegerField()),
+                ('leaderboard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='gamification.Leaderboard')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='leaderboardentry',
+            unique_together=set([('leaderboard', 'user')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='leaderboardentry',
+            index_together=set([('leaderboard', 'rank')]),
+        ),
+    ]
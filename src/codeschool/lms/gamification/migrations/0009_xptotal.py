@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def fill_totals(apps, schema_editor):
+    GivenXp = apps.get_model('gamification', 'GivenXp')
+    XpTotal = apps.get_model('gamification', 'XpTotal')
+
+    rows = GivenXp.objects\
+        .order_by()\
+        .values_list('user_id')\
+        .annotate(total=models.Sum('points'))
+    XpTotal.objects.bulk_create(
+        [XpTotal(user_id=user_id, points=total or 0)
+         for user_id, total in rows],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gamification', '0008_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XpTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='xp_total', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('gamification', '0009_xptotal'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='leaderboardentry',
+            index_together=set([('leaderboard', 'points', 'stars', 'user')]),
+        ),
+        migrations.RemoveField(
+            model_name='leaderboardentry',
+            name='rank',
+        ),
+        migrations.RemoveField(
+            model_name='leaderboard',
+            name='version',
+        ),
+    ]
@@ -1,2 +1,3 @@
 from .score import *
 from .badges import *
+from .leaderboard import Leaderboard, LeaderboardEntry, leaderboard_context
@@ -0,0 +1,230 @@
+from django.db import transaction
+from django.utils.translation import ugettext_lazy as _
+
+from codeschool import models
+
+
+class _LeaderboardManager(models.Manager):
+    def for_page(self, page):
+        """
+        Return the leaderboard of the given page.
+
+        Leaderboards are created and built from the UserScore table on first
+        access.
+        """
+
+        board, created = self.get_or_create(page_id=page.id)
+        if created:
+            board.rebuild()
+        return board
+
+    def register_scores(self, user_id, paths):
+        """
+        Update the entries of the given user in the leaderboards of all
+        pages with the given treebeard paths.
+
+        Only pages that already have a leaderboard are updated.
+        """
+
+        from .score import UserScore
+
+        boards = list(self.filter(page__path__in=paths))
+        if not boards:
+            return
+        scores = UserScore.objects\
+            .filter(user_id=user_id, page_id__in=[b.page_id for b in boards])\
+            .values_list('page_id', 'points', 'stars')
+        scores = {page_id: (points, stars) for page_id, points, stars in scores}
+        for board in boards:
+            if board.page_id in scores:
+                board.update_entry(user_id, *scores[board.page_id])
+
+
+LeaderboardManager = _LeaderboardManager
+
+
+class Leaderboard(models.Model):
+    """
+    Ranked users for a page.
+
+    Users are ordered by points, then stars, and ties are broken by user id.
+    Ranks are not stored: the rank of a user is one plus the number of users
+    ahead of it, which the database counts on the (leaderboard, points,
+    stars, user) index. Counting takes time proportional to the rank, but a
+    score change only updates the row of the user, without locks or shifting
+    the ranks of other users.
+    """
+
+    class Meta:
+        verbose_name = _('leaderboard')
+        verbose_name_plural = _('leaderboards')
+
+    page = models.OneToOneField(
+        models.Page,
+        related_name='leaderboard',
+        on_delete=models.CASCADE,
+    )
+    size = models.PositiveIntegerField(default=0)
+    objects = LeaderboardManager()
+
+    def __str__(self):
+        return '<Leaderboard: page #%s (%s users)>' % (self.page_id, self.size)
+
+    def ranked_entries(self):
+        """
+        Return a queryset with all entries in ranking order.
+        """
+
+        return self.entries.order_by('-points', '-stars', 'user_id')
+
+    def top(self, k=10):
+        """
+        Return a list with the first k entries of the leaderboard.
+
+        Each entry has its 1-based position in the rank attribute.
+        """
+
+        entries = list(self.ranked_entries().select_related('user')[:k])
+        return _set_ranks(entries, 1)
+
+    def rank(self, user):
+        """
+        Return the 1-based rank of the given user or None if user is not in
+        the leaderboard.
+        """
+
+        entry = self.entries.filter(user_id=user.id).first()
+        if entry is None:
+            return None
+        return self.entries.filter(_ahead_of(entry)).count() + 1
+
+    def neighbors(self, user, size=3):
+        """
+        Return a list with the entry of the given user and up to size entries
+        before and after it.
+
+        Each entry has its 1-based position in the rank attribute.
+        """
+
+        entry = self.entries.filter(user_id=user.id).first()
+        if entry is None:
+            return []
+        ahead = self.entries.filter(_ahead_of(entry))
+        before = ahead\
+            .order_by('points', 'stars', '-user_id')\
+            .select_related('user')[:size]
+        after = self.ranked_entries()\
+            .exclude(_ahead_of(entry))\
+            .exclude(pk=entry.pk)\
+            .select_related('user')[:size]
+        entries = list(before)[::-1] + [entry] + list(after)
+        start = ahead.count() + 1 - len(before)
+        return _set_ranks(entries, start)
+
+    def update_entry(self, user_id, points, stars):
+        """
+        Register the new score of the given user.
+        """
+
+        entries = self.entries.filter(user_id=user_id)
+        if entries.update(points=points, stars=stars):
+            return
+        entry, created = LeaderboardEntry.objects.get_or_create(
+            leaderboard=self, user_id=user_id,
+            defaults={'points': points, 'stars': stars},
+        )
+        if created:
+            Leaderboard.objects\
+                .filter(pk=self.pk)\
+                .update(size=models.F('size') + 1)
+            self.size += 1
+        else:
+            entries.update(points=points, stars=stars)
+
+    def rebuild(self):
+        """
+        Rebuild the leaderboard from the UserScore table.
+        """
+
+        from .score import UserScore
+
+        rows = UserScore.objects\
+            .filter(page_id=self.page_id)\
+            .values_list('user_id', 'points', 'stars')
+        entries = [
+            LeaderboardEntry(leaderboard=self, user_id=user_id,
+                             points=points, stars=stars)
+            for user_id, points, stars in rows
+        ]
+        with transaction.atomic():
+            self.entries.all().delete()
+            LeaderboardEntry.objects.bulk_create(entries)
+            self.size = len(entries)
+            self.save(update_fields=['size'])
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Score of a user in a leaderboard.
+    """
+
+    class Meta:
+        unique_together = [('leaderboard', 'user')]
+        index_together = [('leaderboard', 'points', 'stars', 'user')]
+
+    leaderboard = models.ForeignKey(
+        Leaderboard,
+        related_name='entries',
+        on_delete=models.CASCADE,
+    )
+    user = models.ForeignKey(models.User, related_name='+')
+    points = models.IntegerField(default=0)
+    stars = models.DecimalField(
+        default=0.0,
+        decimal_places=1,
+        max_digits=5
+    )
+
+    #: 1-based position in the leaderboard. Ranks are not stored and are only
+    #: set in the entries returned by Leaderboard.top() and neighbors().
+    rank = None
+
+    def __str__(self):
+        if self.rank is None:
+            return '%s (%s pts)' % (self.user, self.points)
+        return '%s. %s (%s pts)' % (self.rank, self.user, self.points)
+
+
+def _ahead_of(entry):
+    # Entries that come before the given entry in the ranking
+    return (models.Q(points__gt=entry.points) |
+            models.Q(points=entry.points, stars__gt=entry.stars) |
+            models.Q(points=entry.points, stars=entry.stars,
+                     user_id__lt=entry.user_id))
+
+
+def _set_ranks(entries, start):
+    for rank, entry in enumerate(entries, start):
+        entry.rank = rank
+    return entries
+
+
+def leaderboard_context(page, user, top=10, neighbors=3):
+    """
+    Return a dictionary with the data rendered by leaderboard pages.
+    """
+
+    board = Leaderboard.objects.for_page(page)
+    context = {
+        'leaderboard': board,
+        'leaderboard_top': list(board.top(top)),
+        'leaderboard_rank': None,
+        'leaderboard_neighbors': [],
+    }
+    if user is not None and user.is_authenticated():
+        rank = board.rank(user)
+        context['leaderboard_rank'] = rank
+        if rank is not None and rank > top:
+            context['leaderboard_neighbors'] = \
+                list(board.neighbors(user, neighbors))
+    return context
@@ -1,11 +1,98 @@
+import uuid
 from collections import Counter
-from time import time
 
+from annoying.functions import get_config
 from decimal import Decimal
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, transaction
 from django.utils.translation import ugettext_lazy as _
 from lazyutils import lazy, lazy_classattribute
 
 from codeschool import models
+from .leaderboard import Leaderboard
+
+
+def ancestor_paths(path):
+    """
+    Return the treebeard paths of all ancestors of the node with the given
+    path, starting from the root and including the node itself.
+    """
+
+    step = models.Page.steplen
+    return [path[:i] for i in range(step, len(path) + 1, step)]
+
+
+#: Cache keys of the shared XP leaderboard. Changes are numbered by a
+#: sequence that belongs to an epoch, whose random id is stored in
+#: XP_EPOCH_KEY. The snapshot stores a tuple (epoch, sequence,
+#: Counter({user_id: points})) and each change is stored in a separate key as
+#: a (user_id, points) pair indexed by its epoch and sequence number.
+XP_LEADERBOARD_KEY = 'gamification.xp-leaderboard'
+XP_EPOCH_KEY = 'gamification.xp-leaderboard.epoch'
+XP_SEQUENCE_KEY = 'gamification.xp-leaderboard.sequence.%s'
+XP_CHANGE_KEY = 'gamification.xp-leaderboard.change.%s.%s'
+
+#: Snapshots are rebuilt from the database after this many seconds, even if
+#: no change was lost.
+XP_LEADERBOARD_TIMEOUT = 60 * 60
+
+#: Changes are folded into the shared snapshot after this many changes
+#: accumulate.
+XP_SNAPSHOT_INTERVAL = 100
+
+
+def xp_cache():
+    """
+    Return the cache that shares the XP leaderboard among all processes or
+    None if the backend chosen by the CODESCHOOL_XP_CACHE setting cannot
+    share it.
+
+    Local memory and dummy caches are not shared between processes, and
+    backends that implement incr() with a get() followed by a set() would
+    give the same sequence number to concurrent changes.
+    """
+
+    cache = caches[get_config('CODESCHOOL_XP_CACHE', 'default')]
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        return None
+    if type(cache).incr is BaseCache.incr:
+        return None
+    return cache
+
+
+def start_xp_epoch(cache):
+    """
+    Start a new epoch of the shared XP leaderboard and return the current
+    epoch id.
+
+    A lost sequence cannot simply restart, since readers would take the new
+    changes for the old ones with the same numbers. Changes are recorded in a
+    new epoch instead, and all processes rebuild their leaderboards.
+    """
+
+    epoch = uuid.uuid4().hex
+    cache.set(XP_SEQUENCE_KEY % epoch, 0, None)
+    cache.set(XP_EPOCH_KEY, epoch, None)
+    return cache.get(XP_EPOCH_KEY, epoch)
+
+
+def xp_sequence(cache):
+    """
+    Return the (epoch, sequence) pair of the last change recorded in the
+    shared XP leaderboard.
+    """
+
+    epoch = cache.get(XP_EPOCH_KEY)
+    sequence = None
+    if epoch is not None:
+        sequence = cache.get(XP_SEQUENCE_KEY % epoch)
+    if sequence is None:
+        epoch = start_xp_epoch(cache)
+        sequence = cache.get(XP_SEQUENCE_KEY % epoch, 0)
+    return epoch, sequence
 
 
 class GivenXpQuerySet(models.QuerySet):
@@ -30,10 +117,14 @@ class _GivenXpManager(models.Manager):
             class_name = token.__class__.__name__
             token = "%s.%s" % (label, class_name)
 
-        handler = self.get_or_create(user=user, token=token, index=index)
+        handler, created = self.get_or_create(user=user, token=token,
+                                              index=index)
         if handler.points != value:
+            delta = value - handler.points
             handler.points = value
             handler.save(update_fields=['points'])
+            total = XpTotal.objects.increment(user, delta)
+            GivenXp.register_total(user.id, total)
 
 GivenXpManager = _GivenXpManager.from_queryset(GivenXpQuerySet)
 
@@ -51,7 +142,10 @@ class GivenXp(models.Model):
     token = models.CharField(max_length=100)
     index = models.IntegerField(blank=True, null=True)
     objects = GivenXpManager()
-    _leaderboard_expire_time = time() - 1  # begin at expired state
+
+    # Last leaderboard seen by this process: an (epoch, sequence, counter)
+    # tuple.
+    _leaderboard_memo = (None, None, None)
 
     @classmethod
     def total_score(cls, user):
@@ -59,28 +153,147 @@ class GivenXp(models.Model):
         The total Xp points associated to the given user.
         """
 
-        points = cls.objects.filter(user=user).values_list('points', flat=True)
-        return sum(points)
+        return XpTotal.objects.total(user)
+
+    @classmethod
+    def register_total(cls, user_id, points):
+        """
+        Record the new XP total of a user in the shared leaderboard.
+
+        Changes hold absolute totals, so applying a change twice is
+        harmless.
+        """
+
+        cache = xp_cache()
+        if cache is None:
+            return
+        epoch = cache.get(XP_EPOCH_KEY)
+        try:
+            sequence = cache.incr(XP_SEQUENCE_KEY % epoch)
+        except ValueError:
+            # The sequence was evicted (or never created)
+            epoch = start_xp_epoch(cache)
+            sequence = cache.incr(XP_SEQUENCE_KEY % epoch)
+        cache.set(XP_CHANGE_KEY % (epoch, sequence), (user_id, points),
+                  XP_LEADERBOARD_TIMEOUT)
 
     @classmethod
     def leaderboard(cls, force_refresh=False):
         """
-        Construct the leaderboard from all GivenXp entries.
+        Return a Counter mapping user ids to their total XP.
+
+        The leaderboard is shared by all processes through the cache chosen
+        by the CODESCHOOL_XP_CACHE setting (see :func:`xp_cache`). Readers
+        apply the changes recorded after the cached snapshot instead of
+        scanning the database again. The snapshot is rebuilt from the XpTotal
+        table when it expires, if some change is lost or if a new epoch
+        starts. Without a shared cache, totals are read from the database on
+        each call.
+        """
+
+        cache = xp_cache()
+        if cache is None:
+            return Counter(dict(XpTotal.objects.values_list('user_id',
+                                                            'points')))
+
+        epoch, sequence = xp_sequence(cache)
+        memo_epoch, memo_sequence, counter = cls._leaderboard_memo
+        if not force_refresh and (memo_epoch, memo_sequence) == \
+                (epoch, sequence):
+            return counter
+
+        snapshot = None if force_refresh else cache.get(XP_LEADERBOARD_KEY)
+        if snapshot is None or snapshot[0] != epoch or snapshot[1] > sequence:
+            return cls._rebuild_leaderboard(cache, epoch, sequence)
+
+        _, snapshot_sequence, counter = snapshot
+        if memo_epoch == epoch and \
+                snapshot_sequence <= memo_sequence <= sequence:
+            _, start, counter = cls._leaderboard_memo
+        else:
+            start = snapshot_sequence
+
+        keys = [XP_CHANGE_KEY % (epoch, idx)
+                for idx in range(start + 1, sequence + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return cls._rebuild_leaderboard(cache, epoch, sequence)
+
+        for key in keys:
+            user_id, points = changes[key]
+            counter[user_id] = points
+        if sequence - snapshot_sequence >= XP_SNAPSHOT_INTERVAL:
+            cache.set(XP_LEADERBOARD_KEY, (epoch, sequence, counter),
+                      XP_LEADERBOARD_TIMEOUT)
+        cls._leaderboard_memo = (epoch, sequence, counter)
+        return counter
+
+    @classmethod
+    def reset_leaderboard(cls):
+        """
+        Start a new epoch of the shared leaderboard, forcing all processes to
+        rebuild it from the database.
+        """
+
+        cache = xp_cache()
+        if cache is not None:
+            start_xp_epoch(cache)
+        cls._leaderboard_memo = (None, None, None)
+
+    @classmethod
+    def _rebuild_leaderboard(cls, cache, epoch, sequence):
+        values = XpTotal.objects.values_list('user_id', 'points')
+        counter = Counter(dict(values))
+        cache.set(XP_LEADERBOARD_KEY, (epoch, sequence, counter),
+                  XP_LEADERBOARD_TIMEOUT)
+        cls._leaderboard_memo = (epoch, sequence, counter)
+        return counter
 
-        The leaderboard is cached and refreshed at most every 5min.
+
+class _XpTotalManager(models.Manager):
+    def increment(self, user, delta):
+        """
+        Add delta to the XP total of the given user and return the new total.
         """
 
-        if force_refresh or time() <= cls._leaderboard_expire_time:
-            cls._leaderboard_cache = counter = Counter()
-            values = cls.objects\
-                .select_related('user')\
-                .values_list('user', 'points')
+        totals = self.filter(user=user)
+        if not totals.update(points=models.F('points') + delta):
+            # The first increment computes the total from all GivenXp
+            # entries, which already include the current change.
+            points = GivenXp.objects\
+                .filter(user=user)\
+                .aggregate(total=models.Sum('points'))['total'] or 0
+            total, created = self.get_or_create(user=user,
+                                                defaults={'points': points})
+            if created:
+                return total.points
+            totals.update(points=models.F('points') + delta)
+        return totals.values_list('points', flat=True).get()
+
+    def total(self, user):
+        """
+        Return the XP total of the given user.
+        """
 
-            for user, points in values:
-                counter[user] += points
-            cls._leaderboard_expire_time = time() + 5 * 60
+        points = self.filter(user=user).values_list('points', flat=True)
+        return points.first() or 0
 
-        return cls._leaderboard_cache
+
+XpTotalManager = _XpTotalManager
+
+
+class XpTotal(models.Model):
+    """
+    Denormalized sum of the GivenXp points of each user.
+    """
+
+    user = models.OneToOneField(
+        models.User,
+        related_name='xp_total',
+        on_delete=models.CASCADE,
+    )
+    points = models.IntegerField(default=0)
+    objects = XpTotalManager()
 
 
 class GlobalAchievement(models.Model):
@@ -140,15 +353,67 @@ class ScoreHandler(models.TimeStampedModel):
             kwargs['stars'] = stars
 
         if kwargs and commit:
-            self.save(update_fields=kwargs.keys())
+            if propagate:
+                self.propagate(self.page, **dict(self.scope(), **kwargs))
+            else:
+                increments = {k: models.F(k) + v for k, v in kwargs.items()}
+                type(self).objects.filter(pk=self.pk).update(**increments)
 
-        # Propagate to all parent resources
-        if propagate and kwargs and commit:
-            parent = self.get_parent()
-            kwargs['commit'] = True
-            kwargs['propagate'] = True
-            if parent is not None:
-                parent.set_diff(optimistic=False, **kwargs)
+    @classmethod
+    def propagate(cls, page, points=0, stars=0, **scope):
+        """
+        Increment resources of the given page and all of its ancestors.
+
+        All existing handlers are updated atomically by a single UPDATE with
+        F() increments that selects the ancestors from the materialized path
+        of the page. Missing handlers are created in a single bulk insert.
+        The scope keyword arguments select the handlers (e.g., user_id for
+        UserScore objects).
+        """
+
+        increments = {}
+        if points:
+            increments['points'] = models.F('points') + points
+        if stars:
+            increments['stars'] = models.F('stars') + stars
+        if not increments:
+            return
+
+        paths = ancestor_paths(page.path)
+        pages = models.Page.objects.filter(path__in=paths)
+        queryset = cls.objects.filter(page__in=pages, **scope)
+        if queryset.update(**increments) >= len(paths):
+            return
+
+        # Handlers are created only once for each scope and page, so this
+        # path is rare.
+        existing = queryset.values_list('page_id', flat=True)
+        missing = list(pages
+                       .exclude(id__in=list(existing))
+                       .values_list('id', flat=True))
+        new = [cls(page_id=page_id, points=points, stars=stars, **scope)
+               for page_id in missing]
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(new)
+        except IntegrityError:
+            # Some handlers were created concurrently.
+            for page_id in missing:
+                handler, created = cls.objects.get_or_create(
+                    page_id=page_id,
+                    defaults={'points': points, 'stars': stars},
+                    **scope
+                )
+                if not created:
+                    cls.objects.filter(pk=handler.pk).update(**increments)
+
+    def scope(self):
+        """
+        Return a dictionary of lookups that select handlers that are
+        related to this one (e.g., handlers for the same user).
+        """
+
+        return {}
 
     def set_values(self, points=0, stars=0, propagate=True, optimistic=False,
                    commit=True):
@@ -214,6 +479,7 @@ class TotalScore(ScoreHandler):
         """
 
         score = cls.load(page)
+        score.page = page
         score.set_values(**kwargs)
 
     def get_parent(self):
@@ -241,20 +507,94 @@ class TotalScore(ScoreHandler):
         """
         Recompute the totals for the given activity and all of its children.
 
-        Set commit=False to prevent modifying the database.
+        Set commit=False to prevent modifying the database (and this
+        object). Return a Counter with the totals.
         """
 
-        initial = self.contribution()
-        totals = [c.recompute_total(commit) for c in self.get_children()]
-        result = sum(totals, initial)
+        result = self.recompute_totals(self.page, commit)[self.page_id]
         if commit:
-            fields = []
             for k, v in result.items():
-                fields.append(k)
                 setattr(self, k, v)
-            self.save(update_fields=fields)
         return result
 
+    @classmethod
+    def recompute_totals(cls, root=None, commit=True):
+        """
+        Recompute the totals of all pages under root (the whole site, by
+        default).
+
+        Contributions are loaded with one query per concrete page type and
+        totals are aggregated bottom-up using the treebeard paths. Only the
+        changed TotalScore objects are saved. Return a dictionary mapping page
+        ids to Counter objects with the totals of each page.
+        """
+
+        root = root or cls._wagtail_root
+        pages = models.Page.objects\
+            .filter(path__startswith=root.path)\
+            .values_list('id', 'path', 'content_type_id')
+        page_ids, types = {}, set()
+        for page_id, path, content_type_id in pages:
+            page_ids[path] = page_id
+            types.add(content_type_id)
+        contributions = cls._load_contributions(root, types)
+
+        # Longer paths come first, so children are added to their parents
+        # after their own totals are complete.
+        step = models.Page.steplen
+        totals = {}
+        for path in sorted(page_ids, key=len, reverse=True):
+            page_id = page_ids[path]
+            total = totals.setdefault(page_id, Counter())
+            total.update(contributions.get(page_id, {}))
+            parent_id = page_ids.get(path[:-step])
+            if parent_id is not None:
+                totals.setdefault(parent_id, Counter()).update(total)
+
+        if commit:
+            cls._save_totals(root, totals)
+        return totals
+
+    @classmethod
+    def _load_contributions(cls, root, content_type_ids):
+        contributions = {}
+        for content_type_id in content_type_ids:
+            content_type = models.ContentType.objects.get_for_id(
+                content_type_id)
+            model = content_type.model_class()
+            if model is None:
+                continue
+            pages = model.objects.filter(path__startswith=root.path)
+            if issubclass(model, HasScorePage):
+                rows = pages.values_list('id', 'points_total', 'stars_total')
+                for page_id, points, stars in rows:
+                    contributions[page_id] = {'points': points or 0,
+                                              'stars': stars or 0}
+            elif hasattr(model, 'get_score_contributions'):
+                for page in pages:
+                    contributions[page.id] = page.get_score_contributions()
+        return contributions
+
+    @classmethod
+    def _save_totals(cls, root, totals):
+        existing = cls.objects.filter(page__path__startswith=root.path)
+        existing = {score.page_id: score for score in existing}
+        changed, new = [], []
+        for page_id, total in totals.items():
+            points = total.get('points', 0)
+            stars = total.get('stars', 0)
+            score = existing.get(page_id)
+            if score is None:
+                new.append(cls(page_id=page_id, points=points, stars=stars))
+            elif (score.points, score.stars) != (points, stars):
+                score.points, score.stars = points, stars
+                changed.append(score)
+
+        with transaction.atomic():
+            cls.objects.bulk_create(new, batch_size=500)
+            models.bulk_update(cls, changed, ['points', 'stars'],
+                               batch_size=500)
+
 
 class UserScore(ScoreHandler):
     """
@@ -295,7 +635,12 @@ class UserScore(ScoreHandler):
         Accept the same keyword arguments as the .set_values() method.
         """
 
+        if diff and set(kwargs).issubset({'points', 'stars'}):
+            cls.propagate(page, user_id=user.id, **kwargs)
+            return
+
         score = cls.load(user, page)
+        score.page = page
         if diff:
             score.set_diff(**kwargs)
         else:
@@ -330,6 +675,18 @@ class UserScore(ScoreHandler):
 
         return points_counter, stars_counter
 
+    @classmethod
+    def propagate(cls, page, points=0, stars=0, **scope):
+        super().propagate(page, points=points, stars=stars, **scope)
+
+        # Move user in the leaderboards of the affected pages
+        if (points or stars) and 'user_id' in scope:
+            paths = ancestor_paths(page.path)
+            Leaderboard.objects.register_scores(scope['user_id'], paths)
+
+    def scope(self):
+        return {'user_id': self.user_id}
+
     def get_parent(self):
         parent_page = self.page.get_parent()
         if parent_page is None:
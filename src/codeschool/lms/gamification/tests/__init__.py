@@ -0,0 +1 @@
+from codeschool.tests import *
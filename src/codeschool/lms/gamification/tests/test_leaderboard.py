@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from . import *
+from codeschool.models import Page, User
+from codeschool.lms.gamification.models import Leaderboard
+
+
+@pytest.fixture
+def leaderboard_db(db):
+    return Leaderboard.objects.for_page(Page.objects.get(depth=1))
+
+
+@pytest.fixture
+def users_db(db):
+    return [User.objects.create(username='user%s' % idx) for idx in range(6)]
+
+
+def ranking(board):
+    return [(entry.rank, entry.user_id) for entry in board.top(100)]
+
+
+@pytest.mark.django_db
+def test_leaderboard_ranks_by_points_stars_and_user(leaderboard_db, users_db):
+    board = leaderboard_db
+    u0, u1, u2, u3, u4, u5 = users_db
+    board.update_entry(u0.id, 10, 0)
+    board.update_entry(u1.id, 20, 0)
+    board.update_entry(u2.id, 10, Decimal(1))
+    board.update_entry(u3.id, 10, 0)
+    assert board.size == 4
+    assert ranking(board) == [(1, u1.id), (2, u2.id), (3, u0.id), (4, u3.id)]
+    assert [board.rank(user) for user in users_db] == [3, 1, 2, 4, None, None]
+
+    # Users move when their scores change
+    board.update_entry(u3.id, 30, 0)
+    board.update_entry(u1.id, 5, 0)
+    board.refresh_from_db()
+    assert board.size == 4
+    assert ranking(board) == [(1, u3.id), (2, u2.id), (3, u0.id), (4, u1.id)]
+    assert board.rank(u1) == 4
+
+
+@pytest.mark.django_db
+def test_leaderboard_neighbors(leaderboard_db, users_db):
+    board = leaderboard_db
+    for points, user in enumerate(users_db):
+        board.update_entry(user.id, 100 - points, 0)
+
+    neighbors = board.neighbors(users_db[3], 2)
+    assert [(x.rank, x.user_id) for x in neighbors] == \
+        [(idx + 1, users_db[idx].id) for idx in range(1, 6)]
+    neighbors = board.neighbors(users_db[0], 1)
+    assert [(x.rank, x.user_id) for x in neighbors] == \
+        [(1, users_db[0].id), (2, users_db[1].id)]
+    assert board.top(2) == neighbors
+    assert board.neighbors(User(id=0)) == []
@@ -0,0 +1,146 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management import call_command, CommandError
+
+from . import *
+from codeschool import models
+from codeschool.lms.activities.models import ActivitySection
+from codeschool.lms.gamification.models import TotalScore
+from codeschool.questions.coding_io.models import CodingIoQuestion
+
+
+def recursive_totals(page):
+    # The recursive algorithm replaced by TotalScore.recompute_totals()
+    specific = page.specific
+    total = Counter()
+    if hasattr(specific, 'get_score_contributions'):
+        total.update(specific.get_score_contributions())
+    for child in page.get_children():
+        total.update(recursive_totals(child))
+    return total
+
+
+def values(total):
+    return total.get('points', 0), total.get('stars', 0)
+
+
+def add_section(parent, idx):
+    return parent.add_child(instance=ActivitySection(
+        title='Section %s' % idx, slug='section-%s' % idx,
+    ))
+
+
+def add_question(parent, idx, points, stars):
+    return parent.add_child(instance=CodingIoQuestion(
+        title='Question %s' % idx, slug='question-%s' % idx,
+        short_description='question',
+        iospec_source='<foo>\nhello foo!',
+        points_total=points, stars_total=Decimal(stars),
+    ))
+
+
+@pytest.fixture
+def page_tree(db):
+    """
+    A tree with a section, two subsections and three questions. Return a
+    dictionary with all pages.
+    """
+
+    root = models.Page.objects.get(depth=1)
+    pages = {'root': add_section(root, 0)}
+    pages['left'] = add_section(pages['root'], 1)
+    pages['right'] = add_section(pages['root'], 2)
+    pages['q1'] = add_question(pages['left'], 1, 10, 1)
+    pages['q2'] = add_question(pages['left'], 2, 30, 0.5)
+    pages['q3'] = add_question(pages['right'], 3, 60, 2)
+    pages['q4'] = add_question(pages['root'], 4, 100, 0)
+    for name, page in pages.items():
+        pages[name] = models.Page.objects.get(pk=page.pk)
+    return pages
+
+
+def corrupt_totals(pages):
+    TotalScore.objects.filter(page=pages['left']).update(points=999)
+    TotalScore.objects.filter(page=pages['q3']).delete()
+
+
+def saved_totals(pages):
+    scores = TotalScore.objects.filter(page__in=pages.values())
+    return {score.page_id: (score.points, score.stars) for score in scores}
+
+
+@pytest.mark.django_db
+def test_recompute_totals_matches_recursive_totals(page_tree):
+    corrupt_totals(page_tree)
+    totals = TotalScore.recompute_totals(page_tree['root'])
+
+    expected = {page.id: values(recursive_totals(page))
+                for page in page_tree.values()}
+    assert {page_id: values(total) for page_id, total in totals.items()} \
+        == expected
+    assert expected[page_tree['root'].id] == (200, Decimal('3.5'))
+    assert saved_totals(page_tree) == expected
+
+
+@pytest.mark.django_db
+def test_load_contributions(page_tree):
+    root = page_tree['root']
+    types = {page.content_type_id for page in page_tree.values()}
+    contributions = TotalScore._load_contributions(root, types)
+    assert {page_id: values(data)
+            for page_id, data in contributions.items()} == {
+        page_tree['q1'].id: (10, 1),
+        page_tree['q2'].id: (30, Decimal('0.5')),
+        page_tree['q3'].id: (60, 2),
+        page_tree['q4'].id: (100, 0),
+    }
+
+
+@pytest.mark.django_db
+def test_save_totals_creates_and_updates_rows(page_tree):
+    corrupt_totals(page_tree)
+    left, q3 = page_tree['left'], page_tree['q3']
+    totals = {left.id: Counter(points=40, stars=Decimal('1.5')),
+              q3.id: Counter(points=60, stars=2)}
+    TotalScore._save_totals(page_tree['root'], totals)
+
+    saved = saved_totals(page_tree)
+    assert saved[left.id] == (40, Decimal('1.5'))
+    assert saved[q3.id] == (60, 2)
+
+
+@pytest.mark.django_db
+def test_recompute_total_without_commit(page_tree):
+    corrupt_totals(page_tree)
+    score = TotalScore.objects.get(page=page_tree['left'])
+    before = saved_totals(page_tree)
+
+    result = score.recompute_total(commit=False)
+    assert values(result) == (40, Decimal('1.5'))
+    assert score.points == 999
+    assert saved_totals(page_tree) == before
+
+    score.recompute_total()
+    assert score.points == 40
+    assert TotalScore.objects.get(page=page_tree['left']).points == 40
+
+
+@pytest.mark.django_db
+def test_recomputetotals_command(page_tree, capsys):
+    corrupt_totals(page_tree)
+    root = page_tree['root']
+    before = saved_totals(page_tree)
+
+    call_command('recomputetotals', str(root.id), '--dry-run')
+    out, _ = capsys.readouterr()
+    assert 'Recomputed totals for 7 pages.' in out
+    assert 'Page #%s: 200 points' % root.id in out
+    assert saved_totals(page_tree) == before
+
+    call_command('recomputetotals', str(root.id))
+    assert saved_totals(page_tree)[page_tree['left'].id] == \
+        (40, Decimal('1.5'))
+
+    with pytest.raises(CommandError):
+        call_command('recomputetotals', '0')
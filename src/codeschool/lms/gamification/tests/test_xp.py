@@ -0,0 +1,94 @@
+from django.core.cache import caches
+
+from . import *
+from codeschool.models import User
+from codeschool.lms.gamification.models import score, GivenXp, XpTotal
+
+
+@pytest.fixture
+def shared_cache(monkeypatch):
+    cache = caches['default']
+    cache.clear()
+    monkeypatch.setattr(score, 'xp_cache', lambda: cache)
+    GivenXp.reset_leaderboard()
+    yield cache
+    GivenXp.reset_leaderboard()
+    cache.clear()
+
+
+@pytest.fixture
+def xp_users_db(db):
+    return [User.objects.create(username='xp-user%s' % idx)
+            for idx in range(3)]
+
+
+def test_xp_cache_refuses_local_memory_cache(settings):
+    settings.CODESCHOOL_XP_CACHE = 'default'
+    assert score.xp_cache() is None
+
+
+@pytest.mark.django_db
+def test_xp_total_increment(xp_users_db):
+    user = xp_users_db[0]
+    GivenXp.objects.create(user=user, points=10, token='a')
+    assert XpTotal.objects.total(user) == 0
+
+    # The first increment sums the existing entries
+    assert XpTotal.objects.increment(user, 10) == 10
+    assert XpTotal.objects.increment(user, 5) == 15
+    assert XpTotal.objects.increment(user, -15) == 0
+
+    GivenXp.objects.update(user, 20, 'b')
+    GivenXp.objects.update(user, 25, 'b')
+    assert GivenXp.total_score(user) == 25
+
+
+@pytest.mark.django_db
+def test_register_total_records_changes(shared_cache, xp_users_db):
+    user = xp_users_db[0]
+    GivenXp.register_total(user.id, 10)
+    GivenXp.register_total(user.id, 20)
+
+    epoch, sequence = score.xp_sequence(shared_cache)
+    assert sequence == 2
+    assert shared_cache.get(score.XP_CHANGE_KEY % (epoch, 2)) == (user.id, 20)
+
+
+@pytest.mark.django_db
+def test_leaderboard_replays_changes(shared_cache, xp_users_db):
+    u0, u1, u2 = xp_users_db
+    GivenXp.objects.update(u0, 10, 'a')
+    assert GivenXp.leaderboard() == {u0.id: 10}
+
+    # Changes that are not registered are not seen until a rebuild
+    XpTotal.objects.filter(user=u0).update(points=100)
+    GivenXp.objects.update(u1, 20, 'a')
+    GivenXp.objects.update(u2, 30, 'a')
+    assert GivenXp.leaderboard() == {u0.id: 10, u1.id: 20, u2.id: 30}
+
+    # Other processes replay from the snapshot
+    GivenXp._leaderboard_memo = (None, None, None)
+    assert GivenXp.leaderboard() == {u0.id: 10, u1.id: 20, u2.id: 30}
+    assert GivenXp.leaderboard(force_refresh=True)[u0.id] == 100
+
+
+@pytest.mark.django_db
+def test_leaderboard_rebuilds_on_new_epoch(shared_cache, xp_users_db):
+    u0, u1, u2 = xp_users_db
+    GivenXp.objects.update(u0, 10, 'a')
+    assert GivenXp.leaderboard() == {u0.id: 10}
+    epoch, sequence = score.xp_sequence(shared_cache)
+
+    # A lost sequence starts a new epoch instead of reusing old numbers
+    XpTotal.objects.filter(user=u0).update(points=100)
+    shared_cache.delete(score.XP_SEQUENCE_KEY % epoch)
+    GivenXp.objects.update(u1, 20, 'a')
+    assert score.xp_sequence(shared_cache)[0] != epoch
+    assert GivenXp.leaderboard() == {u0.id: 100, u1.id: 20}
+
+    # Lost changes force a rebuild
+    XpTotal.objects.filter(user=u1).update(points=200)
+    GivenXp.objects.update(u2, 30, 'a')
+    epoch, sequence = score.xp_sequence(shared_cache)
+    shared_cache.delete(score.XP_CHANGE_KEY % (epoch, sequence))
+    assert GivenXp.leaderboard() == {u0.id: 100, u1.id: 200, u2.id: 30}
@@ -77,8 +77,8 @@ class GradingMethod(models.Model):
         Return the grading method with the given name for the given user.
         """
 
-        if name in self.VALID_NAMES:
-            return getattr(self, name)()
+        if name in cls.VALID_NAMES:
+            return getattr(cls, name)()
         elif user:
             return cls.objects.get(name=name, user=user)
         else:
@@ -162,6 +162,32 @@ class GradingMethod(models.Model):
         else:
             raise NotImplementedError
 
+    def grade_response(self, response):
+        """
+        Grade a Response object from the running aggregates it keeps over its
+        graded submissions.
+
+        Unlike :meth:`grade`, this does not read any submission from the
+        database.
+        """
+
+        if not response.submission_count:
+            return ZERO
+        name = self.name
+
+        if name == 'best':
+            return response.best_grade
+        elif name == 'worst':
+            return response.worst_grade
+        elif name == 'first':
+            return response.first_grade
+        elif name == 'last':
+            return response.last_grade
+        elif name == 'average':
+            return response.average_grade
+        else:
+            raise NotImplementedError
+
     def _filter_valid_responses(self, responses):
         for response in responses:
             if response.status == response.STATUS_PENDING:
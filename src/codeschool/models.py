@@ -44,6 +44,34 @@ def _get_subpage_urls(cls):
 RoutablePageMixin.get_subpage_urls = classmethod(_get_subpage_urls)
 
 
+#
+# Query helpers
+#
+def bulk_update(model, objects, fields, batch_size=None):
+    """
+    Save the given fields of a list of model instances with a single UPDATE
+    query (or one query per batch, if batch_size is given).
+    """
+
+    objects = list(objects)
+    if not objects:
+        return 0
+    if batch_size and len(objects) > batch_size:
+        return sum(bulk_update(model, objects[i:i + batch_size], fields)
+                   for i in range(0, len(objects), batch_size))
+
+    values = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        whens = [When(pk=obj.pk,
+                      then=Value(getattr(obj, name), output_field=field))
+                 for obj in objects]
+        values[name] = Case(*whens, output_field=field)
+
+    pks = [obj.pk for obj in objects]
+    return model._base_manager.filter(pk__in=pks).update(**values)
+
+
 #
 # Codeschool based managers
 #
@@ -0,0 +1,16 @@
+"""
+Grading backends for CodingIoQuestion submissions.
+
+The functions in :mod:`codeschool.questions.coding_io.models.question`
+(run_code and grade_code) are the entry points used by the models. They
+delegate the actual execution to the strategies implemented in this package.
+"""
+from .batch import grade_batch_source, is_batch_answer_key, supports_batch
+from .build_cache import build_artifact, get_build_cache
+from .interactive import grade_interactive
+from .iospec_cache import cached_iospec, cached_compact_form
+from .parallel import grade_parallel, pool_size, skipped_testcases
+from .resources import aggregate_usage, total_usage, UsageMeter, \
+    reference_profile, calibrated_timeout
+from .storage import compact_feedback, expand_feedback, testcase_index
+from .zygote import get_executor, ZygoteExecutor
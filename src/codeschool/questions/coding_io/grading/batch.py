@@ -0,0 +1,430 @@
+"""
+Fast path for testcases with a fixed input and an exact output.
+
+Most beginner questions read all their inputs and only then print the
+results. In the expanded answer key, these testcases look like::
+
+    <1>
+    <2>
+    3
+
+and the interactive execution (which sends each input only after the program
+asks for it and records the prompts printed before each input) is not
+necessary: the program can receive all inputs at once in its stdin and its
+stdout is read in a single step and compared with the expected output.
+
+Output is compared with the expected output while the program runs (see
+stream.py), so programs that diverge from it or print too much are killed
+right away.
+
+This module is also imported inside the sandbox, where the programs run.
+"""
+import codecs
+import os
+import select
+import shutil
+import stat
+import subprocess
+import tempfile
+import time
+
+from boxed.jsonbox import run as run_sandbox
+from iospec import IoSpec, In, Out, SimpleTestCase, ErrorTestCase
+from iospec.feedback import Feedback, feedback as compare_testcase
+
+from .resources import UsageMeter
+from .stream import OutputComparator
+
+#: Interpreters used to run each interpreted language in batch mode. They
+#: are overridden by the CODESCHOOL_INTERPRETERS setting. The interpreter that
+#: runs codeschool is never used: inside the sandbox, it is the python_boxed
+#: binary, which has setuid capabilities.
+INTERPRETERS = {
+    'python': 'python3',
+    'python2': 'python2',
+}
+
+#: Exception names that are reported as build errors in interpreted
+#: languages.
+BUILD_ERRORS = ('SyntaxError', 'IndentationError', 'TabError')
+
+#: Timeout used when running code without an explicit time limit.
+DEFAULT_TIMEOUT = 10.0
+
+
+def last_input(case):
+    """
+    Return the position of the last input in the given testcase or -1 if it
+    has no inputs.
+    """
+
+    positions = [idx for idx, atom in enumerate(case) if isinstance(atom, In)]
+    return positions[-1] if positions else -1
+
+
+def is_batch_testcase(case):
+    """
+    Return True if the given answer key testcase can be graded in batch
+    mode: it is an expanded simple testcase in which the program does not
+    print anything before reading its last input.
+    """
+
+    if not case.is_expanded:
+        return False
+    return all(isinstance(atom, In) or not str(atom)
+               for atom in list(case)[:last_input(case)])
+
+
+def is_batch_answer_key(answer_key):
+    """
+    Return True if all testcases of answer_key can be graded in batch mode.
+    """
+
+    return bool(answer_key) and all(map(is_batch_testcase, answer_key))
+
+
+def batch_input(case):
+    """
+    Return the contents of the stdin of a program that runs the given
+    testcase in batch mode.
+    """
+
+    return ''.join(value + '\n' for value in case.inputs())
+
+
+def expected_output(case):
+    """
+    Return the normalized output expected for a batch testcase or None if the
+    program should not print anything after its last input.
+    """
+
+    atoms = list(case)
+    if atoms and isinstance(atoms[-1], Out):
+        return str(atoms[-1])
+    return None
+
+
+def normalize_output(data):
+    """
+    Normalize the stdout of a program as ejudge does: a single trailing
+    newline is removed.
+    """
+
+    return data[:-1] if data.endswith('\n') else data
+
+
+def batch_testcase(answer_key, output):
+    """
+    Return the testcase of a program that produced the given normalized
+    output for a batch answer key testcase.
+
+    The output is placed after the last input, in the same structure of the
+    answer key.
+    """
+
+    atoms = [In(str(atom)) if isinstance(atom, In) else Out('')
+             for atom in list(answer_key)[:last_input(answer_key) + 1]]
+    if output or expected_output(answer_key) is not None:
+        atoms.append(Out(output))
+    return SimpleTestCase(atoms)
+
+
+def divergence_message(output, divergence):
+    """
+    Return a message that explains where the output of a program diverged
+    from the expected output.
+
+    Args:
+        output:
+            The output of the program.
+        divergence:
+            A dictionary with the "position" of the first divergent character
+            and the "reason" ("mismatch" or "limit"), as returned by
+            OutputComparator.divergence().
+    """
+
+    position = divergence['position']
+    if divergence['reason'] == 'limit':
+        return 'Output limit exceeded: the program printed more than %s ' \
+               'characters.' % position
+    line = output.count('\n', 0, position) + 1
+    column = position - output.rfind('\n', 0, position)
+    return 'Output differs from the expected output at line %s, column %s ' \
+           '(character %s).' % (line, column, position + 1)
+
+
+def batch_feedback(case, answer_key, divergence=None):
+    """
+    Compare a testcase created by :func:`run_batch` with the answer key.
+
+    The common case of a correct output is checked by a single string
+    comparison. If divergence is given, the program was killed before
+    finishing and the result is a wrong answer.
+    """
+
+    expected = expected_output(answer_key)
+    if divergence is not None:
+        output = str(list(case)[-1])
+        message = divergence_message(output, divergence)
+        return Feedback(case, answer_key, grade=0, status='wrong-answer',
+                        message=message)
+    if isinstance(case, SimpleTestCase) and expected is not None and \
+            str(list(case)[-1]) == expected:
+        return Feedback(case, answer_key, grade=1, status='ok')
+    return compare_testcase(case, answer_key)
+
+
+def communicate(process, data, comparator, timeout):
+    """
+    Send data to the stdin of process and read its stdout and stderr until it
+    finishes, times out or its output is rejected by the comparator.
+
+    Return a tuple with the decoded stdout, the decoded stderr and a boolean
+    that tells if the execution timed out. The process is killed if it does
+    not finish.
+    """
+
+    decoder = codecs.getincrementaldecoder('utf8')('replace')
+    stdout, stderr = [], []
+    stderr_size = 0
+    deadline = time.time() + timeout
+    timed_out = False
+
+    os.set_blocking(process.stdin.fileno(), False)
+    writers = [process.stdin] if data else []
+    readers = [process.stdout, process.stderr]
+    if not data:
+        process.stdin.close()
+
+    while readers:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready_read, ready_write, _ = \
+            select.select(readers, writers, [], remaining)
+
+        for stream in ready_write:
+            try:
+                data = data[os.write(stream.fileno(), data):]
+            except BrokenPipeError:
+                data = b''
+            if not data:
+                writers.remove(stream)
+                stream.close()
+
+        for stream in ready_read:
+            chunk = os.read(stream.fileno(), 65536)
+            if not chunk:
+                readers.remove(stream)
+            elif stream is process.stdout:
+                text = decoder.decode(chunk)
+                stdout.append(text)
+                if not comparator.feed(text):
+                    readers = []
+                    break
+            elif stderr_size < comparator.max_size:
+                stderr.append(chunk)
+                stderr_size += len(chunk)
+
+    if readers or comparator.diverged:
+        process.kill()
+    if not process.stdin.closed:
+        process.stdin.close()
+    process.wait()
+    process.stdout.close()
+    process.stderr.close()
+
+    stdout.append(decoder.decode(b'', final=True))
+    stderr = b''.join(stderr).decode('utf8', 'replace')
+    return ''.join(stdout), stderr, timed_out
+
+
+def run_batch(args, answer_key, timeout=None, cwd=None, interpreted=False):
+    """
+    Run the program described by args with all inputs of the given answer
+    key testcase.
+
+    Return a tuple with the resulting testcase and the divergence dictionary
+    of the comparator (see :func:`divergence_message`) or None if the
+    program was not killed for printing a wrong output.
+
+    Args:
+        args:
+            Command line used to run the program.
+        answer_key:
+            A batch answer key testcase.
+        timeout:
+            Maximum execution time, in seconds.
+        cwd:
+            Working directory of the program.
+        interpreted:
+            If True, a non-zero exit status with some output in stderr is a
+            runtime error and the last line of stderr is used to detect
+            syntax errors. Otherwise, only programs killed by a signal are
+            considered to fail.
+    """
+
+    process = subprocess.Popen(
+        args,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+    )
+    comparator = OutputComparator(expected_output(answer_key))
+    stdout, stderr, timed_out = communicate(
+        process, batch_input(answer_key).encode('utf8'), comparator,
+        timeout or DEFAULT_TIMEOUT,
+    )
+    divergence = comparator.divergence()
+
+    if divergence is not None:
+        end = divergence['position']
+        if divergence['reason'] == 'mismatch':
+            end += 1
+        return batch_testcase(answer_key, stdout[:end]), divergence
+    elif timed_out:
+        return ErrorTestCase.timeout([]), None
+
+    case = batch_testcase(answer_key, normalize_output(stdout))
+    stderr = stderr.strip()
+    if process.returncode < 0:
+        message = 'program terminated by signal %s' % -process.returncode
+        return ErrorTestCase(list(case), error_message=message), None
+    elif interpreted and process.returncode and stderr:
+        last_line = stderr.splitlines()[-1]
+        if last_line.startswith(BUILD_ERRORS):
+            return ErrorTestCase.build(error_message=stderr), None
+        return ErrorTestCase(list(case), error_message=stderr), None
+    return case, None
+
+
+def grade_batch(args, answer_key, timeout=None, fast=True, cwd=None,
+                interpreted=False):
+    """
+    Grade the program described by args against the JSON form of a batch
+    answer key.
+
+    Return a dictionary with the JSON form of the resulting feedback in the
+    "feedback" key and the list of usage entries in the "usage" key, as
+    grade_executable() does.
+    """
+
+    feedback = None
+    usage = []
+
+    for idx, key in enumerate(IoSpec.from_json(answer_key)):
+        with UsageMeter() as meter:
+            case, divergence = run_batch(args, key, timeout, cwd,
+                                         interpreted)
+        current = batch_feedback(case, key, divergence)
+        usage.append(meter.entry(idx, current))
+
+        # The first testcase with the lowest grade wins
+        if feedback is None or current.grade < feedback.grade:
+            feedback = current
+            if fast and feedback.grade == 0:
+                break
+
+    return {'feedback': feedback.to_json(), 'usage': usage}
+
+
+def is_privileged(path):
+    """
+    Return True if the executable in the given path gains privileges when
+    it runs: it is a setuid/setgid file or has file capabilities.
+    """
+
+    path = os.path.realpath(path)
+    if os.stat(path).st_mode & (stat.S_ISUID | stat.S_ISGID):
+        return True
+    try:
+        return bool(os.getxattr(path, 'security.capability'))
+    except (AttributeError, OSError):
+        return False
+
+
+def get_interpreter(lang):
+    """
+    Return the full path of the interpreter used to run code of the given
+    language in batch mode.
+
+    Raise ImproperlyConfigured if the interpreter is not found or if it would
+    run with more privileges than the user code should have.
+    """
+
+    from annoying.functions import get_config
+    from django.core.exceptions import ImproperlyConfigured
+
+    interpreters = dict(INTERPRETERS)
+    interpreters.update(get_config('CODESCHOOL_INTERPRETERS', {}))
+    interpreter = interpreters[lang]
+    path = shutil.which(interpreter)
+    if path is None:
+        raise ImproperlyConfigured(
+            'interpreter for %s not found: %r' % (lang, interpreter)
+        )
+    if is_privileged(path):
+        raise ImproperlyConfigured(
+            'the %s interpreter must be an unprivileged executable: %r' %
+            (lang, path)
+        )
+    return path
+
+
+def grade_interpreted(source, interpreter, answer_key, timeout=None,
+                      fast=True):
+    """
+    Grade source code of an interpreted language against the JSON form of a
+    batch answer key. The result is the same as in :func:`grade_batch`.
+
+    This function runs inside the sandbox if sandboxing is enabled. The
+    interpreter is an executable path returned by :func:`get_interpreter`.
+    """
+
+    # Programs would regain the privileges the sandbox dropped. The check is
+    # repeated here since the interpreter could be replaced after
+    # get_interpreter() checked it.
+    if is_privileged(interpreter):
+        raise PermissionError('refusing to run code with a privileged '
+                              'interpreter: %r' % interpreter)
+
+    path = tempfile.mkdtemp(prefix='codeschool-batch-')
+    try:
+        with open(os.path.join(path, 'main.py'), 'w') as F:
+            F.write(source)
+        return grade_batch([interpreter, 'main.py'], answer_key, timeout,
+                           fast=fast, cwd=path, interpreted=True)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def supports_batch(lang, answer_key):
+    """
+    Return True if source code of the given language can be graded against
+    answer_key by :func:`grade_batch_source`.
+    """
+
+    return lang in INTERPRETERS and is_batch_answer_key(answer_key)
+
+
+def grade_batch_source(source, answer_key, lang, timeout=None, sandbox=True,
+                       fast=True, usage=None):
+    """
+    Grade source code against a batch answer key. Works as ejudge.grade().
+
+    The resources used by each testcase are appended to the optional usage
+    list.
+    """
+
+    args = (source, get_interpreter(lang), answer_key.to_json())
+    kwargs = {'timeout': timeout, 'fast': fast}
+    if sandbox:
+        result = run_sandbox(grade_interpreted, args=args, kwargs=kwargs,
+                             imports=[__name__])
+    else:
+        result = grade_interpreted(*args, **kwargs)
+    if usage is not None:
+        usage.extend(result['usage'])
+    return Feedback.from_json(result['feedback'])
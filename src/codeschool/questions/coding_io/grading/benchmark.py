@@ -0,0 +1,104 @@
+"""
+Compares the per-testcase latency of the available code executors.
+
+The benchmark does not touch the database. It grades a small program against
+synthetic testcases using both ejudge and the zygote executor::
+
+    $ python manage.py benchexecutor --lang python --testcases 50
+"""
+import time
+
+import ejudge
+from iospec import IoSpec, parse_string as parse_iospec
+
+from .resources import percentile
+from .zygote import ZygoteExecutor
+
+#: Reference programs: read a number and print its double.
+PROGRAMS = {
+    'python': 'x = int(input("x: "))\nprint(x * 2)\n',
+    'pytuga': 'x = int(input("x: "))\nprint(x * 2)\n',
+    'python2': 'x = int(raw_input("x: "))\nprint x * 2\n',
+}
+
+
+def make_answer_key(size):
+    """
+    Return an IoSpec answer key with the given number of testcases for the
+    programs in PROGRAMS.
+    """
+
+    cases = ['x: <%s>\n%s' % (i, 2 * i) for i in range(size)]
+    return parse_iospec('\n\n'.join(cases))
+
+
+def summary(latencies):
+    """
+    Summarize a list of latencies (in seconds).
+    """
+
+    data = sorted(latencies)
+    return {
+        'n': len(data),
+        'mean': sum(data) / len(data) if data else 0.0,
+        'p50': percentile(data, 50),
+        'p95': percentile(data, 95),
+        'max': data[-1] if data else 0.0,
+    }
+
+
+def measure(grade, answer_key, repeat=1):
+    """
+    Call grade(testcase) for each testcase of the answer key and return the
+    list of latencies.
+
+    Raises a ValueError if the reference program is not graded as correct.
+    """
+
+    latencies = []
+    for _ in range(repeat):
+        for case in answer_key:
+            start = time.perf_counter()
+            feedback = grade(case)
+            latencies.append(time.perf_counter() - start)
+            if not feedback.is_correct:
+                raise ValueError('unexpected feedback: %s' % feedback.status)
+    return latencies
+
+
+def bench_executors(lang='python', testcases=20, repeat=1, sandbox=True,
+                    timeout=1.0):
+    """
+    Run the benchmark for the given language and return a dictionary mapping
+    each executor name to a summary of its per-testcase latencies.
+
+    The startup time of the zygote server is reported separately in the
+    'zygote-startup' key.
+    """
+
+    source = PROGRAMS[lang]
+    answer_key = make_answer_key(testcases)
+    results = {}
+
+    # Current path: ejudge creates a new process/sandbox for each call
+    results['ejudge'] = summary(measure(
+        lambda case: ejudge.grade(source, IoSpec([case]), lang, raises=False,
+                                  sandbox=sandbox),
+        answer_key, repeat,
+    ))
+
+    # Zygote executor: startup is paid only once
+    executor = ZygoteExecutor(lang)
+    try:
+        start = time.perf_counter()
+        executor.start()
+        executor.request('', [], timeout)
+        results['zygote-startup'] = time.perf_counter() - start
+        results['zygote'] = summary(measure(
+            lambda case: executor.grade(source, IoSpec([case]), timeout),
+            answer_key, repeat,
+        ))
+    finally:
+        executor.stop()
+
+    return results
@@ -0,0 +1,615 @@
+"""
+Content-addressed on-disk cache of compiled executables for C and C++.
+
+Each entry is keyed by the compiler, its version, the compiler flags and the
+hash of the source code and stores either the compiled executable or the
+compiler error message. Grading, regrading and the validation of answer keys
+thus compile each distinct source only once.
+
+Layout of the cache directory::
+
+    <CODESCHOOL_BUILD_CACHE_DIR>/<key[:2]>/<key>/main.exe
+    <CODESCHOOL_BUILD_CACHE_DIR>/<key[:2]>/<key>/error.txt
+
+Entries are written to a temporary directory and published with an atomic
+rename, so several worker processes can share the same cache without locks.
+The modification time of an entry is updated at each hit and the least
+recently used entries are removed when the cache exceeds
+CODESCHOOL_BUILD_CACHE_SIZE bytes. Since this requires scanning the whole
+cache, each process only looks for entries to evict after storing a number of
+new entries. Artifacts whose entries were evicted are compiled again when
+they are used.
+
+This module is also imported inside the sandbox, where the source code is
+compiled and the cached executables are run.
+"""
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+import time
+import traceback
+
+import psutil
+from annoying.functions import get_config
+from boxed.jsonbox import run as run_sandbox
+from ejudge import registry
+from ejudge.build_manager import CompiledLanguageBuildManager
+from ejudge.exceptions import BuildError
+from iospec import IoSpec, TestCase, ErrorTestCase
+from iospec.feedback import Feedback, feedback as compare_testcase
+
+from .batch import is_batch_testcase, run_batch, batch_feedback, \
+    DEFAULT_TIMEOUT
+from .resources import UsageMeter
+
+#: Compiler configuration for each supported language.
+COMPILERS = {
+    'c': {
+        'compiler': 'gcc',
+        'flags': ['-std=c99'],
+        'libs': ['-lm'],
+        'extension': '.c',
+    },
+    'cpp': {
+        'compiler': 'g++',
+        'flags': ['-std=c++11'],
+        'libs': ['-lm'],
+        'extension': '.cpp',
+    },
+}
+
+#: Maximum number of seconds spent compiling a single program.
+COMPILE_TIMEOUT = 10
+
+#: A process scans the cache for entries to evict after storing this many
+#: entries or this fraction of the maximum size of the cache.
+EVICT_ENTRIES = 100
+EVICT_FRACTION = 0.05
+
+EXECUTABLE_NAME = 'main.exe'
+ERROR_NAME = 'error.txt'
+
+_compiler_versions = {}
+_caches = {}
+
+
+def compiler_version(compiler):
+    """
+    Return the first line of the output of "<compiler> --version".
+
+    The result is part of the cache key, hence upgrading the compiler
+    invalidates all entries.
+    """
+
+    try:
+        return _compiler_versions[compiler]
+    except KeyError:
+        pass
+
+    try:
+        output = subprocess.check_output([compiler, '--version'],
+                                         stderr=subprocess.STDOUT)
+        version = output.decode('utf8', 'replace').splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        version = ''
+    _compiler_versions[compiler] = version
+    return version
+
+
+def build_key(source, lang):
+    """
+    Return the cache key for the given source code and language.
+    """
+
+    spec = COMPILERS[lang]
+    source_hash = hashlib.md5(source.encode('utf8')).hexdigest()
+    data = [
+        lang,
+        spec['compiler'],
+        compiler_version(spec['compiler']),
+        spec['flags'] + spec['libs'],
+        source_hash,
+    ]
+    return hashlib.md5(json.dumps(data).encode('utf8')).hexdigest()
+
+
+def compile_source(lang, source, path):
+    """
+    Compile source code into the given directory.
+
+    Creates either an executable named main.exe or an error.txt file with the
+    compiler messages. Return True if compilation succeeds.
+
+    This function runs inside the sandbox if sandboxing is enabled.
+    """
+
+    spec = COMPILERS[lang]
+    source_name = 'main' + spec['extension']
+    with open(os.path.join(path, source_name), 'w') as F:
+        F.write(source)
+
+    args = [spec['compiler']] + spec['flags'] + \
+           [source_name, '-o', EXECUTABLE_NAME] + spec['libs']
+    try:
+        subprocess.check_output(args, cwd=path, stderr=subprocess.STDOUT,
+                                timeout=COMPILE_TIMEOUT)
+    except subprocess.CalledProcessError as ex:
+        message = ex.output.decode('utf8', 'replace')
+    except subprocess.TimeoutExpired:
+        message = 'compilation is taking too long'
+    except OSError as ex:
+        message = 'could not run compiler: %s' % ex
+    else:
+        return True
+
+    with open(os.path.join(path, ERROR_NAME), 'w') as F:
+        F.write(message or 'BuildError: could not compile your program.')
+    return False
+
+
+class PrebuiltBuildManager(CompiledLanguageBuildManager):
+    """
+    An ejudge build manager that copies a cached executable to the build
+    directory instead of compiling the source code.
+    """
+
+    def __init__(self, executable, language, **kwargs):
+        super().__init__('', **kwargs)
+        self.executable = executable
+        self.language = language
+
+    def prepare_files(self):
+        path = os.path.join(self.build_path, self.executable_name)
+        shutil.copyfile(self.executable, path)
+        os.chmod(path, 0o755)
+
+
+def error_testcase(ex):
+    """
+    Return an ErrorTestCase describing an exception raised while running a
+    program.
+    """
+
+    message = ''.join(traceback.format_exception_only(type(ex), ex))
+    return ErrorTestCase.runtime(error_message=message.strip())
+
+
+def kill_executable(path):
+    """
+    Kill all child processes of the current process running the executable
+    at the given path.
+    """
+
+    path = os.path.realpath(path)
+    for child in psutil.Process().children(recursive=True):
+        try:
+            if child.exe() == path:
+                child.kill()
+        except psutil.Error:
+            pass
+
+
+def run_testcase(build_manager, inputs, timeout=None):
+    """
+    Run the executable of the given build manager interactively with a list
+    of inputs and return the resulting testcase.
+
+    ejudge does not stop programs that keep running (e.g., printing in an
+    infinite loop), so the program is killed after timeout seconds (defaults
+    to DEFAULT_TIMEOUT) and an ErrorTestCase with the "timeout" error is
+    returned.
+    """
+
+    timeout = timeout or DEFAULT_TIMEOUT
+    executable = os.path.join(build_manager.build_path,
+                              build_manager.executable_name)
+    ctrl = registry.execution_manager(build_manager.language, build_manager,
+                                      inputs)
+    watchdog = threading.Timer(timeout, kill_executable, args=[executable])
+    watchdog.start()
+    start = time.monotonic()
+    try:
+        case = ctrl.run()
+    except Exception as ex:
+        case = error_testcase(ex)
+    finally:
+        watchdog.cancel()
+    if time.monotonic() - start >= timeout:
+        return ErrorTestCase.timeout([])
+    return case
+
+
+def grade_executable(executable, lang, iospec, sandbox=True, fast=True,
+                     batch=True, timeout=None):
+    """
+    Grade a cached executable against the JSON form of an IoSpec answer key.
+
+    Return a dictionary with the JSON form of the resulting feedback in the
+    "feedback" key and the list of usage entries for the executed testcases
+    in the "usage" key. This works as ejudge's grade_from_manager(), but
+    measures the resources used by each testcase. If batch is True,
+    testcases with a fixed input and an exact output run in batch mode. Each
+    testcase is limited to timeout seconds.
+
+    This function runs inside the sandbox if sandboxing is enabled.
+    """
+
+    build_manager = PrebuiltBuildManager(executable, lang,
+                                         is_sandboxed=sandbox)
+    build_manager.build()
+    path = build_manager.build_path
+    args = [os.path.join(path, build_manager.executable_name)]
+    feedback = None
+    usage = []
+
+    for idx, key in enumerate(IoSpec.from_json(iospec)):
+        if batch and is_batch_testcase(key):
+            with UsageMeter() as meter:
+                case, divergence = run_batch(args, key, timeout, cwd=path)
+            current = batch_feedback(case, key, divergence)
+        else:
+            with UsageMeter() as meter:
+                case = run_testcase(build_manager, key.inputs(), timeout)
+            current = compare_testcase(case, key)
+        usage.append(meter.entry(idx, current))
+
+        # The first testcase with the lowest grade wins
+        if feedback is None or current.grade < feedback.grade:
+            feedback = current
+            if fast and feedback.grade == 0:
+                break
+
+    return {'feedback': feedback.to_json(), 'usage': usage}
+
+
+def run_executable(executable, lang, inputs, sandbox=True, timeout=None):
+    """
+    Run a cached executable with the given list of input lists and return
+    the JSON form of the resulting IoSpec.
+
+    This function runs inside the sandbox if sandboxing is enabled.
+    """
+
+    build_manager = PrebuiltBuildManager(executable, lang,
+                                         is_sandboxed=sandbox)
+    try:
+        build_manager.build()
+    except BuildError as ex:
+        return IoSpec([ErrorTestCase.build(error_message=str(ex))]).to_json()
+
+    result = IoSpec([run_testcase(build_manager, list(case), timeout)
+                     for case in inputs])
+    result.set_meta('lang', lang)
+    return result.to_json()
+
+
+class Artifact:
+    """
+    The result of compiling a source: either an executable or an error
+    message.
+
+    Artifacts created with the source code and the cache that stores them
+    are compiled again if their entry is evicted before they are used.
+    """
+
+    def __init__(self, key, lang, path, source=None, cache=None,
+                 sandbox=True):
+        self.key = key
+        self.lang = lang
+        self.path = path
+        self.executable = os.path.join(path, EXECUTABLE_NAME)
+        self.source = source
+        self.cache = cache
+        self.sandbox = sandbox
+
+    def __repr__(self):
+        if not os.path.isdir(self.path):
+            status = 'evicted'
+        elif os.path.exists(self.executable):
+            status = 'ok'
+        else:
+            status = 'error'
+        return '<Artifact %s: %s>' % (self.key, status)
+
+    def restore(self):
+        """
+        Compile the source again if the entry was removed from the cache.
+        """
+
+        if self.cache is not None and not os.path.isdir(self.path):
+            self.cache.compile(self.key, self.source, self.lang,
+                               self.sandbox)
+
+    @property
+    def is_error(self):
+        self.restore()
+        return not os.path.exists(self.executable)
+
+    @property
+    def error_message(self):
+        if not self.is_error:
+            return None
+        with open(os.path.join(self.path, ERROR_NAME)) as F:
+            return F.read()
+
+    def build_error(self):
+        """
+        Return an ErrorTestCase describing the compilation error.
+        """
+
+        return ErrorTestCase.build(error_message=self.error_message)
+
+    def grade(self, answer_key, sandbox=True, fast=True, usage=None,
+              batch=True, timeout=None):
+        """
+        Grade the artifact against the given IoSpec answer key. Works as
+        ejudge.grade().
+
+        Build errors are returned right away, without touching the sandbox.
+        The resources used by each testcase are appended to the optional usage
+        list. See :func:`grade_executable` for the batch and timeout
+        arguments.
+        """
+
+        if self.is_error:
+            return compare_testcase(self.build_error(), answer_key[0])
+
+        args = (self.executable, self.lang, answer_key.to_json())
+        kwargs = {'fast': fast, 'batch': batch, 'timeout': timeout}
+        if sandbox:
+            result = run_sandbox(grade_executable, args=args, kwargs=kwargs,
+                                 imports=[__name__])
+        else:
+            result = grade_executable(*args, sandbox=False, **kwargs)
+        if usage is not None:
+            usage.extend(result['usage'])
+        return Feedback.from_json(result['feedback'])
+
+    def run(self, inputs, sandbox=True):
+        """
+        Run artifact with the given inputs and return the resulting IoSpec.
+        Works as ejudge.run().
+        """
+
+        if isinstance(inputs, IoSpec):
+            inputs = inputs.inputs()
+        elif isinstance(inputs, TestCase):
+            inputs = [inputs.inputs()]
+        elif inputs and isinstance(inputs[0], str):
+            inputs = [list(inputs)]
+        else:
+            inputs = [list(x) for x in inputs]
+
+        if self.is_error:
+            return IoSpec([self.build_error()])
+
+        args = (self.executable, self.lang, inputs)
+        kwargs = {}
+        if sandbox:
+            result = run_sandbox(run_executable, args=args, kwargs=kwargs,
+                                 imports=[__name__])
+        else:
+            result = run_executable(*args, sandbox=False, **kwargs)
+        return IoSpec.from_json(result)
+
+
+class BuildCache:
+    """
+    Content-addressed cache of compiled executables stored at the given
+    directory and limited to max_size bytes.
+    """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+
+        # Other users can traverse the cache (e.g., the sandbox user needs to
+        # read the executables), but cannot list its contents. A directory
+        # created by another user could be used to replace the executables.
+        os.makedirs(path, mode=0o711, exist_ok=True)
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+            raise PermissionError(
+                'build cache %r is not a directory owned by the current user'
+                % path
+            )
+        os.chmod(path, 0o711)
+
+        # Entries and bytes stored since the last eviction. The first store
+        # always triggers an eviction.
+        self.stored_entries = EVICT_ENTRIES
+        self.stored_bytes = 0
+
+    def __repr__(self):
+        return '<BuildCache: %s>' % self.path
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key, lang):
+        """
+        Return the cached artifact for the given key or None if the key is
+        not present.
+        """
+
+        path = self.entry_path(key)
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            return None
+        return Artifact(key, lang, path)
+
+    def build(self, source, lang, sandbox=True):
+        """
+        Return an artifact for the given source code, compiling it if
+        necessary.
+        """
+
+        key = build_key(source, lang)
+        if self.get(key, lang) is None:
+            self.compile(key, source, lang, sandbox)
+        return Artifact(key, lang, self.entry_path(key), source=source,
+                        cache=self, sandbox=sandbox)
+
+    def compile(self, key, source, lang, sandbox=True):
+        """
+        Compile source code and store the result under the given key.
+        """
+
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.path)
+        try:
+            if sandbox:
+                # The sandbox user must be able to write the executable
+                os.chmod(staging, 0o777)
+                run_sandbox(compile_source, args=(lang, source, staging),
+                            imports=[__name__])
+            else:
+                compile_source(lang, source, staging)
+            self.store(key, staging)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def store(self, key, staging):
+        """
+        Copy the result of a compilation from the staging directory to the
+        cache.
+
+        The files are copied to a directory owned by the current user and
+        published by an atomic rename. If another process stored the same key
+        first, its entry is kept.
+
+        Old entries are evicted after EVICT_ENTRIES entries or EVICT_FRACTION
+        of the maximum size were stored since the last eviction.
+        """
+
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), mode=0o711, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix='.publish-', dir=self.path)
+        try:
+            for name in (EXECUTABLE_NAME, ERROR_NAME):
+                src = os.path.join(staging, name)
+                if os.path.exists(src):
+                    shutil.copyfile(src, os.path.join(tmp, name))
+                    os.chmod(os.path.join(tmp, name), 0o755)
+                    size = os.path.getsize(src)
+                    break
+            else:
+                raise RuntimeError('compilation did not produce any output')
+            os.chmod(tmp, 0o755)
+            os.rename(tmp, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.stored_entries += 1
+        self.stored_bytes += size
+        if (self.stored_entries >= EVICT_ENTRIES or
+                self.stored_bytes >= self.max_size * EVICT_FRACTION):
+            self.evict()
+
+    def entries(self):
+        """
+        Return a list of (mtime, size, path) tuples for all entries in the
+        cache.
+        """
+
+        result = []
+        for shard in os.listdir(self.path):
+            shard_path = os.path.join(self.path, shard)
+            if shard.startswith('.') or not os.path.isdir(shard_path):
+                continue
+            for key in os.listdir(shard_path):
+                path = os.path.join(shard_path, key)
+                try:
+                    mtime = os.stat(path).st_mtime
+                    size = sum(os.path.getsize(os.path.join(path, name))
+                               for name in os.listdir(path))
+                except OSError:
+                    continue
+                result.append((mtime, size, path))
+        return result
+
+    def size(self):
+        """
+        Total size of the cached files in bytes.
+        """
+
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_size=None):
+        """
+        Remove the least recently used entries until the cache has at most
+        max_size bytes.
+        """
+
+        max_size = self.max_size if max_size is None else max_size
+        self.stored_entries = self.stored_bytes = 0
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= max_size:
+                break
+            self.remove(path)
+            total -= size
+
+    def remove(self, path):
+        """
+        Remove entry at the given path.
+
+        The entry is first renamed, so other processes never see a partially
+        removed entry.
+        """
+
+        trash = tempfile.mkdtemp(prefix='.trash-', dir=self.path)
+        try:
+            os.rename(path, os.path.join(trash, 'entry'))
+        except OSError:
+            pass
+        shutil.rmtree(trash, ignore_errors=True)
+
+
+def get_build_cache():
+    """
+    Return the build cache configured in the settings or None if it is
+    disabled.
+
+    The cache is stored at CODESCHOOL_BUILD_CACHE_DIR (defaults to a
+    per-user directory inside the system temporary dir) and is limited to
+    CODESCHOOL_BUILD_CACHE_SIZE bytes. A size of zero disables the cache.
+    """
+
+    path = get_config('CODESCHOOL_BUILD_CACHE_DIR', None) or \
+        os.path.join(tempfile.gettempdir(),
+                     'codeschool-build-cache-%s' % os.getuid())
+    max_size = get_config('CODESCHOOL_BUILD_CACHE_SIZE', 256 * 1024 * 1024)
+    if not max_size:
+        return None
+
+    try:
+        return _caches[path, max_size]
+    except KeyError:
+        _caches[path, max_size] = cache = BuildCache(path, max_size)
+        return cache
+
+
+def build_artifact(source, lang, sandbox=True):
+    """
+    Return the compiled artifact for the given source code.
+
+    Return None if the language is not compiled or if the cache is disabled.
+    """
+
+    if lang not in COMPILERS:
+        return None
+    cache = get_build_cache()
+    if cache is None:
+        return None
+    return cache.build(source, lang, sandbox)
@@ -0,0 +1,160 @@
+"""
+Interactive grading with the execution managers of ejudge.
+
+This is the fallback for testcases that cannot run in batch mode in languages
+without a faster backend. It works as ejudge.grade(), but each testcase runs
+with a time limit and its resources are measured separately. (The pinned
+version of ejudge discards the result of runs with a time limit, so we cannot
+simply pass a timeout to ejudge.grade().)
+"""
+import signal
+import threading
+import time
+
+import psutil
+from boxed.jsonbox import run as run_sandbox
+from ejudge import registry
+from ejudge.exceptions import BuildError
+from ejudge.util import timeout as run_in_thread
+from iospec import IoSpec, ErrorTestCase
+from iospec.feedback import Feedback, feedback as compare_testcase
+
+from .batch import DEFAULT_TIMEOUT
+from .build_cache import error_testcase
+from .resources import UsageMeter
+
+
+class TimeLimitExceeded(BaseException):
+    """
+    Raised when a program exceeds its time limit.
+
+    This is not an Exception (and not the builtin TimeoutError, which is an
+    OSError) so it is not silenced by user code or by the except clauses of
+    the execution managers and of multiprocessing.
+    """
+
+
+def _raise_timeout(signum, frame):
+    raise TimeLimitExceeded('time limit exceeded')
+
+
+def call_with_timeout(func, timeout):
+    """
+    Call func() and raise TimeLimitExceeded if it does not return within the
+    given number of seconds.
+
+    In the main thread, func is interrupted by a SIGALRM signal. This stops
+    Python code executed inside the current interpreter, which is how ejudge
+    runs Python programs inside the sandbox. Other threads can only stop
+    waiting for the result.
+    """
+
+    if threading.current_thread() is not threading.main_thread():
+        try:
+            return run_in_thread(func, timeout=timeout)
+        except TimeoutError:
+            raise TimeLimitExceeded('time limit exceeded')
+
+    handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, handler)
+
+
+def run_testcase(build_manager, inputs, timeout=None):
+    """
+    Run the program of the given build manager with a list of inputs and
+    return the resulting testcase.
+
+    Runs that take more than timeout seconds (defaults to DEFAULT_TIMEOUT)
+    return an ErrorTestCase with the "timeout" error. Processes started by the
+    run are killed.
+    """
+
+    timeout = timeout or DEFAULT_TIMEOUT
+    ctrl = registry.execution_manager(build_manager.language, build_manager,
+                                      inputs)
+    children = {child.pid for child in psutil.Process().children()}
+    start = time.monotonic()
+    try:
+        case = call_with_timeout(ctrl.run, timeout)
+    except TimeLimitExceeded:
+        case = None
+    except Exception as ex:
+        case = error_testcase(ex)
+
+    # Processes that are still running must be killed.
+    if case is None or time.monotonic() - start >= timeout:
+        for child in psutil.Process().children(recursive=True):
+            if child.pid not in children:
+                try:
+                    child.kill()
+                except psutil.Error:
+                    pass
+        return ErrorTestCase.timeout([])
+    return case
+
+
+def grade_source(source, lang, iospec, sandbox=True, fast=True,
+                 timeout=None):
+    """
+    Grade source code against the JSON form of an IoSpec answer key.
+
+    Return a dictionary with the JSON form of the resulting feedback in the
+    "feedback" key and the list of usage entries for the executed testcases
+    in the "usage" key.
+
+    This function runs inside the sandbox if sandboxing is enabled.
+    """
+
+    answer_key = IoSpec.from_json(iospec)
+    build_manager = registry.build_manager(lang, source, is_sandboxed=sandbox)
+    try:
+        build_manager.build()
+    except BuildError as ex:
+        case = ErrorTestCase.build(error_message=str(ex))
+        feedback = compare_testcase(case, answer_key[0])
+        return {'feedback': feedback.to_json(), 'usage': []}
+
+    feedback = None
+    usage = []
+    for idx, key in enumerate(answer_key):
+        with UsageMeter() as meter:
+            case = run_testcase(build_manager, key.inputs(), timeout)
+        current = compare_testcase(case, key)
+        usage.append(meter.entry(idx, current))
+
+        # The first testcase with the lowest grade wins
+        if feedback is None or current.grade < feedback.grade:
+            feedback = current
+            if fast and feedback.grade == 0:
+                break
+
+    return {'feedback': feedback.to_json(), 'usage': usage}
+
+
+def grade_interactive(source, answer_key, lang, timeout=None, sandbox=True,
+                      fast=True, usage=None):
+    """
+    Grade source code against an IoSpec answer key running each testcase
+    interactively. Works as ejudge.grade().
+
+    Each testcase is limited to timeout seconds. The resources used by each
+    testcase are appended to the optional usage list.
+    """
+
+    args = (source, lang, answer_key.to_json())
+    kwargs = {'fast': fast, 'timeout': timeout}
+    if sandbox:
+        build_manager = registry.build_manager(lang, source)
+        imports = [__name__] + list(build_manager.get_modules())
+        result = run_sandbox(grade_source, args=args, kwargs=kwargs,
+                             imports=imports)
+    else:
+        result = grade_source(*args, sandbox=False, **kwargs)
+    if usage is not None:
+        usage.extend(result['usage'])
+    return Feedback.from_json(result['feedback'])
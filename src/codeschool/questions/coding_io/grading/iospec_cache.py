@@ -0,0 +1,171 @@
+"""
+Process-wide cache of parsed IoSpec trees.
+
+Every time an answer key is loaded from the database, its iospec_source must
+be parsed again. Grading workers load the same few answer keys over and over,
+so parsed trees are kept in a LRU cache keyed by the md5 hash of the source.
+
+IoSpec objects are mutable (e.g., AnswerKey expands inputs in place), hence
+the cached trees are never handed out directly. Callers always receive a
+private copy and are free to modify it.
+
+Expanded iospecs (the ones stored in answer keys) also have a compact form,
+which is the JSON structure produced by :meth:`IoSpec.to_json`. It is saved in
+the iospec_json field of the models and is used to rebuild the tree without
+calling the parser. This is several times faster than parsing the source.
+
+The saved compact form is a dictionary ``{'hash': <md5 of source>, 'data':
+<json>}``. A compact form built from a different source (e.g., a field that
+was not updated together with iospec_source) is ignored.
+"""
+import collections
+import copy
+import threading
+
+from annoying.functions import get_config
+from iospec import IoSpec, parse_string as parse_iospec
+
+from codeschool.lms.activities.models.submission import md5hash
+
+_cache = collections.OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+class _Entry:
+    """
+    A cached iospec. Stores the compact form if it exists, otherwise the
+    parsed tree.
+    """
+
+    __slots__ = ('tree', 'compact')
+
+    def __init__(self, tree=None, compact=None):
+        self.tree = tree
+        self.compact = compact
+
+    def copy(self):
+        if self.compact is not None:
+            return IoSpec.from_json(self.compact)
+        return copy.deepcopy(self.tree)
+
+
+def cache_size():
+    """
+    Maximum number of iospec trees kept in memory.
+    """
+
+    return get_config('CODESCHOOL_IOSPEC_CACHE_SIZE', 256)
+
+
+def compact_iospec(iospec):
+    """
+    Return the compact form of an IoSpec object or None if it cannot be
+    represented in compact form.
+
+    Only expanded iospecs (i.e., iospecs that contain only simple In/Out
+    testcases and no @import or @command definitions) have a compact form.
+    """
+
+    if iospec.definitions or not iospec.is_expanded:
+        return None
+    data = iospec.to_json()
+    try:
+        if IoSpec.from_json(data).source() != iospec.source():
+            return None
+    except (KeyError, ValueError):
+        return None
+    return data
+
+
+def _compact_data(compact, key):
+    # Return the JSON data of a saved compact form if it was built from the
+    # source with the given hash.
+    if isinstance(compact, dict) and compact.get('hash') == key:
+        return compact.get('data')
+    return None
+
+
+def _get_entry(source, compact=None):
+    key = md5hash(source)
+    compact = _compact_data(compact, key)
+
+    with _lock:
+        try:
+            entry = _cache[key]
+        except KeyError:
+            _stats['misses'] += 1
+        else:
+            _stats['hits'] += 1
+            _cache.move_to_end(key)
+            return entry
+
+    if compact is not None:
+        entry = _Entry(compact=compact)
+    else:
+        tree = parse_iospec(source)
+        entry = _Entry(tree, compact_iospec(tree))
+        if entry.compact is not None:
+            entry.tree = None
+
+    size = cache_size()
+    if size:
+        with _lock:
+            _cache[key] = entry
+            while len(_cache) > size:
+                _cache.popitem(last=False)
+    return entry
+
+
+def cached_iospec(source, compact=None):
+    """
+    Return a new IoSpec object from the given iospec source.
+
+    Args:
+        source:
+            The iospec source string.
+        compact:
+            The optional pre-computed compact form of the source, as returned
+            by :func:`cached_compact_form`. It is used instead of the parser
+            if the source is not in the cache and if it was computed from the
+            same source.
+
+    The result is a copy of the cached tree and can be freely modified.
+    """
+
+    return _get_entry(source, compact).copy()
+
+
+def cached_compact_form(source):
+    """
+    Return the compact form for the given iospec source, or None if the
+    iospec is not expanded.
+
+    The result stores the hash of the source together with the JSON data and
+    can be saved and later passed to :func:`cached_iospec`.
+    """
+
+    entry = _get_entry(source)
+    if entry.compact is None:
+        return None
+    return {'hash': md5hash(source), 'data': copy.deepcopy(entry.compact)}
+
+
+def clear_cache():
+    """
+    Remove all entries from the cache.
+    """
+
+    with _lock:
+        _cache.clear()
+        _stats.update(hits=0, misses=0)
+
+
+def cache_info():
+    """
+    Return a dictionary with the number of hits, misses and entries in the
+    cache.
+    """
+
+    with _lock:
+        return dict(_stats, size=len(_cache))
@@ -0,0 +1,195 @@
+"""
+Spreads the testcases of a single submission across a bounded process pool.
+"""
+import multiprocessing
+import time
+
+import psutil
+from annoying.functions import get_config
+from iospec import IoSpec, TestCase, ErrorTestCase
+from iospec.feedback import Feedback
+
+from .build_cache import build_artifact
+from .interactive import grade_interactive
+from .resources import usage_entry
+from .storage import testcase_index
+
+_pools = {}
+
+
+def pool_size(lang):
+    """
+    Return the number of worker processes used to grade the testcases of a
+    single submission in the given language.
+
+    The values are set per language in the CODESCHOOL_GRADING_POOL_SIZE
+    setting, e.g.: ``{'python': 4, 'c': 2}``. The '*' key defines the default
+    for the remaining languages. The default value is 1, which means that
+    testcases run sequentially.
+
+    Daemonic processes (e.g., the workers of a bulk regrade) cannot have
+    children, hence testcases always run sequentially inside them.
+    """
+
+    if multiprocessing.current_process().daemon:
+        return 1
+    sizes = get_config('CODESCHOOL_GRADING_POOL_SIZE', {}) or {}
+    return max(int(sizes.get(lang, sizes.get('*', 1))), 1)
+
+
+def get_pool(workers):
+    """
+    Return a process pool with the given number of workers.
+
+    Pools are created lazily and are shared by all calls in the current
+    process.
+    """
+
+    try:
+        return _pools[workers]
+    except KeyError:
+        _pools[workers] = pool = multiprocessing.Pool(workers)
+        return pool
+
+
+def discard_pool(workers):
+    """
+    Terminate the pool with the given number of workers.
+
+    This is necessary to kill the processes still running testcases after the
+    time budget for a submission is exhausted or when fail-fast grading stops
+    early.
+    """
+
+    pool = _pools.pop(workers, None)
+    if pool is None:
+        return
+
+    # Terminating the pool does not reach the programs started by workers
+    pids = {worker.pid for worker in pool._pool}
+    children = []
+    for child in psutil.Process().children():
+        if child.pid in pids:
+            children.extend(child.children(recursive=True))
+    pool.terminate()
+    for child in children:
+        try:
+            child.kill()
+        except psutil.Error:
+            pass
+
+
+def grade_testcase(source, testcase, lang, sandbox, timeout=None):
+    """
+    Grade a single testcase given in its JSON form.
+
+    This function runs inside the pool workers and returns a tuple with the
+    JSON form of the resulting feedback and its usage entry.
+    """
+
+    iospec = IoSpec([TestCase.from_json(testcase)])
+    artifact = build_artifact(source, lang, sandbox)
+    usage = []
+    if artifact is not None:
+        feedback = artifact.grade(iospec, sandbox=sandbox, usage=usage,
+                                  timeout=timeout)
+    else:
+        feedback = grade_interactive(source, iospec, lang, timeout=timeout,
+                                     sandbox=sandbox, usage=usage)
+    entry = usage[0] if usage else usage_entry(None, feedback, 0.0)
+    return feedback.to_json(), entry
+
+
+def timeout_feedback(answer_key):
+    """
+    Feedback for a testcase that could not finish within the time budget.
+    """
+
+    return Feedback(ErrorTestCase.timeout(), answer_key, grade=0,
+                    status='error-timeout')
+
+
+def worst_feedback(feedbacks):
+    """
+    Return the feedback with the lowest grade.
+
+    Ties are resolved by choosing the first feedback in the sequence. This is
+    the same rule ejudge uses when running testcases sequentially.
+    """
+
+    result = None
+    for feedback in feedbacks:
+        if result is None or feedback.grade < result.grade:
+            result = feedback
+    return result
+
+
+def grade_parallel(source, answer_key, lang=None, workers=None, timeout=1.0,
+                   sandbox=True, fast=True, usage=None):
+    """
+    Grade source code against each testcase of answer_key in parallel and
+    gather the results into a single Feedback object.
+
+    The overall wall-clock budget for the submission is
+    ``timeout * n / workers``, where n is the number of testcases. Testcases
+    that did not finish within the budget are considered timeout errors.
+
+    If fast is True, results are collected in order and grading stops at the
+    first testcase with a zero grade. Testcases already dispatched to the pool
+    that are still running are killed together with the pool.
+
+    The resources used by each testcase are appended to the optional usage
+    list.
+    """
+
+    cases = list(answer_key)
+    workers = min(workers or pool_size(lang), len(cases))
+    pool = get_pool(workers)
+    results = [
+        pool.apply_async(grade_testcase,
+                         (source, case.to_json(), lang, sandbox, timeout))
+        for case in cases
+    ]
+
+    # Collect results respecting the time budget
+    start = time.time()
+    deadline = start + (timeout or 1.0) * len(cases) / workers
+    feedbacks = []
+    expired = False
+    for idx, (case, result) in enumerate(zip(cases, results)):
+        result.wait(max(deadline - time.time(), 0))
+        if result.ready():
+            data, entry = result.get()
+            feedbacks.append(Feedback.from_json(data))
+        else:
+            expired = True
+            feedbacks.append(timeout_feedback(case))
+            entry = usage_entry(None, feedbacks[-1], time.time() - start)
+        if usage is not None:
+            entry['index'] = idx
+            usage.append(entry)
+        if fast and feedbacks[-1].grade == 0:
+            break
+
+    # Do not let pending testcases keep the shared pool busy
+    if expired or not all(result.ready() for result in results):
+        discard_pool(workers)
+    return worst_feedback(feedbacks)
+
+
+def skipped_testcases(feedback, answer_key):
+    """
+    Return the number of testcases of answer_key that were not executed by a
+    fail-fast grading that resulted in the given feedback.
+
+    Fail-fast grading stops at the first testcase with a zero grade, which is
+    also the testcase described by the feedback.
+    """
+
+    if feedback.grade != 0:
+        return 0
+
+    idx = testcase_index(answer_key, feedback.answer_key)
+    if idx is None:
+        return 0
+    return len(answer_key) - idx - 1
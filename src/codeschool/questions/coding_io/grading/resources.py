@@ -0,0 +1,233 @@
+"""
+Accounting of the resources used by each executed testcase.
+
+The grading backends accept an optional ``usage`` list and append one entry
+per executed testcase. Each entry is a dictionary with the keys:
+
+index:
+    Position of the testcase in the answer key. It is None if the entry
+    measures a whole run.
+status:
+    Feedback status for the testcase (e.g., 'ok', 'error-timeout').
+wall:
+    Wall clock time, in seconds.
+cpu:
+    User + system CPU time, in seconds. None if it cannot be measured.
+rss:
+    Peak resident set size in bytes. None if it cannot be measured.
+output:
+    Number of characters written by the program.
+"""
+import time
+
+from annoying.functions import get_config
+from iospec import Out
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+
+def percentile(data, q):
+    """
+    Return the q-th percentile (0 <= q <= 100) of a sorted list of values.
+    """
+
+    if not data:
+        return 0.0
+    idx = min(int(round(q / 100 * (len(data) - 1))), len(data) - 1)
+    return data[idx]
+
+
+def output_size(testcase):
+    """
+    Return the number of characters printed in the given testcase.
+    """
+
+    return sum(len(atom) for atom in testcase if isinstance(atom, Out))
+
+
+def usage_entry(index, feedback, wall, cpu=None, rss=None):
+    """
+    Return a usage entry for a testcase graded with the given feedback.
+    """
+
+    return {
+        'index': index,
+        'status': feedback.status,
+        'wall': wall,
+        'cpu': cpu,
+        'rss': rss,
+        'output': output_size(feedback.testcase),
+    }
+
+
+class UsageMeter:
+    """
+    Context manager that measures the resources used by the child processes
+    created and waited for inside the with block.
+
+    Peak RSS is only known if the block raised the maximum RSS of all
+    children of the current process. Otherwise it is None.
+    """
+
+    wall = cpu = rss = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._rusage = _children_rusage()
+        return self
+
+    def __exit__(self, *args):
+        self.wall = time.perf_counter() - self._start
+        before, after = self._rusage, _children_rusage()
+        if after is not None:
+            self.cpu = ((after.ru_utime + after.ru_stime) -
+                        (before.ru_utime + before.ru_stime))
+            if after.ru_maxrss > before.ru_maxrss:
+                self.rss = after.ru_maxrss * 1024
+
+    def entry(self, index, feedback):
+        """
+        Return a usage entry with the measured values.
+        """
+
+        return usage_entry(index, feedback, self.wall, self.cpu, self.rss)
+
+
+def _children_rusage():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def total_usage(entries):
+    """
+    Return the total resources used by a list of usage entries.
+
+    Times and output sizes are added and rss is the maximum value.
+    """
+
+    cpu = [x['cpu'] for x in entries if x.get('cpu') is not None]
+    rss = [x['rss'] for x in entries if x.get('rss') is not None]
+    return {
+        'testcases': len(entries),
+        'timeouts': sum(1 for x in entries if x['status'] == 'error-timeout'),
+        'wall': sum(x['wall'] for x in entries),
+        'cpu': sum(cpu) if cpu else None,
+        'rss': max(rss) if rss else None,
+        'output': sum(x['output'] for x in entries),
+    }
+
+
+def aggregate_usage(usage_list, slowest=10):
+    """
+    Aggregate the usage data of several submissions.
+
+    Args:
+        usage_list:
+            A sequence of usage dictionaries as stored in
+            ``feedback_data['usage']``: {'total': ..., 'testcases': [...]}.
+        slowest:
+            Number of entries in the list of slowest testcases.
+
+    Return a dictionary with the p50/p95 runtime of submissions, the timeout
+    rate for submissions and testcases and the slowest testcases (mean wall
+    time grouped by testcase index).
+    """
+
+    runtimes = []
+    timeouts = 0
+    testcases = 0
+    testcase_timeouts = 0
+    by_index = {}
+
+    for usage in usage_list:
+        if not usage or usage.get('cached'):
+            continue
+        total = usage['total']
+        runtimes.append(total['wall'])
+        testcases += total['testcases']
+        testcase_timeouts += total['timeouts']
+        timeouts += bool(total['timeouts'])
+        for entry in usage['testcases']:
+            if entry['index'] is not None:
+                by_index.setdefault(entry['index'], []).append(entry)
+
+    runtimes.sort()
+    slowest_cases = []
+    for index, entries in by_index.items():
+        slowest_cases.append({
+            'index': index,
+            'runs': len(entries),
+            'wall': sum(x['wall'] for x in entries) / len(entries),
+            'max_wall': max(x['wall'] for x in entries),
+            'timeouts': sum(1 for x in entries
+                            if x['status'] == 'error-timeout'),
+        })
+    slowest_cases.sort(key=lambda x: x['wall'], reverse=True)
+
+    return {
+        'submissions': len(runtimes),
+        'p50': percentile(runtimes, 50),
+        'p95': percentile(runtimes, 95),
+        'timeout_rate': timeouts / len(runtimes) if runtimes else 0.0,
+        'testcase_timeout_rate':
+            testcase_timeouts / testcases if testcases else 0.0,
+        'slowest': slowest_cases[:slowest],
+    }
+
+
+def reference_profile(runs, size):
+    """
+    Return the runtime profile of a reference program from the usage entries
+    of several grading runs against an answer key with the given number of
+    testcases.
+
+    The profile is a list with the median wall time of each testcase. Entries
+    that measure a whole run (index is None) are split evenly between all
+    testcases. Return None if the reference program failed in any testcase.
+    """
+
+    if not runs or not size:
+        return None
+
+    times = [[] for _ in range(size)]
+    for usage in runs:
+        for entry in usage:
+            if entry['status'] != 'ok':
+                return None
+            if entry['index'] is None:
+                for values in times:
+                    values.append(entry['wall'] / size)
+            else:
+                times[entry['index']].append(entry['wall'])
+
+    if not all(times):
+        return None
+    return [percentile(sorted(values), 50) for values in times]
+
+
+def calibrated_timeout(profile, maximum, factor=None, minimum=None):
+    """
+    Return the timeout for grading a testcase from the runtime profile of the
+    reference program.
+
+    The timeout is ``factor`` times the runtime of the slowest testcase, but
+    never less than ``minimum`` and never more than ``maximum``. The default
+    factor and minimum are given by the CODESCHOOL_TIMEOUT_FACTOR and
+    CODESCHOOL_TIMEOUT_MIN settings. Return maximum if there is no profile.
+    """
+
+    if not profile:
+        return maximum
+    if factor is None:
+        factor = get_config('CODESCHOOL_TIMEOUT_FACTOR', 5.0)
+    if minimum is None:
+        minimum = get_config('CODESCHOOL_TIMEOUT_MIN', 0.1)
+
+    timeout = max(factor * max(profile), minimum)
+    if maximum:
+        timeout = min(timeout, maximum)
+    return timeout
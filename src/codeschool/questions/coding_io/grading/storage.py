@@ -0,0 +1,79 @@
+"""
+Compact storage of the feedback of coding submissions.
+
+The Feedback of a submission holds two testcases: the one produced by the
+student's program and the corresponding testcase of the answer key. Only the
+first one is specific to the submission. The compact form stores the index of
+the testcase in the answer key together with the hash of the answer key source
+and keeps the student's testcase only when it differs from the expected one.
+The full Feedback is rebuilt from the answer key on demand.
+"""
+from iospec import TestCase
+from iospec.feedback import Feedback
+
+
+def testcase_index(answer_key, testcase):
+    """
+    Return the index of the testcase of answer_key that has the same inputs as
+    the given testcase or None if no testcase is found.
+    """
+
+    inputs = testcase.inputs()
+    for idx, case in enumerate(answer_key):
+        if case.inputs() == inputs:
+            return idx
+    return None
+
+
+def compact_feedback(feedback_json, answer_key, iospec_hash):
+    """
+    Convert the JSON form of a Feedback object to its compact form.
+
+    Args:
+        feedback_json:
+            A dictionary created by Feedback.to_json().
+        answer_key:
+            The IoSpec object used to grade the submission.
+        iospec_hash:
+            The hash that identifies the source of answer_key.
+
+    Return None if the answer key testcase of the feedback is not found in
+    answer_key.
+    """
+
+    # Testcases are compared by their normalized JSON form, since data loaded
+    # from the database has lists in place of tuples.
+    expected = TestCase.from_json(feedback_json['answer_key'])
+    index = testcase_index(answer_key, expected)
+    if index is None or answer_key[index].to_json() != expected.to_json():
+        return None
+
+    data = {'iospec_hash': iospec_hash, 'index': index}
+    testcase = TestCase.from_json(feedback_json['testcase'])
+    if testcase.to_json() != expected.to_json():
+        data['testcase'] = feedback_json['testcase']
+    for key, value in feedback_json.items():
+        if key not in ('testcase', 'answer_key', 'grade') and value is not None:
+            data[key] = value
+    return data
+
+
+def expand_feedback(data, answer_key, grade):
+    """
+    Rebuild a Feedback object from its compact form.
+
+    Args:
+        data:
+            A dictionary created by :func:`compact_feedback`.
+        answer_key:
+            The IoSpec object identified by data['iospec_hash'].
+        grade:
+            The feedback grade (a number between 0 and 1).
+    """
+
+    kwargs = dict(data)
+    del kwargs['iospec_hash']
+    expected = answer_key[kwargs.pop('index')]
+    testcase = kwargs.pop('testcase', None)
+    testcase = expected if testcase is None else TestCase.from_json(testcase)
+    return Feedback(testcase, expected, grade, **kwargs)
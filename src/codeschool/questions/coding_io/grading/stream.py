@@ -0,0 +1,157 @@
+"""
+Incremental comparison of the output of a program with the expected output.
+
+The comparator receives the output as it is produced and tells when it can
+no longer be graded as correct. The program can then be killed right away
+instead of running until it finishes or times out.
+
+This module is used both by the grading backends and by the zygote fork
+server. It must be compatible with Python 2.7 and Python 3 and must not
+import anything from codeschool.
+"""
+try:
+    from unidecode import unidecode
+except ImportError:  # pragma: no cover
+    unidecode = None
+
+#: Maximum number of characters a program can print in a single testcase.
+MAX_OUTPUT_SIZE = 1024 * 1024
+
+
+def is_ascii(text):
+    """
+    Return True if text only has ASCII characters.
+    """
+
+    try:
+        text.encode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+
+def normalize(text):
+    """
+    Normalize text as iospec does when looking for presentation errors: case
+    is folded and non-ASCII characters are transliterated.
+
+    Leading and trailing whitespace is handled by the comparator.
+    """
+
+    text = text.casefold() if hasattr(text, 'casefold') else text.lower()
+    if unidecode is not None and not is_ascii(text):
+        text = unidecode(text)
+    return text
+
+
+class OutputComparator(object):
+    """
+    Compares the output of a program with the expected output as it
+    arrives.
+
+    Output is compared after the same normalization used to detect
+    presentation errors, so the comparator only rejects outputs that would
+    be graded as wrong answers. Outputs larger than max_size are always
+    rejected.
+
+    Args:
+        expected:
+            The expected output. If it is None, only the output size is
+            checked.
+        max_size:
+            Maximum number of characters of the output.
+    """
+
+    def __init__(self, expected, max_size=MAX_OUTPUT_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.position = None
+        self.reason = None
+
+        # The normalized output is never stored: while it is a prefix of the
+        # expected output, it is equal to expected[:length]. After that, only
+        # trailing whitespace is accepted.
+        self.enabled = expected is not None and \
+            (unidecode is not None or is_ascii(expected))
+        self.expected = normalize(expected or '').strip()
+        self.length = 0
+        self.trailing = False
+
+    @property
+    def diverged(self):
+        """
+        True if the output cannot be accepted anymore.
+        """
+
+        return self.position is not None
+
+    def divergence(self):
+        """
+        Return a dictionary with the "position" of the first divergent
+        character and the "reason" of the divergence or None if the output
+        was not rejected.
+        """
+
+        if self.position is None:
+            return None
+        return {'position': self.position, 'reason': self.reason}
+
+    def feed(self, text):
+        """
+        Register a new piece of output.
+
+        Return False if the output diverged from the expected output. The
+        position of the first divergent character in the output is stored in
+        the position attribute and the reason ('mismatch' or 'limit') in the
+        reason attribute.
+        """
+
+        if self.position is not None:
+            return False
+
+        start = self.size
+        self.size += len(text)
+        if self.size > self.max_size:
+            self.position = self.max_size
+            self.reason = 'limit'
+            return False
+
+        # We cannot normalize non-ASCII text without unidecode
+        if self.enabled and unidecode is None and not is_ascii(text):
+            self.enabled = False
+        if not self.enabled:
+            return True
+
+        state = (self.length, self.trailing)
+        if self._feed_normalized(normalize(text)):
+            return True
+
+        # Locate the first character that made the output diverge
+        self.length, self.trailing = state
+        for idx, char in enumerate(text):
+            if not self._feed_normalized(normalize(char)):
+                self.position = start + idx
+                self.reason = 'mismatch'
+                return False
+        raise RuntimeError('could not locate divergent character')
+
+    def _feed_normalized(self, text):
+        expected = self.expected
+        if self.trailing:
+            return not text.strip()
+        if not self.length:
+            text = text.lstrip()
+
+        if expected.startswith(text, self.length):
+            self.length += len(text)
+            return True
+
+        # The output is accepted if it only has whitespace after the end of
+        # the expected output
+        text = text.rstrip()
+        if self.length + len(text) == len(expected) and \
+                expected.startswith(text, self.length):
+            self.length = len(expected)
+            self.trailing = True
+            return True
+        return False
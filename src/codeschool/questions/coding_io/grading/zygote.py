@@ -0,0 +1,271 @@
+"""
+Pre-forked ("zygote") executor for Python and Pytuga submissions.
+
+Instead of starting a new interpreter (or a new sandbox) for each testcase,
+the executor keeps a long-lived fork server per language. The server has the
+interpreter and the commonly used modules already loaded and forks a copy of
+itself to run each testcase. See zygote_server.py for the protocol.
+
+This executor does not use ejudge's "boxed" sandbox. Children are isolated
+by resource limits (CPU time, memory, no forking) and drop privileges to the
+"nobody" user when the server runs as root. It is enabled by setting
+``CODESCHOOL_EXECUTOR = 'zygote'`` and, since it does not provide the
+isolation of the sandbox, it also requires ``CODESCHOOL_USE_SANDBOX = False``.
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from annoying.functions import get_config
+from django.core.exceptions import ImproperlyConfigured
+from ejudge.util import remove_trailing_newline_from_testcase
+from iospec import IoSpec, TestCase, In, Out, SimpleTestCase, ErrorTestCase
+from iospec.feedback import feedback as compare_testcase
+
+from .batch import is_batch_testcase, batch_input, batch_testcase, \
+    batch_feedback, expected_output, normalize_output
+from .parallel import worst_feedback
+from .resources import usage_entry
+
+SERVER_PATH = os.path.join(os.path.dirname(__file__), 'zygote_server.py')
+
+#: Timeout used when running code without an explicit time limit (e.g.,
+#: when expanding answer keys).
+DEFAULT_TIMEOUT = 10.0
+
+_executors = {}
+
+
+class ZygoteError(Exception):
+    """
+    Raised when the fork server dies or sends an invalid response.
+    """
+
+
+class ZygoteExecutor:
+    """
+    Runs code of a single language in a pre-forked fork server.
+
+    Executors are thread-safe: requests are serialized through a lock.
+    """
+
+    #: Supported languages and their interpreters. None means the same
+    #: interpreter that runs codeschool.
+    INTERPRETERS = {
+        'python': None,
+        'pytuga': None,
+        'python2': 'python2',
+    }
+
+    def __init__(self, lang, interpreter=None, memory=None):
+        if lang not in self.INTERPRETERS:
+            raise ValueError('zygote executor does not support %r' % lang)
+        self.lang = lang
+        self.interpreter = (interpreter or self.INTERPRETERS[lang] or
+                            sys.executable)
+        self.memory = memory or get_config('CODESCHOOL_ZYGOTE_MEMORY', None)
+        self.process = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<ZygoteExecutor: %s (%s)>' % (self.lang, self.interpreter)
+
+    @property
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """
+        Start the fork server, if it is not running yet.
+        """
+
+        if not self.is_alive:
+            self.process = subprocess.Popen(
+                [self.interpreter, SERVER_PATH, self.lang],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+
+    def stop(self):
+        """
+        Stop the fork server.
+        """
+
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def request(self, source, inputs, timeout=None, stdin=None,
+                expected=None):
+        """
+        Execute source with the given inputs in the fork server and return the
+        raw JSON response.
+
+        If stdin is given, the program runs in batch mode: it reads the stdin
+        string and the response contains its "stdout". The program is stopped
+        as soon as its output diverges from the optional expected string.
+        """
+
+        message = json.dumps({
+            'source': source,
+            'inputs': list(inputs),
+            'stdin': stdin,
+            'expected': expected,
+            'timeout': timeout or DEFAULT_TIMEOUT,
+            'memory': self.memory,
+        })
+        with self._lock:
+            self.start()
+            try:
+                self.process.stdin.write(message.encode('utf8') + b'\n')
+                self.process.stdin.flush()
+                line = self.process.stdout.readline()
+            except (IOError, OSError) as ex:
+                self.stop()
+                raise ZygoteError(str(ex))
+            if not line:
+                self.stop()
+                raise ZygoteError('fork server terminated unexpectedly')
+        return json.loads(line.decode('utf8'))
+
+    def run_testcase(self, source, inputs, timeout=None, usage=None):
+        """
+        Run source code with the given list of inputs and return the resulting
+        test case.
+
+        If a usage list is given, the resources used by the program are
+        appended to it as a dictionary with the "wall", "cpu" and "rss" keys.
+        """
+
+        response = self.request(source, inputs, timeout)
+        if usage is not None:
+            usage.append(response.get('usage', {}))
+        atoms = [In(x) if tt == 'In' else Out(x) for tt, x in response['data']]
+        if response['type'] == 'simple':
+            case = SimpleTestCase(atoms)
+        else:
+            case = self._error_testcase(response, atoms)
+        return remove_trailing_newline_from_testcase(case)
+
+    def run_batch_testcase(self, source, answer_key, timeout=None,
+                           usage=None):
+        """
+        Run source code in batch mode with the inputs of the given answer key
+        testcase and return a tuple with the resulting testcase and the
+        divergence of its output, as batch.run_batch() does.
+
+        See :mod:`codeschool.questions.coding_io.grading.batch`.
+        """
+
+        response = self.request(source, [], timeout,
+                                stdin=batch_input(answer_key),
+                                expected=expected_output(answer_key))
+        if usage is not None:
+            usage.append(response.get('usage', {}))
+        divergence = response.get('divergence')
+        if divergence is not None:
+            case = batch_testcase(answer_key, response['stdout'])
+            return case, divergence
+        output = normalize_output(response.get('stdout', ''))
+        case = batch_testcase(answer_key, output)
+        if response['type'] == 'simple':
+            return case, None
+        return self._error_testcase(response, list(case)), None
+
+    def _error_testcase(self, response, atoms):
+        if response['error_type'] == 'timeout':
+            return ErrorTestCase.timeout(atoms)
+        elif response['error_type'] == 'build':
+            return ErrorTestCase.build(error_message=response['error_message'])
+        else:
+            return ErrorTestCase(atoms,
+                                 error_type=response['error_type'],
+                                 error_message=response['error_message'])
+
+    def run(self, source, inputs, timeout=None):
+        """
+        Run source code for each list of inputs and return an IoSpec.
+
+        Works as ejudge.run().
+        """
+
+        if isinstance(inputs, IoSpec):
+            inputs = inputs.inputs()
+        elif isinstance(inputs, TestCase):
+            inputs = [inputs.inputs()]
+        elif inputs and isinstance(inputs[0], str):
+            inputs = [inputs]
+        return IoSpec([self.run_testcase(source, x, timeout) for x in inputs])
+
+    def grade(self, source, answer_key, timeout=None, fast=True, usage=None,
+              batch=True):
+        """
+        Grade source code against the given IoSpec answer key and return the
+        feedback for the worst testcase.
+
+        Works as ejudge.grade(). The resources used by each testcase are
+        appended to the optional usage list. If batch is True, testcases with
+        a fixed input and an exact output run in batch mode.
+        """
+
+        feedbacks = []
+        for idx, key in enumerate(answer_key):
+            measures = []
+            if batch and is_batch_testcase(key):
+                case, divergence = self.run_batch_testcase(
+                    source, key, timeout, measures)
+                feedback = batch_feedback(case, key, divergence)
+            else:
+                case = self.run_testcase(source, key.inputs(), timeout,
+                                         measures)
+                feedback = compare_testcase(case, key)
+            feedbacks.append(feedback)
+            if usage is not None:
+                usage.append(usage_entry(idx, feedback, **measures[0]))
+            if fast and feedback.grade == 0:
+                break
+        return worst_feedback(feedbacks)
+
+
+def executor_name():
+    """
+    Name of the configured executor.
+
+    Set with the CODESCHOOL_EXECUTOR setting. Valid values are 'ejudge' (the
+    default) and 'zygote'.
+    """
+
+    return get_config('CODESCHOOL_EXECUTOR', 'ejudge')
+
+
+def get_executor(lang):
+    """
+    Return the zygote executor for the given language.
+
+    Return None if the zygote executor is disabled or if it does not support
+    the language. Executors are shared by all calls in the current process.
+
+    The fork server does not run inside the sandbox, hence the zygote
+    executor cannot be used while CODESCHOOL_USE_SANDBOX is enabled.
+    """
+
+    if executor_name() != 'zygote' or lang not in ZygoteExecutor.INTERPRETERS:
+        return None
+    if get_config('CODESCHOOL_USE_SANDBOX', True):
+        raise ImproperlyConfigured(
+            'the zygote executor does not run code inside the sandbox: set '
+            'CODESCHOOL_USE_SANDBOX = False to enable it.'
+        )
+
+    # Forked processes must start their own servers
+    key = (os.getpid(), lang)
+    try:
+        return _executors[key]
+    except KeyError:
+        _executors[key] = executor = ZygoteExecutor(lang)
+        return executor
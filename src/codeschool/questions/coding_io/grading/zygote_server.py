@@ -0,0 +1,427 @@
+"""
+Fork server used by the zygote executor.
+
+This script runs as a long-lived child process of the Django worker. It
+imports the interpreter startup machinery and the commonly used modules only
+once and then forks a fresh copy of itself for each testcase, so the cost of
+starting an interpreter is not paid for every execution.
+
+The script is executed by the interpreter that runs the student's code and
+must therefore be compatible with both Python 2.7 and Python 3. It must not
+import anything from codeschool besides the standalone stream.py module,
+which lives in the same directory.
+
+Protocol: the parent writes one JSON request per line to stdin::
+
+    {"source": "...", "inputs": ["1", "2"], "timeout": 1.0}
+
+Requests with a "stdin" string instead of a list of inputs run in batch mode
+(see batch.py): the program reads the whole string from its stdin and the
+response has the captured "stdout" instead of the list of In/Out atoms. The
+optional "expected" string is compared with the output as it is produced and
+the program is stopped at the first divergent character. The response then
+has a "divergence" key (see stream.py).
+
+The parent reads one JSON response per line from stdout::
+
+    {"type": "simple", "data": [["In", "1"], ["Out", "..."]]}
+    {"type": "error", "error_type": "runtime", "error_message": "...",
+     "data": [...]}
+
+Responses also have a "usage" key with the resources used by the child.
+
+Usage::
+
+    $ python zygote_server.py <lang>
+"""
+import json
+import os
+import select
+import signal
+import sys
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+from stream import OutputComparator, MAX_OUTPUT_SIZE
+
+PY2 = sys.version_info[0] == 2
+
+#: Modules imported by the zygote before forking. Children inherit them
+#: already initialized. This also matters because children may lose access
+#: to the interpreter's library directory after dropping privileges.
+PRELOAD_MODULES = [
+    'bisect', 'collections', 'copy', 'datetime', 'decimal', 'fractions',
+    'functools', 'heapq', 'itertools', 'math', 'operator', 'random', 're',
+    'string', 'textwrap',
+
+    # Modules that might be needed after dropping privileges
+    'encodings.ascii', 'encodings.utf_8', 'json',
+]
+
+
+class OutputLimitError(Exception):
+    """
+    Raised when the program writes more than MAX_OUTPUT_SIZE characters.
+    """
+
+
+class OutputDivergedError(BaseException):
+    """
+    Raised when the output of a batch program diverges from the expected
+    output.
+
+    It is not a subclass of Exception, so it is not caught by the usual
+    "except Exception" clauses in the student's code.
+    """
+
+
+class Interaction(object):
+    """
+    Replaces sys.stdin/sys.stdout and the input() builtin in order to record
+    the sequence of inputs and outputs of a program.
+
+    This mimics ejudge's IntegratedExecutionManager.
+    """
+
+    def __init__(self, inputs, max_output=MAX_OUTPUT_SIZE):
+        self.data = []
+        self.inputs = list(reversed(inputs))
+        self.output_size = 0
+        self.max_output = max_output
+        self.softspace = 0
+
+    def write(self, text):
+        if isinstance(text, bytes):
+            text = text.decode('utf8', 'replace')
+        if not text:
+            return
+        self.output_size += len(text)
+        if self.output_size > self.max_output:
+            raise OutputLimitError('output limit exceeded')
+        if self.data and self.data[-1][0] == 'Out':
+            self.data[-1][1] += text
+        else:
+            self.data.append(['Out', text])
+
+    def flush(self):
+        pass
+
+    def input(self, prompt=None):
+        if prompt is not None:
+            self.write(str(prompt))
+        if not self.inputs:
+            raise EOFError('not enough inputs')
+        value = self.inputs.pop()
+        self.data.append(['In', value])
+        return value
+
+    def readline(self):
+        if not self.inputs:
+            return ''
+        return self.input() + '\n'
+
+    def read(self):
+        lines = []
+        while self.inputs:
+            lines.append(self.readline())
+        return ''.join(lines)
+
+    def __iter__(self):
+        while self.inputs:
+            yield self.readline()
+
+
+class Batch(Interaction):
+    """
+    Replaces sys.stdin/sys.stdout with a fixed input string and a buffer that
+    captures all output. The input() builtin is not replaced, so prompts are
+    printed to stdout as in a regular execution.
+
+    Output is checked against the expected output as it is written.
+    """
+
+    def __init__(self, stdin, expected=None, max_output=MAX_OUTPUT_SIZE):
+        super(Batch, self).__init__([], max_output)
+        self.stdin = stdin
+        self.pos = 0
+        self.comparator = OutputComparator(expected, max_output)
+
+    def write(self, text):
+        if isinstance(text, bytes):
+            text = text.decode('utf8', 'replace')
+        if not text:
+            return
+        if self.comparator.diverged:
+            raise OutputDivergedError('output diverged')
+        start = self.comparator.size
+        if not self.comparator.feed(text):
+            end = self.comparator.position - start
+            if self.comparator.reason == 'mismatch':
+                end += 1
+            self.data.append(['Out', text[:end]])
+            raise OutputDivergedError('output diverged')
+        self.data.append(['Out', text])
+
+    @property
+    def stdout(self):
+        return ''.join(text for _, text in self.data)
+
+    def readline(self):
+        end = self.stdin.find('\n', self.pos)
+        end = len(self.stdin) if end == -1 else end + 1
+        line = self.stdin[self.pos:end]
+        self.pos = end
+        return line
+
+    def read(self, size=-1):
+        end = len(self.stdin) if size < 0 else self.pos + size
+        data = self.stdin[self.pos:end]
+        self.pos += len(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            yield line
+
+
+def preload(lang):
+    """
+    Import modules that should be shared by all forked children.
+    """
+
+    for module in PRELOAD_MODULES:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    if lang == 'pytuga':
+        __import__('pytuga')
+
+
+def execute(lang, source):
+    """
+    Execute source code in the current process.
+
+    The code runs as the __main__ module, as it would in a new interpreter.
+    """
+
+    namespace = {'__name__': '__main__', '__builtins__': builtins}
+    if lang == 'pytuga':
+        import pytuga
+        # "exec" is a keyword in Python 2
+        getattr(pytuga, 'exec')(source, namespace, forbidden=True)
+    else:
+        code = compile(source, 'main.py', 'exec')
+        exec(code, namespace)
+
+
+def format_error(ex, source):
+    """
+    Format the traceback of an exception raised by the student's code.
+
+    Frames from this module are omitted. The result is similar to the one
+    produced by ejudge.util.format_traceback().
+    """
+
+    lines = source.splitlines()
+    entries = []
+    for filename, lineno, func, text in traceback.extract_tb(sys.exc_info()[2]):
+        if filename == __file__ or filename.endswith('zygote_server.py'):
+            continue
+        if filename in ('main.py', '<string>') and 0 < lineno <= len(lines):
+            text = lines[lineno - 1].strip()
+        entries.append((filename, lineno, func, text))
+
+    messages = []
+    if entries:
+        messages.append('Traceback (most recent call last)')
+        messages.extend(x.rstrip('\n') for x in traceback.format_list(entries))
+    messages.append('%s: %s' % (type(ex).__name__, ex))
+    return '\n'.join(messages)
+
+
+def apply_limits(timeout, memory):
+    """
+    Drop privileges if we are running as root and apply resource limits to
+    the current process.
+    """
+
+    if os.getuid() == 0:
+        try:
+            import pwd
+            nobody = pwd.getpwnam('nobody')
+            os.setgroups([])
+            os.setgid(nobody.pw_gid)
+            os.setuid(nobody.pw_uid)
+        except (ImportError, KeyError, OSError):
+            pass
+
+    if resource is not None:
+        cpu = int(timeout) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+        if memory:
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+        # Forbid forking: the limit counts all processes of the user
+        if os.getuid() != 0:
+            resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+def run_child(lang, request, fd):
+    """
+    Body of the forked process: run the program and write the JSON result to
+    the given file descriptor.
+    """
+
+    # Programs cannot touch the protocol streams
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for std_fd in (0, 1, 2):
+        os.dup2(devnull, std_fd)
+    apply_limits(request.get('timeout') or 1.0, request.get('memory'))
+
+    source = request['source']
+    is_batch = request.get('stdin') is not None
+    if is_batch:
+        interaction = Batch(request['stdin'], request.get('expected'))
+    else:
+        interaction = Interaction(request.get('inputs', []))
+        if PY2:
+            builtins.raw_input = interaction.input
+            builtins.input = \
+                lambda prompt=None: eval(interaction.input(prompt))
+        else:
+            builtins.input = interaction.input
+    sys.stdout = interaction
+    sys.stdin = interaction
+
+    result = {'type': 'simple'}
+    try:
+        execute(lang, source)
+    except SystemExit:
+        pass
+    except BaseException as ex:
+        sys.stdout = sys.__stdout__
+        error_type = 'build' if isinstance(ex, SyntaxError) else 'runtime'
+        result = {
+            'type': 'error',
+            'error_type': error_type,
+            'error_message': format_error(ex, source),
+        }
+    sys.stdout = sys.__stdout__
+    if is_batch:
+        divergence = interaction.comparator.divergence()
+        if divergence is not None:
+            result = {'type': 'simple', 'divergence': divergence}
+        result['stdout'] = interaction.stdout
+    else:
+        result['data'] = interaction.data
+
+    data = json.dumps(result)
+    if not isinstance(data, bytes):
+        data = data.encode('utf8')
+    while data:
+        data = data[os.write(fd, data):]
+    os._exit(0)
+
+
+def run_request(lang, request):
+    """
+    Fork a child to run a single request and wait for its result respecting
+    the timeout.
+
+    The response includes the wall time, CPU time and peak RSS (in bytes) of
+    the child in the "usage" key.
+    """
+
+    timeout = request.get('timeout') or 1.0
+    start = time.time()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            run_child(lang, request, write_fd)
+        finally:
+            os._exit(1)
+    os.close(write_fd)
+
+    chunks = []
+    deadline = start + timeout
+    timed_out = False
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if ready:
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    if timed_out:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    _, status, rusage = os.wait4(pid, 0)
+    os.close(read_fd)
+    usage = {
+        'wall': time.time() - start,
+        'cpu': rusage.ru_utime + rusage.ru_stime,
+        'rss': rusage.ru_maxrss * 1024,
+    }
+
+    if timed_out:
+        result = {'type': 'error', 'error_type': 'timeout', 'data': []}
+    else:
+        try:
+            result = json.loads(b''.join(chunks).decode('utf8'))
+        except ValueError:
+            if os.WIFSIGNALED(status) and \
+                    os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL):
+                result = {'type': 'error', 'error_type': 'timeout', 'data': []}
+            else:
+                result = {
+                    'type': 'error',
+                    'error_type': 'runtime',
+                    'error_message': 'program terminated abnormally '
+                                     '(status %s)' % status,
+                    'data': [],
+                }
+    result['usage'] = usage
+    return result
+
+
+def main(lang):
+    preload(lang)
+
+    # Nothing besides the protocol messages can be written to stdout
+    channel = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        response = run_request(lang, json.loads(line))
+        channel.write(json.dumps(response).encode('utf8') + b'\n')
+        channel.flush()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'python')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from codeschool.questions.coding_io.grading import benchmark
+
+
+class Command(BaseCommand):
+    help = 'compares the per-testcase latency of ejudge and zygote executors.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lang', '-l', default='python',
+                            choices=sorted(benchmark.PROGRAMS))
+        parser.add_argument('--testcases', '-n', type=int, default=20)
+        parser.add_argument('--repeat', '-r', type=int, default=1)
+        parser.add_argument('--no-sandbox', action='store_true')
+
+    def handle(self, *args, lang='python', testcases=20, repeat=1,
+               no_sandbox=False, **options):
+        results = benchmark.bench_executors(
+            lang=lang,
+            testcases=testcases,
+            repeat=repeat,
+            sandbox=not no_sandbox,
+        )
+
+        print('Per-testcase latency for %s (ms):' % lang)
+        for name in ['ejudge', 'zygote']:
+            stats = results[name]
+            print('  %-8s mean: %7.2f  p50: %7.2f  p95: %7.2f  max: %7.2f' % (
+                name, stats['mean'] * 1000, stats['p50'] * 1000,
+                stats['p95'] * 1000, stats['max'] * 1000))
+        print('Zygote startup: %.2f ms' % (results['zygote-startup'] * 1000))
+        speedup = results['ejudge']['mean'] / results['zygote']['mean']
+        print('Speedup: %.1fx' % speedup)
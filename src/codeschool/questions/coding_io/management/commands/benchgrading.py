@@ -0,0 +1,68 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from codeschool import benchmarks
+from codeschool.benchmarks.corpus import KINDS
+from codeschool.benchmarks.runner import LANGUAGES
+from codeschool.benchmarks.seed import fixture_names
+
+
+class Command(BaseCommand):
+    help = 'measures the throughput of the full grading path with a ' \
+           'synthetic corpus of submissions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lang', '-l', action='append',
+                            choices=LANGUAGES, dest='languages')
+        parser.add_argument('--fixture', '-f', action='append',
+                            choices=fixture_names(), dest='fixtures')
+        parser.add_argument('--size', '-n', type=int, default=20,
+                            help='submissions per question and language')
+        parser.add_argument('--users', '-u', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        for kind in KINDS:
+            parser.add_argument('--%s' % kind, type=float, default=None,
+                                help='proportion of %s submissions' % kind)
+        parser.add_argument('--output', '-o',
+                            help='path of the JSON results file')
+        parser.add_argument('--compare', '-c',
+                            help='JSON results of a previous run')
+        parser.add_argument('--keep', action='store_true',
+                            help='do not delete the benchmark questions')
+
+    def handle(self, *args, languages=None, fixtures=None, size=20, users=10,
+               seed=0, output=None, compare=None, keep=False, **options):
+        mix = None
+        if any(options.get(kind) is not None for kind in KINDS):
+            mix = {kind: options.get(kind) or 0.0 for kind in KINDS}
+
+        def progress(done, total):
+            sys.stdout.write('\r%s/%s submissions' % (done, total))
+            sys.stdout.flush()
+
+        results = benchmarks.run_benchmark(
+            languages=languages,
+            size=size,
+            users=users,
+            mix=mix,
+            seed=seed,
+            fixtures=fixtures,
+            keep=keep,
+            callback=progress,
+        )
+        print()
+        benchmarks.print_results(results)
+        path = benchmarks.save_results(results, output)
+        print('Results saved to %s' % path)
+
+        if compare:
+            baseline = benchmarks.load_results(compare)
+            print('Comparison with %s (commit %s):' % (
+                compare, baseline.get('commit')))
+            for label, old, new, change in \
+                    benchmarks.compare_results(baseline, results):
+                change = '%+.1f%%' % (change * 100) if change is not None \
+                    else 'n/a'
+                print('  %-28s %10.4f -> %10.4f  (%s)' % (
+                    label, old, new, change))
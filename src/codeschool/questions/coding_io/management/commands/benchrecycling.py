@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from codeschool.benchmarks.recycling import bench_recycling
+
+
+class Command(BaseCommand):
+    help = 'measures the lookup of duplicate submissions in a response with ' \
+           'many submissions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', '-n', type=int, default=1000)
+        parser.add_argument('--lookups', '-l', type=int, default=100)
+        parser.add_argument('--keep', action='store_true')
+
+    def handle(self, *args, submissions=1000, lookups=100, keep=False,
+               **options):
+        results = bench_recycling(submissions, lookups, keep=keep)
+
+        print('Duplicate lookup in a response with %s submissions (ms):' %
+              submissions)
+        for name in ['legacy', 'indexed']:
+            for kind in ['hit', 'miss']:
+                stats = results[name][kind]
+                print('  %-8s %-5s mean: %7.2f  p50: %7.2f  p95: %7.2f' % (
+                    name, kind, stats['mean'] * 1000, stats['p50'] * 1000,
+                    stats['p95'] * 1000))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from codeschool.questions.coding_io.models import AnswerKey
+
+
+class Command(BaseCommand):
+    help = 'benchmarks the reference source of answer keys and updates the ' \
+           'runtime profiles used to compute grading timeouts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('questions', nargs='*', type=int,
+                            help='ids of questions (default: all questions)')
+        parser.add_argument('--runs', '-r', type=int, default=None)
+        parser.add_argument('--missing', '-m', action='store_true',
+                            help='only answer keys without a runtime profile')
+
+    def handle(self, *args, questions=(), runs=None, missing=False,
+               **options):
+        answer_keys = AnswerKey.objects.exclude(source='')
+        if questions:
+            answer_keys = answer_keys.filter(question_id__in=questions)
+        if missing:
+            answer_keys = answer_keys.filter(runtime_profile__isnull=True)
+
+        for answer_key in answer_keys.select_related('question', 'language'):
+            answer_key.calibrate(runs=runs, commit=True)
+            if answer_key.runtime_profile is None:
+                print('%s: reference source failed, using the question '
+                      'timeout' % answer_key)
+            else:
+                print('%s: timeout %.3fs (slowest testcase: %.3fs)' % (
+                    answer_key, answer_key.grading_timeout(),
+                    max(answer_key.runtime_profile)))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_io', '0009_auto_20160816_1439'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=32, unique=True)),
+                ('iospec_hash', models.CharField(max_length=32)),
+                ('source_hash', models.CharField(max_length=32)),
+                ('feedback_data', jsonfield.fields.JSONField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('last_used', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('answer_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coding_io.AnswerKey')),
+            ],
+            options={
+                'verbose_name': 'grading cache entry',
+                'verbose_name_plural': 'grading cache entries',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_io', '0010_gradingcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codingioquestion',
+            name='fail_fast',
+            field=models.BooleanField(default=True, help_text='If checked, grading stops at the first test case that fails with a wrong answer, a runtime error or a timeout. Students only see the first failure anyway.', verbose_name='stop at the first failure'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import jsonfield.fields
+
+
+def fill_iospec_json(apps, schema_editor):
+    from iospec.parser import IoSpecSyntaxError
+    from codeschool.questions.coding_io.grading import cached_compact_form
+
+    for model_name in ['codingioquestion', 'answerkey']:
+        model = apps.get_model('coding_io', model_name)
+        for obj in model.objects.only('id', 'iospec_source').iterator():
+            try:
+                compact = cached_compact_form(obj.iospec_source)
+            except IoSpecSyntaxError:
+                continue
+            if compact is not None:
+                model.objects.filter(id=obj.id).update(iospec_json=compact)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_io', '0011_codingioquestion_fail_fast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answerkey',
+            name='iospec_json',
+            field=jsonfield.fields.JSONField(blank=True, help_text='Pre-parsed compact form of the expanded source. It is used to load the answer key without parsing iospec_source.', null=True),
+        ),
+        migrations.AddField(
+            model_name='codingioquestion',
+            name='iospec_json',
+            field=jsonfield.fields.JSONField(blank=True, help_text='Pre-parsed compact form of the iospec source. It is only available for iospec sources that do not require expansion.', null=True),
+        ),
+        migrations.RunPython(fill_iospec_json, migrations.RunPython.noop),
+    ]
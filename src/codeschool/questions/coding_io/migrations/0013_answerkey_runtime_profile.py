@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_io', '0012_iospec_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answerkey',
+            name='runtime_profile',
+            field=jsonfield.fields.JSONField(blank=True, help_text='Median runtime (in seconds) of the reference source in each expanded testcase. It is used to compute the grading timeout.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='codingioquestion',
+            name='timeout',
+            field=models.FloatField(blank=True, default=1.0, help_text='Defines the maximum runtime the grader will spend evaluating each test case. The actual timeout is computed from the runtime of the answer key and never exceeds this value.', verbose_name='timeout in seconds'),
+        ),
+    ]
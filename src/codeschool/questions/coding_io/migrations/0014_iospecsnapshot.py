@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 500
+
+
+def compact_feedback_data(apps, schema_editor):
+    from iospec.parser import IoSpecSyntaxError
+    from codeschool.lms.activities.models.submission import md5hash
+    from codeschool.questions.coding_io.grading import cached_iospec, \
+        compact_feedback
+
+    AnswerKey = apps.get_model('coding_io', 'AnswerKey')
+    IospecSnapshot = apps.get_model('coding_io', 'IospecSnapshot')
+    Submission = apps.get_model('activities', 'Submission')
+
+    sources = {}
+    answer_keys = AnswerKey.objects\
+        .values_list('question_id', 'language__ref', 'iospec_source')
+    for question_id, lang, source in answer_keys:
+        sources[question_id, lang] = source
+
+    def answer_key(question_id, lang):
+        source = sources.get((question_id, lang))
+        if not source:
+            return None, None
+        try:
+            iospec = cached_iospec(source)
+        except IoSpecSyntaxError:
+            return None, None
+        iospec_hash = md5hash(source)
+        IospecSnapshot.objects.get_or_create(hash=iospec_hash,
+                                             defaults={'source': source})
+        return iospec, iospec_hash
+
+    # Walk over the submissions of coding questions in batches of increasing
+    # ids. Each batch is saved in its own transaction.
+    question_ids = {question_id for question_id, _ in sources}
+    submissions = Submission.objects\
+        .filter(response__activity_page_id__in=question_ids)\
+        .order_by('id')\
+        .values_list('id', 'response__activity_page_id', 'response_data',
+                     'feedback_data')
+    last_id = 0
+    while True:
+        batch = list(submissions.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        with transaction.atomic():
+            for pk, question_id, response_data, data in batch:
+                if not data or 'answer_key' not in data:
+                    continue
+
+                # Older versions copied response_data into feedback_data
+                data = dict(data)
+                data.pop('source', None)
+                data.pop('language', None)
+                extra = {key: data.pop(key)
+                         for key in ['skipped', 'usage'] if key in data}
+
+                lang = (response_data or {}).get('language')
+                iospec, iospec_hash = answer_key(question_id, lang)
+                if iospec is not None:
+                    data = compact_feedback(data, iospec, iospec_hash) or data
+                data.update(extra)
+                Submission.objects.filter(id=pk).update(feedback_data=data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0013_submission_response_hash_index'),
+        ('coding_io', '0013_answerkey_runtime_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IospecSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=32, unique=True)),
+                ('source', models.TextField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'iospec snapshot',
+                'verbose_name_plural': 'iospec snapshots',
+            },
+        ),
+        migrations.RunPython(compact_feedback_data, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 500
+
+
+def fill_summary(apps, schema_editor):
+    CodingIoQuestion = apps.get_model('coding_io', 'CodingIoQuestion')
+    ProgrammingLanguage = apps.get_model('core', 'ProgrammingLanguage')
+    Submission = apps.get_model('activities', 'Submission')
+
+    names = dict(ProgrammingLanguage.objects.values_list('ref', 'name'))
+    question_ids = list(CodingIoQuestion.objects.values_list('id', flat=True))
+    submissions = Submission.objects\
+        .filter(response__activity_page_id__in=question_ids)\
+        .order_by('id')\
+        .values_list('id', 'status', 'response_data', 'feedback_data')
+
+    last_id = 0
+    while True:
+        batch = list(submissions.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        with transaction.atomic():
+            for pk, status, response_data, feedback_data in batch:
+                if isinstance(feedback_data, dict):
+                    status = feedback_data.get('status', status)
+                lang = (response_data or {}).get('language')
+                Submission.objects.filter(id=pk).update(
+                    summary_status=status,
+                    summary_label=names.get(lang, ''),
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0014_submission_summary'),
+        ('coding_io', '0014_iospecsnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_summary, migrations.RunPython.noop),
+    ]
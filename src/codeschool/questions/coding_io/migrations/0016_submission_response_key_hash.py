@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 500
+
+
+def fill_response_key_hash(apps, schema_editor):
+    from codeschool.lms.activities.models.submission import md5hash
+    from codeschool.questions.coding_io.models.question import response_key
+
+    CodingIoQuestion = apps.get_model('coding_io', 'CodingIoQuestion')
+    Submission = apps.get_model('activities', 'Submission')
+
+    question_ids = list(CodingIoQuestion.objects.values_list('id', flat=True))
+    submissions = Submission.objects\
+        .filter(response__activity_page_id__in=question_ids)\
+        .order_by('id')\
+        .values_list('id', 'response_data')
+
+    last_id = 0
+    while True:
+        batch = list(submissions.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        with transaction.atomic():
+            for pk, response_data in batch:
+                data = response_data or {}
+                if 'source' not in data or 'language' not in data:
+                    continue
+                Submission.objects.filter(id=pk)\
+                    .update(response_key_hash=md5hash(response_key(data)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0016_submission_response_key_hash'),
+        ('coding_io', '0015_submission_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_response_key_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def clear_cache(apps, schema_editor):
+    # Old entries do not record the expanded iospec and the timeout used to
+    # grade them.
+    GradingCache = apps.get_model('coding_io', 'GradingCache')
+    GradingCache.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_io', '0016_submission_response_key_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_cache, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='gradingcache',
+            name='expanded_hash',
+            field=models.CharField(default='', max_length=32),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='gradingcache',
+            name='timeout',
+            field=models.FloatField(default=0.0),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def fill_iospec_json(apps, schema_editor):
+    # The compact form now stores the hash of the source it was built from.
+    from iospec.parser import IoSpecSyntaxError
+    from codeschool.questions.coding_io.grading import cached_compact_form
+
+    for model_name in ['codingioquestion', 'answerkey']:
+        model = apps.get_model('coding_io', model_name)
+        for obj in model.objects.only('id', 'iospec_source').iterator():
+            try:
+                compact = cached_compact_form(obj.iospec_source)
+            except IoSpecSyntaxError:
+                compact = None
+            model.objects.filter(id=obj.id).update(iospec_json=compact)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coding_io', '0017_gradingcache_answer_key_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_iospec_json, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+BATCH_SIZE = 500
+
+
+def fill_usage(apps, schema_editor):
+    CodingIoQuestion = apps.get_model('coding_io', 'CodingIoQuestion')
+    Submission = apps.get_model('activities', 'Submission')
+    GradingUsage = apps.get_model('coding_io', 'GradingUsage')
+    TestcaseUsage = apps.get_model('coding_io', 'TestcaseUsage')
+
+    question_ids = list(CodingIoQuestion.objects.values_list('id', flat=True))
+    submissions = Submission.objects\
+        .filter(response__activity_page_id__in=question_ids,
+                feedback_data__isnull=False)\
+        .order_by('id')\
+        .values_list('id', 'response__activity_page_id', 'feedback_data')
+
+    last_id = 0
+    testcases = {}
+    while True:
+        batch = list(submissions.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        runs = []
+        for pk, question_id, feedback_data in batch:
+            if not isinstance(feedback_data, dict):
+                continue
+            usage = feedback_data.get('usage')
+            if not usage or usage.get('cached'):
+                continue
+            total = usage['total']
+            runs.append(GradingUsage(
+                question_id=question_id, wall=total['wall'],
+                cpu=total['cpu'], testcases=total['testcases'],
+                timeouts=total['timeouts'],
+            ))
+            for entry in usage['testcases']:
+                if entry['index'] is None:
+                    continue
+                key = (question_id, entry['index'])
+                data = testcases.setdefault(key, [0, 0.0, 0.0, 0])
+                data[0] += 1
+                data[1] += entry['wall']
+                data[2] = max(data[2], entry['wall'])
+                data[3] += entry['status'] == 'error-timeout'
+        GradingUsage.objects.bulk_create(runs)
+
+    TestcaseUsage.objects.bulk_create([
+        TestcaseUsage(question_id=question_id, index=index, runs=runs,
+                      wall_sum=wall_sum, max_wall=max_wall, timeouts=timeouts)
+        for (question_id, index), (runs, wall_sum, max_wall, timeouts)
+        in testcases.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0018_activitygradestatistics'),
+        ('coding_io', '0018_iospec_json_source_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wall', models.FloatField()),
+                ('cpu', models.FloatField(blank=True, null=True)),
+                ('testcases', models.PositiveIntegerField(default=0)),
+                ('timeouts', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coding_io.CodingIoQuestion')),
+            ],
+            options={
+                'verbose_name': 'grading usage',
+                'verbose_name_plural': 'grading usage',
+            },
+        ),
+        migrations.CreateModel(
+            name='TestcaseUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('runs', models.PositiveIntegerField(default=0)),
+                ('wall_sum', models.FloatField(default=0.0)),
+                ('max_wall', models.FloatField(default=0.0)),
+                ('timeouts', models.PositiveIntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='coding_io.CodingIoQuestion')),
+            ],
+            options={
+                'verbose_name': 'testcase usage',
+                'verbose_name_plural': 'testcase usage',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='testcaseusage',
+            unique_together=set([('question', 'index')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='gradingusage',
+            index_together=set([('question', 'wall')]),
+        ),
+        migrations.RunPython(fill_usage, migrations.RunPython.noop),
+    ]
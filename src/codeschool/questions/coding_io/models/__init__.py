@@ -2,6 +2,9 @@ from iospec.feedback import Feedback
 from codeschool.render import render_html as _render_html
 from .question import CodingIoQuestion
 from .answer_key import AnswerKey
+from .grading_cache import GradingCache
+from .iospec_snapshot import IospecSnapshot
+from .resource_usage import GradingUsage, TestcaseUsage
 from .submission import CodingIoSubmission
 
 _render_html.register_template(Feedback, 'render/feedback.jinja2')
\ No newline at end of file
@@ -1,17 +1,20 @@
 import collections
+
+from annoying.functions import get_config
 from django.core.exceptions import ValidationError
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 from django.utils.html import escape
-from iospec import parse_string as parse_iospec
 from lazyutils import lazy
 
 from codeschool import models, panels
 from codeschool.core.models import ProgrammingLanguage
 from codeschool.lms.activities.models.submission import md5hash
+from codeschool.questions.coding_io import grading
 
 from ..models import CodingIoQuestion
-from ..models.question import run_code, differ
+from ..models.question import run_code, grade_code, differ
+from .grading_cache import GradingCache
 
 
 class AnswerKeyQueryset(models.QuerySet):
@@ -110,13 +113,29 @@ class AnswerKey(models.Model):
             'to expand the outputs from the given inputs.'
         )
     )
+    iospec_json = models.JSONField(
+        null=True,
+        blank=True,
+        help_text=_(
+            'Pre-parsed compact form of the expanded source. It is used to '
+            'load the answer key without parsing iospec_source.'
+        ),
+    )
+    runtime_profile = models.JSONField(
+        null=True,
+        blank=True,
+        help_text=_(
+            'Median runtime (in seconds) of the reference source in each '
+            'expanded testcase. It is used to compute the grading timeout.'
+        ),
+    )
 
     objects = AnswerKeyQueryset.as_manager()
     iospec_size = property(lambda x: x.question.iospec_size)
 
     @lazy
     def iospec(self):
-        return parse_iospec(self.iospec_source)
+        return grading.cached_iospec(self.iospec_source, self.iospec_json)
 
     def __repr__(self):
         return '<AnswerKeyItem: %s (%s)>' % (self.question, self.language)
@@ -149,10 +168,16 @@ class AnswerKey(models.Model):
             self.source_hash = source_hash
             self.iospec_hash = parent_hash
 
+            # The old profile does not describe the new source and testcases.
+            # Calibration runs the reference source several times, hence it is
+            # left to update() and to the "calibratetimeouts" command.
+            self.runtime_profile = None
+
     def update(self, commit=True):
         """
         Update the internal iospec source and hash keys to match the given
-        parent iospec value.
+        parent iospec value and recompute the runtime profile of the
+        reference source.
 
         It raises a ValidationError if the source code is invalid.
         """
@@ -162,9 +187,60 @@ class AnswerKey(models.Model):
         self.iospec_source = result.source()
         self.source_hash = md5hash(self.source)
         self.iospec_hash = self.parent_hash()
+        self.calibrate()
         if commit:
             self.save()
 
+    def calibrate(self, runs=None, commit=False):
+        """
+        Benchmark the reference source in the expanded testcases and store
+        the median runtime of each testcase in runtime_profile.
+
+        Args:
+            runs:
+                Number of times the reference source runs each testcase.
+                Defaults to CODESCHOOL_TIMEOUT_CALIBRATION_RUNS. Use 0 to
+                disable calibration.
+            commit:
+                If True, save the new profile.
+
+        The profile is cleared if the reference source fails or times out in
+        some testcase.
+        """
+
+        if runs is None:
+            runs = get_config('CODESCHOOL_TIMEOUT_CALIBRATION_RUNS', 3)
+
+        profile = None
+        if self.source and self.iospec_source and runs:
+            iospec = grading.cached_iospec(self.iospec_source)
+            language = self.language.ejudge_ref()
+            usage_runs = []
+            for run in range(runs):
+                usage = []
+                grade_code(self.source, iospec, lang=language,
+                           timeout=self.question.timeout, fail_fast=False,
+                           usage=usage)
+                usage_runs.append(usage)
+            profile = grading.reference_profile(usage_runs, len(iospec))
+
+        self.runtime_profile = profile
+        if commit:
+            self.save(update_fields=['runtime_profile'])
+
+    def grading_timeout(self):
+        """
+        Timeout used to grade each testcase of a submission.
+
+        It is CODESCHOOL_TIMEOUT_FACTOR times the runtime of the reference
+        source in the slowest testcase, capped by the question's timeout. If
+        the answer key was not calibrated, it is simply the question's
+        timeout.
+        """
+
+        return grading.calibrated_timeout(self.runtime_profile,
+                                          self.question.timeout)
+
     def _update_state(self, iospec, source, language):
         """
         Worker function for the .update() and .clean() methods.
@@ -221,8 +297,13 @@ class AnswerKey(models.Model):
     def save(self, *args, **kwds):
         if 'iospec' in self.__dict__:
             self.iospec_source = self.iospec.source()
+        self.iospec_json = grading.cached_compact_form(self.iospec_source)
         super().save(*args, **kwds)
 
+        # Cached results of grading with older versions of the answer key are
+        # not valid anymore.
+        GradingCache.objects.invalidate(self)
+
     def run(self, source=None, iospec=None):
         """
         Runs the given source against the given iospec.
@@ -330,10 +411,10 @@ class RelatedAnswerKeyManager(collections.Mapping, models.RelatedManagerExt):
         try:
             return self.get(language=language).iospec
         except self.model.DoesNotExist:
-            sources = self.values_list('iospec_source', flat=True).distinct()
+            sources = self.values_list('iospec_source', 'iospec_json')
             if sources:
-                source, *_ = sources
-                return parse_iospec(source)
+                (source, compact), *_ = sources
+                return grading.cached_iospec(source, compact)
             else:
                 iospec = self.instance.iospec
                 if force_expanded and not iospec.is_simple:
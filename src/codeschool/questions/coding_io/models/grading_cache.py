@@ -0,0 +1,182 @@
+from annoying.functions import get_config
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from codeschool import models
+from codeschool.lms.activities.models.submission import md5hash
+from .question import response_key
+
+
+def grading_source_key(response_data):
+    """
+    Normalize the response_data of a coding submission into the string used
+    by the grading cache.
+
+    This is response_key() restricted to the transformations that cannot
+    change the program's behavior: only line endings are normalized. Stripping
+    or collapsing whitespace would change indentation in Python and the
+    contents of string literals in every language.
+    """
+
+    return response_key(response_data, strip_blank=False,
+                        strip_whitespace=False, single_whitespace=False)
+
+
+def answer_key_state(answer_key):
+    """
+    Return a dictionary with the attributes of the answer key that may change
+    the result of grading a submission.
+
+    Besides the hashes of the parent iospec and the reference source, this
+    includes a hash of the expanded iospec_source (random inputs may be
+    re-expanded without changing the other hashes) and the grading timeout.
+    """
+
+    return {
+        'iospec_hash': answer_key.iospec_hash,
+        'source_hash': answer_key.source_hash,
+        'expanded_hash': md5hash(answer_key.iospec_source),
+        'timeout': answer_key.grading_timeout(),
+    }
+
+
+def grading_cache_key(source_key, answer_key, state=None):
+    """
+    Return the content-addressed key for the given normalized source and
+    answer key.
+    """
+
+    state = state or answer_key_state(answer_key)
+    data = '\n'.join([state['iospec_hash'], state['source_hash'],
+                      state['expanded_hash'], repr(float(state['timeout'])),
+                      source_key])
+    return md5hash(data)
+
+
+class GradingCacheQuerySet(models.QuerySet):
+    def stale(self, answer_key):
+        """
+        Filter entries created for older versions of the given answer key.
+        """
+
+        return self.filter(answer_key=answer_key)\
+            .exclude(**answer_key_state(answer_key))
+
+
+class _GradingCacheManager(models.Manager):
+    def max_size(self):
+        """
+        Maximum number of entries in the cache.
+
+        Controlled by the CODESCHOOL_GRADING_CACHE_SIZE setting. A value of
+        zero disables the cache.
+        """
+
+        return get_config('CODESCHOOL_GRADING_CACHE_SIZE', 10000)
+
+    def lookup(self, source_key, answer_key):
+        """
+        Return the JSON feedback data stored for the given normalized source
+        and answer key, or None if no entry is found.
+        """
+
+        if not self.max_size():
+            return None
+
+        key = grading_cache_key(source_key, answer_key)
+        try:
+            entry = self.get(key=key)
+        except self.model.DoesNotExist:
+            return None
+
+        # Update LRU data without touching the feedback column
+        self.filter(pk=entry.pk).update(hits=models.F('hits') + 1,
+                                        last_used=timezone.now())
+        return entry.feedback_data
+
+    def store(self, source_key, answer_key, feedback_data):
+        """
+        Save feedback data for the given normalized source and answer key and
+        evict the least recently used entries if the cache is full.
+        """
+
+        max_size = self.max_size()
+        if not max_size:
+            return None
+
+        state = answer_key_state(answer_key)
+        entry, created = self.update_or_create(
+            key=grading_cache_key(source_key, answer_key, state),
+            defaults=dict(
+                state,
+                answer_key=answer_key,
+                feedback_data=feedback_data,
+                last_used=timezone.now(),
+            )
+        )
+        if created:
+            self.evict(max_size)
+        return entry
+
+    def evict(self, max_size=None):
+        """
+        Remove the least recently used entries until the cache has at most
+        max_size elements.
+        """
+
+        max_size = self.max_size() if max_size is None else max_size
+        excess = self.count() - max_size
+        if excess > 0:
+            lru = self.order_by('last_used').values_list('id', flat=True)
+            self.filter(id__in=list(lru[:excess])).delete()
+
+    def invalidate(self, answer_key):
+        """
+        Remove all entries that do not match the current state of the given
+        answer key (hashes of the iospec, reference source and expanded
+        iospec source, and the grading timeout).
+        """
+
+        return self.get_queryset().stale(answer_key).delete()
+
+
+GradingCacheManager = _GradingCacheManager.from_queryset(GradingCacheQuerySet)
+
+
+class GradingCache(models.Model):
+    """
+    Stores the feedback of grading some source code against an answer key.
+
+    Entries are content-addressed: the key is computed from the normalized
+    source code and language and from the state of the answer key (see
+    answer_key_state()). Identical submissions thus reuse the same feedback
+    without running the code again.
+    """
+
+    class Meta:
+        verbose_name = _('grading cache entry')
+        verbose_name_plural = _('grading cache entries')
+
+    key = models.CharField(
+        max_length=32,
+        unique=True,
+    )
+    answer_key = models.ForeignKey(
+        'AnswerKey',
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    iospec_hash = models.CharField(max_length=32)
+    source_hash = models.CharField(max_length=32)
+    expanded_hash = models.CharField(max_length=32)
+    timeout = models.FloatField()
+    feedback_data = models.JSONField()
+    hits = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+    )
+    objects = GradingCacheManager()
+
+    def __str__(self):
+        return '<GradingCache: %s (%s hits)>' % (self.key, self.hits)
@@ -0,0 +1,50 @@
+from django.utils.translation import ugettext_lazy as _
+
+from codeschool import models
+from codeschool.lms.activities.models.submission import md5hash
+from codeschool.questions.coding_io import grading
+
+
+class _IospecSnapshotManager(models.Manager):
+    def register(self, source):
+        """
+        Store the given expanded iospec source, if necessary, and return its
+        hash.
+        """
+
+        key = md5hash(source)
+        self.get_or_create(hash=key, defaults={'source': source})
+        return key
+
+    def iospec(self, hash):
+        """
+        Return the IoSpec object stored under the given hash.
+        """
+
+        source = self.filter(hash=hash).values_list('source', flat=True).get()
+        return grading.cached_iospec(source)
+
+
+class IospecSnapshot(models.Model):
+    """
+    Stores the expanded iospec sources used to grade coding submissions.
+
+    Snapshots are content-addressed by the md5 hash of their source. The
+    feedback of each submission refers to the answer key by this hash, so it
+    can be rebuilt even after the answer key changes.
+    """
+
+    class Meta:
+        verbose_name = _('iospec snapshot')
+        verbose_name_plural = _('iospec snapshots')
+
+    hash = models.CharField(
+        max_length=32,
+        unique=True,
+    )
+    source = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+    objects = _IospecSnapshotManager()
+
+    def __str__(self):
+        return '<IospecSnapshot: %s>' % self.hash
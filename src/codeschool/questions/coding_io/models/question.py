@@ -5,9 +5,9 @@ import ejudge
 import markio
 import srvice
 from annoying.functions import get_config
-from django.core.exceptions import ValidationError
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.utils.translation import ugettext_lazy as _
-from iospec import parse_string as parse_iospec
+from iospec.parser import IoSpecSyntaxError
 from lazyutils import lazy
 
 from codeschool import models
@@ -16,6 +16,7 @@ from codeschool.core.models import ProgrammingLanguage, programming_language
 from codeschool.fixes.parent_refresh import register_parent_prefetch
 from codeschool.lms.activities.models.submission import md5hash
 from codeschool.questions.models import Question
+from codeschool.questions.coding_io import grading
 
 differ = Differ()
 
@@ -58,13 +59,31 @@ class CodingIoQuestion(Question):
         blank=True,
         help_text=_('A hash to keep track of iospec updates.'),
     )
+    iospec_json = models.JSONField(
+        null=True,
+        blank=True,
+        help_text=_(
+            'Pre-parsed compact form of the iospec source. It is only '
+            'available for iospec sources that do not require expansion.'
+        ),
+    )
     timeout = models.FloatField(
         _('timeout in seconds'),
         blank=True,
         default=1.0,
         help_text=_(
             'Defines the maximum runtime the grader will spend evaluating '
-            'each test case.'
+            'each test case. The actual timeout is computed from the runtime '
+            'of the answer key and never exceeds this value.'
+        ),
+    )
+    fail_fast = models.BooleanField(
+        _('stop at the first failure'),
+        default=True,
+        help_text=_(
+            'If checked, grading stops at the first test case that fails with '
+            'a wrong answer, a runtime error or a timeout. Students only see '
+            'the first failure anyway.'
         ),
     )
     language = models.ForeignKey(
@@ -84,13 +103,22 @@ class CodingIoQuestion(Question):
     __iospec_updated = False
     __answers = ()
 
+    @property
+    def defer_grading(self):
+        """
+        Coding questions are graded by the grading queue if the
+        CODESCHOOL_DEFER_GRADING setting is enabled.
+        """
+
+        return get_config('CODESCHOOL_DEFER_GRADING', False)
+
     @lazy
     def iospec(self):
         """
         The IoSpec structure corresponding to the iospec_source.
         """
 
-        return parse_iospec(self.iospec_source)
+        return grading.cached_iospec(self.iospec_source, self.iospec_json)
 
     def __init__(self, *args, **kwargs):
         # Supports automatic conversion between iospec data and iospec_source
@@ -118,7 +146,7 @@ class CodingIoQuestion(Question):
         iospec_hash = md5hash(source)
         if self.iospec_hash != iospec_hash:
             try:
-                self.iospec = iospec = parse_iospec(self.iospec_source)
+                self.iospec = iospec = grading.cached_iospec(source)
             except Exception as ex:
                 raise ValidationError(
                     {'iospec_source': _('invalid iospec syntax: %s' % ex)}
@@ -217,6 +245,13 @@ class CodingIoQuestion(Question):
 
         return tree.source()
 
+    def save(self, *args, **kwargs):
+        try:
+            self.iospec_json = grading.cached_compact_form(self.iospec_source)
+        except IoSpecSyntaxError:
+            self.iospec_json = None
+        super().save(*args, **kwargs)
+
     def full_clean(self, *args, **kwargs):
         if self.__answers:
             self.answers = self.__answers
@@ -297,6 +332,7 @@ class CodingIoQuestion(Question):
     # Serving pages and routing
     template = 'questions/coding_io/detail.jinja2'
     template_submissions = 'questions/coding_io/submissions.jinja2'
+    template_submission_detail = 'questions/coding_io/submission-detail.jinja2'
 
     def get_context(self, request, *args, **kwargs):
         context = dict(super().get_context(request, *args, **kwargs),
@@ -348,6 +384,29 @@ class CodingIoQuestion(Question):
             source=source,
         )
 
+    def resource_usage(self, slowest=10):
+        """
+        Aggregate the resources used by the submissions to this question.
+
+        Return a dictionary with the p50/p95 runtime of submissions, the
+        timeout rate and the slowest testcases. Values are aggregated by the
+        database from the GradingUsage and TestcaseUsage tables.
+        """
+
+        from .resource_usage import GradingUsage
+        return GradingUsage.objects.aggregate_usage(self, slowest=slowest)
+
+    @srvice.route(r'^resource-usage/$')
+    def route_resource_usage(self, client, slowest=10):
+        """
+        Return the aggregate resource usage of submissions. Only available to
+        users that can edit the question.
+        """
+
+        if not self.can_edit(client.user):
+            raise PermissionDenied
+        return self.resource_usage(slowest=int(slowest))
+
     @srvice.route(r'^placeholder/$')
     def route_placeholder(self, request, language):
         """
@@ -370,6 +429,7 @@ class CodingIoQuestion(Question):
         panels.MultiFieldPanel([
             panels.FieldPanel('language'),
             panels.FieldPanel('timeout'),
+            panels.FieldPanel('fail_fast'),
         ], heading=_('Options'))
     ]
 
@@ -383,23 +443,99 @@ def run_code(source, inputs, lang=None):
     tree.
     """
 
+    executor = grading.get_executor(lang)
+    if executor is not None:
+        return executor.run(source, inputs)
+
+    sandbox = get_config('CODESCHOOL_USE_SANDBOX', True)
+    artifact = grading.build_artifact(source, lang, sandbox)
+    if artifact is not None:
+        return artifact.run(inputs, sandbox=sandbox)
+
     return ejudge.run(
         source, inputs, lang,
         raises=False,
-        sandbox=get_config('CODESCHOOL_USE_SANDBOX', True)
+        sandbox=sandbox,
     )
 
 
-def grade_code(source, answer_key, lang=None):
+def grade_code(source, answer_key, lang=None, timeout=None, workers=None,
+               fail_fast=True, usage=None):
     """
     Compare results of running the given source code with the iospec answer
     key.
+
+    If the language is configured with more than one worker in the
+    CODESCHOOL_GRADING_POOL_SIZE setting (or if workers > 1), testcases are
+    executed in parallel in a bounded process pool and the submission must
+    finish within a budget of ``timeout * n / workers`` seconds.
+
+    Python and Pytuga code runs in the pre-forked zygote executor if it is
+    enabled with ``CODESCHOOL_EXECUTOR = 'zygote'``. C and C++ code is
+    compiled only once and the executable is stored in the build cache.
+
+    If fail_fast is True, grading stops at the first testcase with a zero
+    grade (wrong answer, runtime error, timeout, etc). The resulting feedback
+    is the same, since it always describes the first testcase with the lowest
+    grade. Use grading.skipped_testcases() to count the testcases that did
+    not run.
+
+    If a usage list is given, the resources used by each executed testcase
+    (wall time, CPU time, peak RSS and output size) are appended to it. See
+    :mod:`codeschool.questions.coding_io.grading.resources`.
+
+    Testcases that only print after reading all their inputs run in batch
+    mode: the program receives all inputs at once and its output is compared
+    in a single step. This is controlled by the CODESCHOOL_BATCH_GRADING
+    setting. See :mod:`codeschool.questions.coding_io.grading.batch`. The
+    remaining testcases run interactively with ejudge (see
+    :mod:`codeschool.questions.coding_io.grading.interactive`).
+
+    Each testcase is limited to timeout seconds in all backends.
     """
 
-    return ejudge.grade(
+    batch = get_config('CODESCHOOL_BATCH_GRADING', True)
+    executor = grading.get_executor(lang)
+    if executor is not None:
+        return executor.grade(source, answer_key, timeout=timeout,
+                              fast=fail_fast, usage=usage, batch=batch)
+
+    # Compile before dispatching testcases, so workers hit the build cache
+    sandbox = get_config('CODESCHOOL_USE_SANDBOX', True)
+    artifact = grading.build_artifact(source, lang, sandbox)
+    if artifact is not None and artifact.is_error:
+        return artifact.grade(answer_key)
+
+    workers = workers or grading.pool_size(lang)
+    if workers > 1 and len(answer_key) > 1:
+        return grading.grade_parallel(
+            source, answer_key, lang,
+            workers=workers,
+            timeout=timeout,
+            sandbox=sandbox,
+            fast=fail_fast,
+            usage=usage,
+        )
+
+    if artifact is not None:
+        return artifact.grade(answer_key, sandbox=sandbox, fast=fail_fast,
+                              usage=usage, batch=batch, timeout=timeout)
+
+    if batch and grading.supports_batch(lang, answer_key):
+        return grading.grade_batch_source(
+            source, answer_key, lang,
+            timeout=timeout,
+            sandbox=sandbox,
+            fast=fail_fast,
+            usage=usage,
+        )
+
+    return grading.grade_interactive(
         source, answer_key, lang,
-        raises=False,
-        sandbox=get_config('CODESCHOOL_USE_SANDBOX', True)
+        timeout=timeout,
+        sandbox=sandbox,
+        fast=fail_fast,
+        usage=usage,
     )
 
 
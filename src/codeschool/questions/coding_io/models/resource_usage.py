@@ -0,0 +1,185 @@
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+from codeschool import models
+
+
+class _GradingUsageManager(models.Manager):
+    def register(self, question, usage):
+        """
+        Save the usage data of a grading run of some submission to the given
+        question.
+
+        Usage is the dictionary stored in ``feedback_data['usage']``. Runs
+        that reused the feedback in the grading cache are ignored.
+        """
+
+        if not usage or usage.get('cached'):
+            return None
+
+        total = usage['total']
+        TestcaseUsage.objects.register(question, usage['testcases'])
+        return self.create(
+            question_id=question.id,
+            wall=total['wall'],
+            cpu=total['cpu'],
+            testcases=total['testcases'],
+            timeouts=total['timeouts'],
+        )
+
+    def aggregate_usage(self, question, slowest=10):
+        """
+        Aggregate the resources used by all grading runs of submissions to the
+        given question.
+
+        Return a dictionary in the same format as
+        :func:`codeschool.questions.coding_io.grading.aggregate_usage`. All
+        values are computed by the database: percentiles are single indexed
+        lookups and the slowest testcases come from the TestcaseUsage table.
+        """
+
+        runs = self.filter(question_id=question.id)
+        data = runs.aggregate(
+            submissions=models.Count('id'),
+            testcases=models.Sum('testcases'),
+            testcase_timeouts=models.Sum('timeouts'),
+            timeouts=models.Sum(models.Case(
+                models.When(timeouts__gt=0, then=models.Value(1)),
+                default=models.Value(0),
+                output_field=models.IntegerField(),
+            )),
+        )
+        count = data['submissions']
+        walls = runs.order_by('wall').values_list('wall', flat=True)
+
+        def percentile(q):
+            if not count:
+                return 0.0
+            return walls[min(int(round(q / 100 * (count - 1))), count - 1)]
+
+        testcases = data['testcases'] or 0
+        return {
+            'submissions': count,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'timeout_rate': (data['timeouts'] or 0) / count if count else 0.0,
+            'testcase_timeout_rate':
+                (data['testcase_timeouts'] or 0) / testcases
+                if testcases else 0.0,
+            'slowest': TestcaseUsage.objects.slowest(question, slowest),
+        }
+
+
+GradingUsageManager = _GradingUsageManager
+
+
+class GradingUsage(models.Model):
+    """
+    Total resources used in a grading run of a submission.
+
+    Usage is also saved in the feedback_data of each submission, but these
+    rows keep the aggregates over all submissions of a question cheap to
+    compute. Regrading a submission registers a new run.
+    """
+
+    class Meta:
+        verbose_name = _('grading usage')
+        verbose_name_plural = _('grading usage')
+        index_together = [('question', 'wall')]
+
+    question = models.ForeignKey(
+        'CodingIoQuestion',
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    wall = models.FloatField()
+    cpu = models.FloatField(blank=True, null=True)
+    testcases = models.PositiveIntegerField(default=0)
+    timeouts = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+    objects = GradingUsageManager()
+
+    def __str__(self):
+        return '<GradingUsage: question #%s (%.3fs)>' % (self.question_id,
+                                                         self.wall)
+
+
+class _TestcaseUsageManager(models.Manager):
+    def register(self, question, entries):
+        """
+        Add the given usage entries to the per-testcase aggregates of the
+        question.
+
+        Entries with no index measure a whole run (see
+        :mod:`codeschool.questions.coding_io.grading.resources`) and are
+        ignored.
+        """
+
+        for entry in entries:
+            if entry['index'] is None:
+                continue
+            wall = models.Value(entry['wall'],
+                                output_field=models.FloatField())
+            kwargs = {
+                'runs': models.F('runs') + 1,
+                'wall_sum': models.F('wall_sum') + entry['wall'],
+                'max_wall': Greatest('max_wall', wall),
+            }
+            if entry['status'] == 'error-timeout':
+                kwargs['timeouts'] = models.F('timeouts') + 1
+
+            queryset = self.filter(question_id=question.id,
+                                   index=entry['index'])
+            if not queryset.update(**kwargs):
+                self.get_or_create(question_id=question.id,
+                                   index=entry['index'])
+                queryset.update(**kwargs)
+
+    def slowest(self, question, size=10):
+        """
+        Return a list with the testcases of the given question with the
+        largest mean wall time.
+        """
+
+        mean = models.ExpressionWrapper(models.F('wall_sum') / models.F('runs'),
+                                        output_field=models.FloatField())
+        rows = self\
+            .filter(question_id=question.id, runs__gt=0)\
+            .annotate(wall=mean)\
+            .order_by('-wall')\
+            .values('index', 'runs', 'wall', 'max_wall', 'timeouts')
+        return list(rows[:size])
+
+
+TestcaseUsageManager = _TestcaseUsageManager
+
+
+class TestcaseUsage(models.Model):
+    """
+    Aggregate resources used by all runs of a testcase of a question.
+
+    Usage entries that measure a whole run (index None) do not contribute to
+    these aggregates.
+    """
+
+    class Meta:
+        verbose_name = _('testcase usage')
+        verbose_name_plural = _('testcase usage')
+        unique_together = [('question', 'index')]
+
+    question = models.ForeignKey(
+        'CodingIoQuestion',
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    index = models.PositiveIntegerField()
+    runs = models.PositiveIntegerField(default=0)
+    wall_sum = models.FloatField(default=0.0)
+    max_wall = models.FloatField(default=0.0)
+    timeouts = models.PositiveIntegerField(default=0)
+    objects = TestcaseUsageManager()
+
+    def __str__(self):
+        return '<TestcaseUsage: question #%s, testcase %s (%s runs)>' % (
+            self.question_id, self.index, self.runs)
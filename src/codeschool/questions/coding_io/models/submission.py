@@ -3,10 +3,16 @@ from lazyutils import lazy
 
 from codeschool.core.models import ProgrammingLanguage, programming_language
 from codeschool.lms.activities.models import register_submission_class
+from codeschool.lms.activities.models.submission import md5hash
 from codeschool.render import render_html
 from ...models import QuestionSubmission
 from ..models import CodingIoQuestion
-from ..models.question import grade_code
+from ..models.question import grade_code, response_key
+from ..grading import skipped_testcases, total_usage, compact_feedback, \
+    expand_feedback
+from ..models.grading_cache import GradingCache, grading_source_key
+from ..models.iospec_snapshot import IospecSnapshot
+from ..models.resource_usage import GradingUsage
 
 
 @register_submission_class(CodingIoQuestion)
@@ -44,9 +50,15 @@ class CodingIoSubmission(QuestionSubmission):
             return None
 
         data = dict(self.feedback_data)
-        data['grade'] = self.final_grade / 100
-        del data['source']
-        del data['language']
+        grade = self.final_grade / 100
+        for key in ['skipped', 'usage', 'source', 'language']:
+            data.pop(key, None)
+        if 'iospec_hash' in data:
+            answer_key = self.snapshot_iospec(data['iospec_hash'])
+            return expand_feedback(data, answer_key, grade)
+
+        # Feedback saved in the full format by older versions
+        data['grade'] = grade
         return iospec.feedback.Feedback.from_json(data)
 
     feedback_title = property(lambda x: x.feedback and x.feedback.title)
@@ -56,11 +68,29 @@ class CodingIoSubmission(QuestionSubmission):
     feedback_hint = property(lambda x: x.feedback_data.get('hint'))
     feedback_message = property(lambda x: x.feedback_data.get('message'))
     feedback_status = property(lambda x: x.feedback_data.get('status'))
+    feedback_skipped = property(lambda x: x.feedback_data.get('skipped', 0))
+    feedback_usage = property(lambda x: x.feedback_data.get('usage'))
+
+    @property
+    def summary_title(self):
+        title = iospec.feedback.error_titles.get(self.summary_status)
+        return title or self.get_status_display()
 
     @lazy
     def answer_key(self):
         return self.question.answers.iospec(self.language)
 
+    @lazy
+    def answer_key_object(self):
+        return self.question.answers.from_language(self.language)
+
+    @lazy
+    def answer_key_source(self):
+        answer_key = self.answer_key_object
+        if answer_key is not None and answer_key.iospec_source:
+            return answer_key.iospec_source
+        return self.answer_key.source()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if 'feedback' in kwargs:
@@ -72,43 +102,142 @@ class CodingIoSubmission(QuestionSubmission):
     def clean(self):
         super().clean()
         if self.feedback:
-            data = self.feedback.to_json()
-            del data['grade']
-            self.feedback_data = data
+            self.update_feedback(self.feedback, update_grade=False)
+
+    def update_summary(self):
+        super().update_summary()
+        if isinstance(self.feedback_data, dict):
+            self.summary_status = \
+                self.feedback_data.get('status', self.summary_status)
+        language = self.language
+        self.summary_label = language.name if language else ''
+
+    def response_key(self):
+        return response_key(self.response_data)
 
-    def autograde_value(self):
+    def similarity_source(self):
+        return self.response_data.get('language'), self.source
+
+    def autograde_value(self, fail_fast=None):
         """
         Run code using the ejudge, saves the feedback and return the given
         grade.
+
+        Identical submissions reuse the feedback stored in the grading cache
+        instead of running the code again.
+
+        Args:
+            fail_fast:
+                If True, stop grading at the first failing testcase and record
+                the number of skipped testcases in feedback_data['skipped'].
+                Defaults to the question's fail_fast option.
+
+        The resources used by each executed testcase and their totals are
+        saved in feedback_data['usage'] and registered in the GradingUsage
+        table. Feedback reused from the grading cache is marked with
+        {'cached': True}.
         """
 
-        # Compute feedback
-        source = self.source
-        language_ref = self.language.ejudge_ref()
+        if fail_fast is None:
+            fail_fast = self.question.fail_fast
         answer_key = self.answer_key
-        feedback = grade_code(source, answer_key, lang=language_ref)
+
+        # Fetch feedback from cache
+        feedback = self.cached_feedback()
+        usage = {'cached': True}
+
+        # Compute feedback
+        if feedback is None:
+            source = self.source
+            language_ref = self.language.ejudge_ref()
+            answer_key_object = self.answer_key_object
+            if answer_key_object is None:
+                timeout = self.question.timeout
+            else:
+                timeout = answer_key_object.grading_timeout()
+            testcases = []
+            feedback = grade_code(source, answer_key, lang=language_ref,
+                                  timeout=timeout, fail_fast=fail_fast,
+                                  usage=testcases)
+            self.cache_feedback(feedback)
+            usage = {'total': total_usage(testcases), 'testcases': testcases}
+            GradingUsage.objects.register(self.question, usage)
 
         # Save data and return grade
         self.update_feedback(feedback, update_grade=False)
+        self.feedback_data['skipped'] = \
+            skipped_testcases(feedback, answer_key) if fail_fast else 0
+        self.feedback_data['usage'] = usage
         return self.feedback.grade * 100
 
+    def cached_feedback(self):
+        """
+        Return the Feedback object stored in the grading cache for this
+        submission or None if the submission was never graded.
+        """
+
+        answer_key = self.answer_key_object
+        if answer_key is None:
+            return None
+
+        source_key = grading_source_key(self.response_data)
+        data = GradingCache.objects.lookup(source_key, answer_key)
+        if data is None:
+            return None
+        return iospec.feedback.Feedback.from_json(data)
+
+    def cache_feedback(self, feedback):
+        """
+        Save feedback in the grading cache.
+
+        Timeouts are not cached since they may be caused by a loaded machine
+        rather than by the submitted code.
+        """
+
+        answer_key = self.answer_key_object
+        if answer_key is None or feedback.status == 'error-timeout':
+            return
+
+        source_key = grading_source_key(self.response_data)
+        GradingCache.objects.store(source_key, answer_key, feedback.to_json())
+
     def update_feedback(self, feedback=None, update_grade=True):
         """
-        Update feedback_data dictionary with info from feedback object
+        Update feedback_data dictionary with info from feedback object.
+
+        Feedback is saved in the compact form described in
+        :mod:`codeschool.questions.coding_io.grading.storage`: the answer key
+        is referenced by the hash of its iospec snapshot and only the output
+        of the submitted program is saved.
         """
         feedback = feedback or self.feedback
 
-        self.feedback_data.update(
-            answer_key=feedback.answer_key.to_json(),
-            testcase=feedback.answer_key.to_json(),
-            status=feedback.status,
-        )
-        if feedback.message:
-            self.feedback_data['message'] = self.feedback.message
-        if feedback.hint:
-            self.feedback_data['hint'] = self.feedback.hint
+        data = feedback.to_json()
+        del data['grade']
+        iospec_hash = IospecSnapshot.objects.register(self.answer_key_source)
+        compact = compact_feedback(data, self.answer_key, iospec_hash)
+        if compact is not None:
+            data = compact
+
+        for key in ['skipped', 'usage']:
+            if key in self.feedback_data:
+                data[key] = self.feedback_data[key]
+        self.feedback_data = data
 
         if update_grade:
             self.given_grade = feedback.grade * 100
 
         self.feedback = feedback
+
+    def snapshot_iospec(self, iospec_hash):
+        """
+        Return the answer key IoSpec object with the given snapshot hash.
+
+        The current answer key is used if it matches the hash. Otherwise, the
+        answer key has changed since the submission was graded and it is
+        loaded from the stored snapshot.
+        """
+
+        if md5hash(self.answer_key_source) == iospec_hash:
+            return self.answer_key
+        return IospecSnapshot.objects.iospec(iospec_hash)
@@ -54,3 +54,23 @@ from codeschool.questions.tests.generic import *
 #     assert resp.feedback_hint is None
 #     assert resp.feedback_message is None
 
+
+
+def test_submission_summary_title():
+    from codeschool.questions.coding_io.models import CodingIoSubmission
+
+    submission = CodingIoSubmission(summary_status='wrong-answer')
+    assert submission.summary_title == 'Wrong Answer'
+    submission = CodingIoSubmission(status='pending', summary_status='pending')
+    assert submission.summary_title == 'pending'
+
+
+def test_submission_response_key_normalizes_whitespace():
+    from codeschool.questions.coding_io.models import CodingIoSubmission
+
+    def key(source):
+        data = {'source': source, 'language': 'python'}
+        return CodingIoSubmission(response_data=data).response_key()
+
+    assert key('x = 1\n\nprint(x)\n') == key('x  =  1\nprint(x)  ')
+    assert key('x = 1\nprint(x)') != key('x = 2\nprint(x)')
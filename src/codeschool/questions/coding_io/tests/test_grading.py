@@ -0,0 +1,409 @@
+import multiprocessing
+import shutil
+
+from django.core.exceptions import ImproperlyConfigured
+from iospec import parse_string
+from iospec.feedback import Feedback
+
+from codeschool.questions.coding_io.tests import *
+from codeschool.questions.coding_io.grading import parallel, zygote, \
+    build_cache, iospec_cache, storage, batch, stream, interactive
+
+
+@pytest.fixture
+def answer_key():
+    return parse_string('<foo>\nhello foo!\n\n<bar>\nhello bar!')
+
+
+def test_worst_feedback_picks_first_lowest_grade(answer_key):
+    case1, case2 = answer_key
+    ok = Feedback(case1, case1, grade=1, status='ok')
+    wrong1 = parallel.timeout_feedback(case1)
+    wrong2 = parallel.timeout_feedback(case2)
+    assert parallel.worst_feedback([ok, wrong1, wrong2]) is wrong1
+    assert parallel.worst_feedback([ok]) is ok
+
+
+def test_timeout_feedback(answer_key):
+    feedback = parallel.timeout_feedback(answer_key[0])
+    assert feedback.status == 'error-timeout'
+    assert feedback.grade == 0
+    assert feedback.answer_key == answer_key[0]
+
+
+def test_pool_size_defaults_to_sequential(settings):
+    settings.CODESCHOOL_GRADING_POOL_SIZE = {'python': 4}
+    assert parallel.pool_size('python') == 4
+    assert parallel.pool_size('c') == 1
+
+
+def test_pool_size_is_sequential_in_daemonic_processes(settings):
+    settings.CODESCHOOL_GRADING_POOL_SIZE = {'python': 4}
+    pool = multiprocessing.Pool(1)
+    try:
+        assert pool.apply(parallel.pool_size, ('python',)) == 1
+    finally:
+        pool.terminate()
+
+
+def test_grading_source_key_preserves_semantics():
+    from codeschool.questions.coding_io.models.grading_cache import \
+        grading_source_key
+
+    src1 = {'language': 'python', 'source': 'if x:\n    print("a  b")\n'}
+    src2 = {'language': 'python', 'source': 'if x:\r\n    print("a  b")'}
+    src3 = {'language': 'python', 'source': 'if x:\nprint("a b")\n'}
+    assert grading_source_key(src1) == grading_source_key(src2)
+    assert grading_source_key(src1) != grading_source_key(src3)
+
+
+def test_grading_cache_key_tracks_answer_key_state():
+    from types import SimpleNamespace
+    from codeschool.questions.coding_io.models.grading_cache import \
+        grading_cache_key
+
+    def make_key(iospec_source='<1>\n1', timeout=1.0):
+        return SimpleNamespace(iospec_hash='a' * 32, source_hash='b' * 32,
+                               iospec_source=iospec_source,
+                               grading_timeout=lambda: timeout)
+
+    key = grading_cache_key('src', make_key())
+    assert key == grading_cache_key('src', make_key())
+    assert key != grading_cache_key('src', make_key(iospec_source='<2>\n2'))
+    assert key != grading_cache_key('src', make_key(timeout=2.0))
+
+
+def test_zygote_executor_is_opt_in(settings):
+    settings.CODESCHOOL_EXECUTOR = 'ejudge'
+    assert zygote.get_executor('python') is None
+    settings.CODESCHOOL_EXECUTOR = 'zygote'
+    settings.CODESCHOOL_USE_SANDBOX = False
+    assert zygote.get_executor('python').lang == 'python'
+    assert zygote.get_executor('c') is None
+
+
+def test_zygote_executor_refuses_sandbox(settings):
+    from django.core.exceptions import ImproperlyConfigured
+
+    settings.CODESCHOOL_EXECUTOR = 'zygote'
+    settings.CODESCHOOL_USE_SANDBOX = True
+    with pytest.raises(ImproperlyConfigured):
+        zygote.get_executor('python')
+
+
+def test_zygote_executor_grades_testcases(answer_key, settings):
+    settings.CODESCHOOL_ZYGOTE_MEMORY = None
+    executor = zygote.ZygoteExecutor('python')
+    try:
+        ok = executor.grade('print("hello %s!" % input())', answer_key)
+        error = executor.grade('print(1/0)', answer_key)
+        timeout = executor.grade('while True: pass', answer_key, timeout=0.2)
+        main = executor.grade('if __name__ == "__main__":\n'
+                              '    print("hello %s!" % input())', answer_key)
+    finally:
+        executor.stop()
+    assert ok.status == 'ok'
+    assert main.status == 'ok'
+    assert error.status == 'error-runtime'
+    assert timeout.status == 'error-timeout'
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='gcc not found')
+def test_build_cache_stores_executables_and_errors(answer_key, tmpdir):
+    cache = build_cache.BuildCache(str(tmpdir), 1024 * 1024)
+    source = ('#include <stdio.h>\n'
+              'int main() { char s[100]; scanf("%s", s);'
+              '             printf("hello %s!\\n", s); return 0; }')
+
+    artifact = cache.build(source, 'c', sandbox=False)
+    assert not artifact.is_error
+    assert cache.get(artifact.key, 'c').executable == artifact.executable
+    assert artifact.grade(answer_key, sandbox=False).is_correct
+
+    error = cache.build('int main( {', 'c', sandbox=False)
+    assert error.is_error
+    assert error.grade(answer_key).status == 'error-build'
+    assert cache.build('int main( {', 'c', sandbox=False).key == error.key
+
+    # Evict everything
+    cache.evict(0)
+    assert cache.size() == 0
+    assert cache.get(artifact.key, 'c') is None
+
+    # Evicted artifacts are compiled again
+    assert not artifact.is_error
+    assert artifact.grade(answer_key, sandbox=False).is_correct
+    cache.evict(0)
+    assert 'expected' in error.error_message
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='gcc not found')
+def test_build_cache_evicts_periodically(tmpdir, monkeypatch):
+    monkeypatch.setattr(build_cache, 'EVICT_ENTRIES', 2)
+    cache = build_cache.BuildCache(str(tmpdir), 1024 * 1024)
+    evictions = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, 'evict', lambda: evictions.append(evict()))
+
+    for idx in range(5):
+        cache.build('int main%s( {' % idx, 'c', sandbox=False)
+    assert len(evictions) == 3
+    assert len(cache.entries()) == 5
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='gcc not found')
+def test_build_cache_interactive_runs_have_timeout(answer_key, tmpdir):
+    cache = build_cache.BuildCache(str(tmpdir), 1024 * 1024)
+    source = ('#include <stdio.h>\n'
+              'int main() { while (1) printf("hello"); return 0; }')
+    artifact = cache.build(source, 'c', sandbox=False)
+    result = build_cache.grade_executable(
+        artifact.executable, 'c', answer_key.to_json(),
+        sandbox=False, batch=False, timeout=0.5)
+    assert Feedback.from_json(result['feedback']).status == 'error-timeout'
+
+
+def test_interactive_grading_has_timeout(answer_key):
+    usage = []
+    feedback = interactive.grade_interactive(
+        'while True: print("hello")', answer_key, 'python',
+        timeout=0.5, sandbox=False, usage=usage)
+    assert feedback.status == 'error-timeout'
+    assert [x['status'] for x in usage] == ['error-timeout']
+
+    feedback = interactive.grade_interactive(
+        'print("hello", input() + "!")', answer_key, 'python',
+        timeout=0.5, sandbox=False)
+    assert feedback.status == 'ok'
+
+
+def test_build_cache_rejects_foreign_directory(tmpdir):
+    target = tmpdir.mkdir('target')
+    link = tmpdir.join('link')
+    link.mksymlinkto(target)
+    with pytest.raises(PermissionError):
+        build_cache.BuildCache(str(link), 1024)
+
+
+def test_skipped_testcases(answer_key):
+    case1, case2 = answer_key
+    assert parallel.skipped_testcases(
+        parallel.timeout_feedback(case1), answer_key) == 1
+    assert parallel.skipped_testcases(
+        parallel.timeout_feedback(case2), answer_key) == 0
+    assert parallel.skipped_testcases(
+        Feedback(case1, case1, grade=1, status='ok'), answer_key) == 0
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='gcc not found')
+def test_fail_fast_discards_busy_pool(answer_key, settings, tmpdir):
+    settings.CODESCHOOL_BUILD_CACHE_DIR = str(tmpdir)
+    source = ('#include <stdio.h>\n'
+              '#include <string.h>\n'
+              'int main() {\n'
+              '    char name[10];\n'
+              '    scanf("%9s", name);\n'
+              '    while (!strcmp(name, "bar"));\n'
+              '    printf("hi %s", name);\n'
+              '    return 0;\n'
+              '}')
+    feedback = parallel.grade_parallel(source, answer_key, 'c',
+                                       workers=2, timeout=5, sandbox=False)
+    assert feedback.grade == 0
+    assert feedback.answer_key == answer_key[0]
+    assert 2 not in parallel._pools
+
+
+def test_iospec_cache_returns_private_copies(answer_key, settings):
+    settings.CODESCHOOL_IOSPEC_CACHE_SIZE = 2
+    iospec_cache.clear_cache()
+    source = answer_key.source()
+    compact = iospec_cache.cached_compact_form(source)
+    assert compact['data'] == answer_key.to_json()
+
+    tree = iospec_cache.cached_iospec(source)
+    tree.pop()
+    assert iospec_cache.cached_iospec(source).source() == source
+    assert iospec_cache.cache_info()['hits'] == 2
+
+    # Compact form avoids the parser; templates do not have a compact form
+    iospec_cache.clear_cache()
+    assert iospec_cache.cached_iospec(source, compact).source() == source
+    assert iospec_cache.cached_compact_form('@input $name') is None
+    assert iospec_cache.cached_compact_form('a\n\nb\n\nc')
+    assert iospec_cache.cache_info()['size'] == 2
+
+
+def test_iospec_cache_ignores_compact_form_of_other_source(answer_key):
+    iospec_cache.clear_cache()
+    compact = iospec_cache.cached_compact_form('<foo>\nfoo')
+    iospec_cache.clear_cache()
+    source = answer_key.source()
+    assert iospec_cache.cached_iospec(source, compact).source() == source
+
+    # Compact forms saved before the source hash was stored are ignored too
+    iospec_cache.clear_cache()
+    tree = iospec_cache.cached_iospec(source, compact['data'])
+    assert tree.source() == source
+
+
+def test_compact_feedback_roundtrip(answer_key):
+    case1, case2 = answer_key
+    wrong = parse_string('<bar>\nhello foo!')[0]
+    for feedback in [Feedback(wrong, case2, grade=0, status='wrong-answer'),
+                     Feedback(case1, case1, grade=1, status='ok')]:
+        data = feedback.to_json()
+        compact = storage.compact_feedback(data, answer_key, 'hash')
+        assert 'answer_key' not in compact
+        expanded = storage.expand_feedback(compact, answer_key, feedback.grade)
+        assert expanded.to_json() == data
+
+    # Correct answers do not store the program output
+    assert 'testcase' not in compact
+
+    # Feedback from a different answer key cannot be compacted
+    other = parse_string('<foo>\nbye foo!')
+    assert storage.compact_feedback(data, other, 'hash') is None
+
+
+def test_batch_testcases():
+    key = parse_string('<1>\n<2>\n3\n\nx: <1>\n1\n\n<1>\nfoo\n<2>\nbar')
+    assert [batch.is_batch_testcase(case) for case in key] == \
+        [True, False, False]
+    assert batch.batch_input(key[0]) == '1\n2\n'
+
+    case = batch.batch_testcase(key[0], '3')
+    assert batch.batch_feedback(case, key[0]).status == 'ok'
+    case = batch.batch_testcase(key[0], '4')
+    assert batch.batch_feedback(case, key[0]).status == 'wrong-answer'
+
+
+def test_batch_grading_runs_python():
+    key = parse_string('<1>\n<2>\n3\n\n<5>\n<6>\n11')
+    assert batch.supports_batch('python', key)
+    source = 'print(int(input()) + int(input()))'
+    feedback = batch.grade_batch_source(source, key, 'python', sandbox=False)
+    assert feedback.status == 'ok'
+    feedback = batch.grade_batch_source('print(1', key, 'python',
+                                        sandbox=False)
+    assert feedback.status == 'error-build'
+
+
+def test_batch_interpreter_is_unprivileged(settings, tmpdir):
+    settings.CODESCHOOL_INTERPRETERS = {}
+    assert batch.get_interpreter('python') == shutil.which('python3')
+
+    privileged = tmpdir.join('python')
+    privileged.write('#!/bin/sh\n')
+    privileged.chmod(0o4755)
+    settings.CODESCHOOL_INTERPRETERS = {'python': str(privileged)}
+    with pytest.raises(ImproperlyConfigured):
+        batch.get_interpreter('python')
+    with pytest.raises(PermissionError):
+        batch.grade_interpreted('print(1)', str(privileged), '[]')
+
+
+def test_output_comparator_accepts_presentation_errors():
+    comparator = stream.OutputComparator('Hello World')
+    assert comparator.feed('  hello ')
+    assert comparator.feed('WORLD\n\n')
+    assert not comparator.diverged
+
+    comparator = stream.OutputComparator('hello\nworld')
+    assert comparator.feed('hello\n')
+    assert not comparator.feed('word')
+    assert comparator.divergence() == {'position': 9, 'reason': 'mismatch'}
+
+    comparator = stream.OutputComparator('foo', max_size=10)
+    assert comparator.feed('foo' + ' ' * 7)
+    assert not comparator.feed(' ')
+    assert comparator.reason == 'limit'
+
+
+def test_batch_grading_kills_divergent_output():
+    key = parse_string('<1>\n<2>\n3')
+    source = 'input(); input()\nwhile True:\n    print(4)'
+    feedback = batch.grade_batch_source(source, key, 'python', timeout=30,
+                                        sandbox=False)
+    assert feedback.status == 'wrong-answer'
+    assert 'line 1, column 1' in feedback.message
+    assert feedback.testcase.to_json() == \
+        batch.batch_testcase(key[0], '4').to_json()
+
+
+def test_aggregate_usage():
+    from codeschool.questions.coding_io.grading import resources
+
+    def entry(index, wall, status='ok'):
+        return {'index': index, 'status': status, 'wall': wall, 'cpu': None,
+                'rss': None, 'output': 10}
+
+    runs = [[entry(0, 0.1), entry(1, 0.3)],
+            [entry(0, 0.1), entry(1, 1.0, 'error-timeout')]]
+    usage = [{'total': resources.total_usage(x), 'testcases': x}
+             for x in runs]
+    usage.append({'cached': True})
+    result = resources.aggregate_usage(usage)
+    assert usage[1]['total']['timeouts'] == 1
+    assert usage[1]['total']['output'] == 20
+    assert result['submissions'] == 2
+    assert result['timeout_rate'] == 0.5
+    assert result['testcase_timeout_rate'] == 0.25
+    assert result['slowest'][0]['index'] == 1
+    assert result['slowest'][0]['max_wall'] == 1.0
+
+
+@pytest.mark.django_db
+def test_grading_usage_aggregates_in_database(question):
+    from codeschool.questions.coding_io.grading import resources
+    from codeschool.questions.coding_io.models import GradingUsage
+
+    def entry(index, wall, status='ok'):
+        return {'index': index, 'status': status, 'wall': wall, 'cpu': None,
+                'rss': None, 'output': 10}
+
+    question.path, question.depth = '1234', 1
+    question.save()
+    runs = [[entry(0, 0.1), entry(1, 0.3)],
+            [entry(0, 0.1), entry(1, 1.0, 'error-timeout')],
+            [entry(None, 0.5)]]
+    usage = [{'total': resources.total_usage(x), 'testcases': x}
+             for x in runs]
+    usage.append({'cached': True})
+    for data in usage:
+        GradingUsage.objects.register(question, data)
+
+    expected = resources.aggregate_usage(usage)
+    result = GradingUsage.objects.aggregate_usage(question)
+    assert result['submissions'] == expected['submissions'] == 3
+    assert result['p50'] == expected['p50']
+    assert result['p95'] == expected['p95']
+    assert result['timeout_rate'] == expected['timeout_rate']
+    assert result['testcase_timeout_rate'] == \
+        expected['testcase_timeout_rate']
+    assert [x['index'] for x in result['slowest']] == [1, 0]
+    assert result['slowest'][0]['max_wall'] == 1.0
+    assert result['slowest'][0]['wall'] == pytest.approx(0.65)
+
+
+def test_calibrated_timeout_from_reference_profile():
+    from codeschool.questions.coding_io.grading import resources
+
+    def entry(index, wall, status='ok'):
+        return {'index': index, 'status': status, 'wall': wall}
+
+    runs = [[entry(0, 0.01), entry(1, 0.05)],
+            [entry(0, 0.03), entry(1, 0.04)],
+            [entry(0, 0.02), entry(1, 0.20)]]
+    profile = resources.reference_profile(runs, 2)
+    assert profile == [0.02, 0.05]
+    assert resources.reference_profile([[entry(None, 0.3)]], 3) == \
+        pytest.approx([0.1] * 3)
+    assert resources.reference_profile(
+        [[entry(0, 0.01, 'error-timeout')]], 1) is None
+
+    timeout = resources.calibrated_timeout
+    assert timeout(profile, 1.0, factor=5, minimum=0.1) == 0.25
+    assert timeout(profile, 0.2, factor=5, minimum=0.1) == 0.2
+    assert timeout([0.001], 1.0, factor=5, minimum=0.1) == 0.1
+    assert timeout(None, 1.0) == 1.0
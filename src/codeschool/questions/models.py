@@ -3,7 +3,7 @@ import os
 
 import srvice
 from django.core.exceptions import ImproperlyConfigured
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.template import TemplateDoesNotExist
 from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
@@ -12,7 +12,8 @@ from wagtail.wagtailadmin.forms import WagtailAdminPageForm
 from codeschool import blocks
 from codeschool import models
 from codeschool import panels
-from codeschool.lms.activities.models import Activity, Submission
+from codeschool.lms.activities.models import Activity, Submission, GradingJob
+from codeschool.lms.gamification.models import leaderboard_context
 from codeschool.render import render_html
 
 logger = logging.getLogger('codeschool.questions')
@@ -67,6 +68,10 @@ class Question(models.RoutablePageMixin,
                               'star_value']
     base_form_class = QuestionAdminModelForm
 
+    #: If True, submissions are sent to the grading queue instead of being
+    #: graded inside the HTTP worker.
+    defer_grading = False
+
     body = models.StreamField(
         QUESTION_BODY_BLOCKS,
         blank=True,
@@ -193,39 +198,109 @@ class Question(models.RoutablePageMixin,
         Handles student responses via AJAX and a srvice program.
         """
 
-        response = self.submit(user=client.user, **kwargs)
-        response.autograde()
-        data = render_html(response)
+        response = self.submit(user=client.user, defer=self.defer_grading,
+                               **kwargs)
+
+        # Deferred submissions wait in the grading queue: the client receives
+        # a ticket and polls the grading-status route for the verdict.
+        if response.grading_job is not None:
+            data = render_html(response.grading_job)
+        else:
+            response.autograde()
+            data = render_html(response)
+        client.dialog(html=data)
+
+    @srvice.route(r'^grading-status/$')
+    def route_grading_status(self, client, ticket):
+        """
+        Polled by the client to fetch the result of a deferred submission.
+        """
+
+        job = GradingJob.objects.from_ticket(ticket, client.user, self.id)
+        if job is None:
+            data = '<p class="dialog-text">%s</p>' % _(
+                'Your response is not in the grading queue anymore. Please '
+                'reload the page.'
+            )
+            client.dialog(html=data)
+            return {'status': 'unknown'}
+        if not job.is_finished:
+            return {'status': 'pending', 'depth': GradingJob.objects.depth()}
+
+        submission = job.get_submission()
+        if job.status == job.STATUS_FAILED:
+            data = '<p class="dialog-text">%s</p>' % _(
+                'Internal error while grading your response. Please send it '
+                'again!'
+            )
+        else:
+            data = render_html(submission)
         client.dialog(html=data)
+        return {'status': job.status}
 
     @models.route(r'^submissions/$')
     def route_submissions(self, request, *args, **kwargs):
-        submissions = self.submissions.user(request.user).order_by('-created')
+        # Listings only load the summary of each submission. The response and
+        # feedback data are fetched by route_submission_detail() when the user
+        # opens a submission.
+        submissions = self.submissions.user(request.user)\
+            .listing()\
+            .order_by('-created')
         context = self.get_context(request, *args, **kwargs)
         context['submissions'] = submissions
+        return self._render_submissions(request, context, 'submissions')
 
+    @models.route(r'^submissions/(?P<pk>\d+)/$')
+    def route_submission_detail(self, request, pk, *args, **kwargs):
+        submissions = self.submissions.user(request.user)
+        context = self.get_context(request, *args, **kwargs)
+        context['submission'] = get_object_or_404(submissions, pk=pk)
+        return self._render_submissions(request, context, 'submission_detail')
+
+    def _render_submissions(self, request, context, kind):
         # Fetch template name from explicit configuration or compute the default
         # value from the class name
         try:
-            template = getattr(self, 'template_submissions')
+            template = getattr(self, 'template_' + kind)
             return render(request, template, context)
         except AttributeError:
             name = self.__class__.__name__.lower()
             if name.endswith('question'):
                 name = name[:-8]
-            template = 'questions/%s/submissions.jinja2' % name
+            filename = kind.replace('_', '-')
+            template = 'questions/%s/%s.jinja2' % (name, filename)
 
             try:
                 return render(request, template, context)
             except TemplateDoesNotExist:
                 raise ImproperlyConfigured(
-                    'Model %s must define a template_submissions attribute. '
+                    'Model %s must define a template_%s attribute. '
                     'You  may want to extend this template from '
-                    '"questions/submissions.jinja2"' % self.__class__.__name__
+                    '"questions/%s.jinja2"' % (self.__class__.__name__, kind,
+                                               filename)
                 )
 
-    @models.route(r'^leaderboard/$')
     @models.route(r'^statistics/$')
+    def route_statistics(self, request, *args, **kwargs):
+        # Aggregates are read from a single precomputed row instead of
+        # scanning all responses to the question.
+        stats = self.grade_statistics()
+        histogram = stats.histogram
+        peak = max(count for _start, _end, count in histogram) or 1
+        context = self.get_context(request, *args, **kwargs)
+        context['statistics'] = stats
+        context['histogram'] = [
+            (start, end, count, 100 * count // peak)
+            for start, end, count in histogram
+        ]
+        return render(request, 'questions/statistics.jinja2', context)
+
+    @models.route(r'^leaderboard/$')
+    def route_leaderboard(self, request, *args, **kwargs):
+        context = self.get_context(request, *args, **kwargs)
+        context.update(leaderboard_context(self, request.user))
+        return render(request, 'lms/activities/leaderboard.jinja2', context)
+
     @models.route(r'^submissions/$')
     @models.route(r'^social/$')
     def route_page_does_not_exist(self, request):
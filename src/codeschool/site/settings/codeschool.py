@@ -10,4 +10,91 @@ CODESCHOOL_USERNAME_IS_SCHOOL_ID = False
 CODESCHOOL_SCHOOL_ID_VALIDATION = None
 
 #: A regular expression describing valid user names.
-CODESCHOOL_USERNAME_VALIDATION = None
\ No newline at end of file
+CODESCHOOL_USERNAME_VALIDATION = None
+
+#: If true, submissions to coding questions are graded asynchronously by the
+#: grading queue. Workers are started with "manage.py gradingqueue".
+CODESCHOOL_DEFER_GRADING = False
+
+#: Number of worker processes consuming the grading queue. Uses the number of
+#: CPUs if not given.
+CODESCHOOL_GRADING_WORKERS = None
+
+#: Interval (in seconds) between polls of an idle grading worker.
+CODESCHOOL_GRADING_POLL_INTERVAL = 0.5
+
+#: Jobs running for more than this number of seconds are considered lost and
+#: are sent back to the grading queue.
+CODESCHOOL_GRADING_STALE_TIMEOUT = 300
+
+#: Number of processes used to run the testcases of a single submission in
+#: parallel, set per language. The '*' key sets the default for the remaining
+#: languages. Testcases run sequentially if the pool size is 1.
+CODESCHOOL_GRADING_POOL_SIZE = {'*': 1}
+
+#: Maximum number of entries in the grading cache. Identical submissions reuse
+#: cached feedback instead of running the code again. Set to 0 to disable.
+CODESCHOOL_GRADING_CACHE_SIZE = 10000
+
+#: Backend used to run Python, Python 2 and Pytuga code. 'ejudge' runs each
+#: testcase in a new sandbox. 'zygote' keeps a pre-forked fork server per
+#: language and is much faster, but isolates programs only with resource
+#: limits instead of the boxed sandbox. It is refused unless
+#: CODESCHOOL_USE_SANDBOX is explicitly set to False.
+CODESCHOOL_EXECUTOR = 'ejudge'
+
+#: Memory limit (in bytes) for programs run by the zygote executor. None
+#: disables the limit.
+CODESCHOOL_ZYGOTE_MEMORY = None
+
+#: Directory of the cache of compiled C/C++ executables. None uses a per-user
+#: directory inside the system's temporary dir. The directory must be owned by
+#: the user running codeschool.
+CODESCHOOL_BUILD_CACHE_DIR = None
+
+#: Maximum size (in bytes) of the build cache. The least recently used
+#: executables are removed when the cache grows beyond this limit. Set to 0 to
+#: disable the cache.
+CODESCHOOL_BUILD_CACHE_SIZE = 256 * 1024 * 1024
+
+#: Run testcases that only print after reading all inputs in batch mode: the
+#: program receives all inputs at once and its whole output is compared with
+#: the expected one, without the prompt-by-prompt interaction of ejudge.
+CODESCHOOL_BATCH_GRADING = True
+
+#: Interpreters used to run Python and Python 2 code in batch mode, as names
+#: in the PATH or full paths. Overrides the defaults in
+#: codeschool.questions.coding_io.grading.batch.INTERPRETERS. They must be
+#: regular unprivileged executables, never the python_boxed interpreter of the
+#: sandbox.
+CODESCHOOL_INTERPRETERS = {}
+
+#: Number of submissions graded by each worker task when regrading all
+#: submissions of an activity.
+CODESCHOOL_REGRADE_CHUNK_SIZE = 100
+
+#: Maximum number of parsed iospec trees kept in memory by each process.
+CODESCHOOL_IOSPEC_CACHE_SIZE = 256
+
+#: Number of times the reference source of an answer key runs each testcase in
+#: order to compute its runtime profile. Set to 0 to disable calibration and
+#: always use the question's timeout.
+CODESCHOOL_TIMEOUT_CALIBRATION_RUNS = 3
+
+#: Grading timeout as a multiple of the runtime of the reference source in the
+#: slowest testcase. It is capped by the question's timeout.
+CODESCHOOL_TIMEOUT_FACTOR = 5.0
+
+#: Minimum grading timeout (in seconds) for calibrated answer keys.
+CODESCHOOL_TIMEOUT_MIN = 0.1
+
+#: Alias of the cache (in CACHES) that shares the global XP leaderboard among
+#: all processes. It must be shared by all processes and have an atomic
+#: incr(), e.g., memcached or redis. Local memory, dummy, file and database
+#: caches are refused and the leaderboard is read from the database instead.
+CODESCHOOL_XP_CACHE = 'default'
+
+#: Keep the MinHash fingerprints of the best submission of each response up
+#: to date as submissions are graded. They are used to find near-duplicate
+#: responses (see the "plagiarism" management command).
+CODESCHOOL_SIMILARITY_INDEX = True
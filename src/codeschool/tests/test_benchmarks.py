@@ -0,0 +1,27 @@
+from codeschool.tests import *
+from codeschool.benchmarks import corpus, runner
+
+
+def test_corpus_is_reproducible():
+    answer_keys = [('q1', 'python', 'print(1)'), ('q1', 'c', 'int main(){}')]
+    data = corpus.make_corpus(answer_keys, 20, seed=42)
+    assert data == corpus.make_corpus(answer_keys, 20, seed=42)
+    assert len(data) == 40
+    assert len({x['source'] for x in data}) == 40
+    assert {x['kind'] for x in data} <= set(corpus.KINDS)
+
+    only_correct = corpus.make_corpus(answer_keys, 5, mix={'correct': 1})
+    assert {x['kind'] for x in only_correct} == {'correct'}
+
+
+def test_compare_results():
+    records = [{'lang': 'python', 'kind': 'correct', 'latency': 0.1,
+                'expected': True}] * 10
+    old = runner.make_results(records, {'grade_code': [0.05] * 10}, 1.0, 0, {})
+    new = runner.make_results(records, {'grade_code': [0.05] * 10}, 0.5, 0, {})
+    assert old['overall']['sps'] == 10
+    assert old['stages']['grade_code']['share'] == 0.5
+    rows = {label: change
+            for label, _, _, change in runner.compare_results(old, new)}
+    assert rows['sps'] == 1.0
+    assert rows['grade_code mean'] == 0.0
@@ -0,0 +1,23 @@
+import pytest
+
+from codeschool import models
+
+
+@pytest.mark.django_db
+def test_bulk_update_saves_only_the_given_fields():
+    users = [models.User.objects.create(username='user%s' % idx,
+                                        last_name='last')
+             for idx in range(5)]
+    for idx, user in enumerate(users):
+        user.first_name = 'first%s' % idx
+        user.last_name = 'changed'
+
+    assert models.bulk_update(models.User, users[:3], ['first_name'],
+                              batch_size=2) == 3
+    rows = models.User.objects\
+        .filter(pk__in=[user.pk for user in users])\
+        .order_by('pk')\
+        .values_list('first_name', 'last_name')
+    assert list(rows) == [('first0', 'last'), ('first1', 'last'),
+                          ('first2', 'last'), ('', 'last'), ('', 'last')]
+    assert models.bulk_update(models.User, [], ['first_name']) == 0